@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark the in-process oaklib backend against runoak subprocesses.
+
+Each pipeline stage that uses oaklib pays interpreter startup, the oaklib
+import and the SemSQL adapter load. This script measures that overhead by
+running the same lightweight query (the ontology version lookup) repeatedly
+through both backends.
+
+Usage:
+    python benchmark_oak.py [--ontology sqlite:obo:hp] [--repeat 5]
+"""
+
+import argparse
+import shlex
+import subprocess
+import time
+
+from run_pipeline import OakSession
+
+
+def time_runoak(identifier: str, repeat: int) -> list:
+    """Time repeated runoak ontology-metadata subprocesses."""
+    timings = []
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.run(
+            f"runoak -i {shlex.quote(identifier)} ontology-metadata --all",
+            shell=True, check=True, capture_output=True
+        )
+        timings.append(time.time() - start)
+    return timings
+
+
+def time_session(identifier: str, repeat: int) -> list:
+    """Time repeated version lookups through one in-process session."""
+    timings = []
+    start = time.time()
+    session = OakSession()
+    for _ in range(repeat):
+        session.ontology_version(identifier)
+        timings.append(time.time() - start)
+        start = time.time()
+    return timings
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark in-process oaklib against runoak subprocesses")
+    parser.add_argument('--ontology', type=str, default='sqlite:obo:hp',
+                        help='oaklib identifier to query (default: sqlite:obo:hp)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of queries per backend (default: 5)')
+    args = parser.parse_args()
+
+    runoak_timings = time_runoak(args.ontology, args.repeat)
+    session_timings = time_session(args.ontology, args.repeat)
+
+    print(f"{'backend':<10} {'first (s)':>10} {'later avg (s)':>14} {'total (s)':>10}")
+    for name, timings in [('runoak', runoak_timings), ('python', session_timings)]:
+        later = timings[1:] or timings
+        print(f"{name:<10} {timings[0]:>10.2f} "
+              f"{sum(later) / len(later):>14.3f} {sum(timings):>10.2f}")
+
+    saved = sum(runoak_timings) - sum(session_timings)
+    per_call = saved / args.repeat
+    print(f"Startup and adapter-load time saved: {saved:.2f}s "
+          f"({per_call:.2f}s per call)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the pipeline on synthetic data, with regression gating.
+
+Synthetic SemSQL databases for HP, MP, ZP and PHENIO, association tables and
+tool placeholders are generated at a configurable size and served, together
+with a stand-in for the Zenodo API, by a local HTTP server. Every pipeline
+stage (setup, comparisons and the Zenodo upload) then runs against them, and
+the per-stage wall time, peak memory and throughput recorded by the pipeline
+metrics are compared with a stored baseline. The script exits with status 1
+if any stage is slower or uses more memory than the baseline by more than
+the threshold.
+
+The ontology stages need oaklib and semsimian; the SemSQL schema is taken
+from the semsql package that oaklib installs. The served duckdb file is a
+placeholder, so the duckdb labeler is not benchmarked.
+
+Usage:
+    python benchmark_pipeline.py [--terms 500] [--genes 1000] [--seed 1]
+    python benchmark_pipeline.py --save-baseline
+    python benchmark_pipeline.py --baseline benchmark_baseline.json --threshold 0.25
+"""
+
+import argparse
+import email.utils
+import gzip
+import hashlib
+import http.server
+import importlib.util
+import json
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from run_pipeline import COMPARISONS, PipelineConfig, PipelineRunner, format_bytes
+
+# Synthetic ontologies: (key, CURIE prefix, root term used by COMPARISONS)
+ONTOLOGIES = [
+    ('hp', 'HP', 'HP:0000118'),
+    ('mp', 'MP', 'MP:0000001'),
+    ('zp', 'ZP', 'ZP:0000000'),
+]
+
+SYNTHETIC_VERSION = '2000-01-01'
+
+PREFIXES = {
+    'HP': 'http://purl.obolibrary.org/obo/HP_',
+    'MP': 'http://purl.obolibrary.org/obo/MP_',
+    'ZP': 'http://purl.obolibrary.org/obo/ZP_',
+    'UPHENO': 'http://purl.obolibrary.org/obo/UPHENO_',
+    'obo': 'http://purl.obolibrary.org/obo/',
+    'owl': 'http://www.w3.org/2002/07/owl#',
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+}
+
+# Term: (CURIE, label, parent CURIEs)
+Term = Tuple[str, str, List[str]]
+
+
+def generate_ontology(prefix: str, root: str, size: int,
+                      rng: random.Random) -> List[Term]:
+    """
+    Generate a random ontology DAG below a root term.
+
+    Every term has a random earlier term as parent and, one time in five, a
+    second one, which gives the shallow, multiple-inheritance shape of the
+    phenotype ontologies.
+    """
+    terms = [(root, f"{prefix} root", [])]
+    for index in range(1, size):
+        parents = [terms[rng.randrange(index)][0]]
+        if index > 1 and rng.random() < 0.2:
+            second = terms[rng.randrange(index)][0]
+            if second not in parents:
+                parents.append(second)
+        terms.append((f"{prefix}:{9000000 + index:07d}",
+                      f"{prefix.lower()} phenotype {index}", parents))
+    return terms
+
+
+def ancestor_closure(terms: List[Term]) -> Dict[str, set]:
+    """Reflexive ancestor sets, for terms listed after their parents."""
+    ancestors: Dict[str, set] = {}
+    for curie, _, parents in terms:
+        closure = {curie}
+        for parent in parents:
+            closure |= ancestors[parent]
+        ancestors[curie] = closure
+    return ancestors
+
+
+def semsql_schema() -> str:
+    """Return the SemSQL DDL shipped with the semsql package."""
+    spec = importlib.util.find_spec('semsql')
+    if spec is None or spec.origin is None:
+        raise RuntimeError(
+            "Building SemSQL databases requires semsql (installed with oaklib)")
+    return (Path(spec.origin).parent / 'builder' / 'sql_schema' /
+            'semsql.sql').read_text()
+
+
+def write_semsql_db(path: Path, name: str, terms: List[Term]) -> None:
+    """Write terms as a SemSQL SQLite database with entailed edges."""
+    if path.exists():
+        path.unlink()
+    ontology = f"obo:{name}.owl"
+    version_iri = (f"http://purl.obolibrary.org/obo/{name}/releases/"
+                   f"{SYNTHETIC_VERSION}/{name}.owl")
+
+    statements = [
+        (ontology, 'rdf:type', 'owl:Ontology', None),
+        (ontology, 'owl:versionIRI', version_iri, None),
+    ]
+    for curie, label, parents in terms:
+        statements.append((curie, 'rdf:type', 'owl:Class', None))
+        statements.append((curie, 'rdfs:label', None, label))
+        statements.extend((curie, 'rdfs:subClassOf', parent, None)
+                          for parent in parents)
+
+    connection = sqlite3.connect(str(path))
+    try:
+        connection.executescript(semsql_schema())
+        connection.executemany(
+            "INSERT INTO prefix (prefix, base) VALUES (?, ?)",
+            list(PREFIXES.items()))
+        connection.executemany(
+            "INSERT INTO statements (stanza, subject, predicate, object, value) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ((subject, subject, predicate, obj, value)
+             for subject, predicate, obj, value in statements))
+        connection.executemany(
+            "INSERT INTO entailed_edge (subject, predicate, object) VALUES (?, ?, ?)",
+            ((curie, 'rdfs:subClassOf', ancestor)
+             for curie, ancestors in ancestor_closure(terms).items()
+             for ancestor in ancestors))
+        connection.execute("CREATE INDEX statements_subject ON statements (subject)")
+        connection.execute("CREATE INDEX entailed_edge_subject ON entailed_edge (subject)")
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def write_hpoa(path: Path, hp_terms: List[Term], diseases: int,
+               per_subject: int, rng: random.Random) -> None:
+    """Write an HPO annotation file in the phenotype.hpoa layout."""
+    with path.open('w') as handle:
+        handle.write(f"#description: \"synthetic HPO annotations\"\n"
+                     f"#version: {SYNTHETIC_VERSION}\n")
+        handle.write('\t'.join([
+            'database_id', 'disease_name', 'qualifier', 'hpo_id', 'reference',
+            'evidence', 'onset', 'frequency', 'sex', 'modifier', 'aspect',
+            'biocuration']) + '\n')
+        for disease in range(diseases):
+            for curie, _, _ in rng.sample(hp_terms[1:], per_subject):
+                handle.write('\t'.join([
+                    f"OMIM:{100000 + disease}", f"Disease {disease}", '',
+                    curie, f"OMIM:{100000 + disease}", 'TAS', '', '', '', '',
+                    'P', f"HPO:synthetic[{SYNTHETIC_VERSION}]"]) + '\n')
+
+
+def write_gene_phenotypes(path: Path, terms: List[Term], gene_prefix: str,
+                          taxon: str, genes: int, per_subject: int,
+                          rng: random.Random) -> None:
+    """
+    Write a gzipped Monarch gene_phenotype table.
+
+    One row in ten annotates an HP term instead, so the prefix filter of the
+    download stage has rows to drop.
+    """
+    with gzip.open(path, 'wt') as handle:
+        handle.write('\t'.join([
+            'subject', 'subject_label', 'subject_taxon', 'subject_taxon_label',
+            'object', 'object_label', 'relation', 'relation_label', 'evidence',
+            'source']) + '\n')
+        for gene in range(genes):
+            for curie, label, _ in rng.sample(terms[1:], per_subject):
+                if rng.random() < 0.1:
+                    curie, label = 'HP:0000118', 'Phenotypic abnormality'
+                handle.write('\t'.join([
+                    f"{gene_prefix}:{gene}", f"gene{gene}", taxon, 'synthetic',
+                    curie, label, 'RO:0002200', 'has phenotype', 'ECO:0000006',
+                    'synthetic']) + '\n')
+
+
+def write_tool_placeholders(fixtures: Path) -> None:
+    """Write a stand-in for the duckdb download."""
+    placeholder = ("#!/bin/sh\n"
+                   "echo 'placeholder served by benchmark_pipeline.py' >&2\n"
+                   "exit 1\n")
+    with zipfile.ZipFile(fixtures / 'duckdb_cli-linux-amd64.zip', 'w') as archive:
+        archive.writestr('duckdb', placeholder)
+
+
+def generate_fixtures(fixtures: Path, terms: int, genes: int, diseases: int,
+                      per_subject: int, seed: int) -> None:
+    """Generate the synthetic ontologies, associations and tool files."""
+    rng = random.Random(seed)
+    fixtures.mkdir(parents=True, exist_ok=True)
+
+    generated = {key: generate_ontology(prefix, root, terms, rng)
+                 for key, prefix, root in ONTOLOGIES}
+    for key, terms_list in generated.items():
+        write_semsql_db(fixtures / f"{key}.db", key, terms_list)
+
+    # PHENIO joins the ontologies below a common root, with cross-species
+    # links from MP/ZP terms to HP terms so that comparisons share ancestors
+    hp_terms = generated['hp']
+    phenio = [('UPHENO:0000001', 'phenotype', [])]
+    for key, _, _ in ONTOLOGIES:
+        for index, (curie, label, parents) in enumerate(generated[key]):
+            parents = parents or ['UPHENO:0000001']
+            if key != 'hp' and index and rng.random() < 0.3:
+                parents = parents + [rng.choice(hp_terms)[0]]
+            phenio.append((curie, label, parents))
+    write_semsql_db(fixtures / 'phenio.db', 'phenio', phenio)
+
+    write_hpoa(fixtures / 'phenotype.hpoa', hp_terms, diseases, per_subject, rng)
+    write_gene_phenotypes(fixtures / 'gene_phenotype.10090.tsv.gz',
+                          generated['mp'], 'MGI', 'NCBITaxon:10090',
+                          genes, per_subject, rng)
+    write_gene_phenotypes(fixtures / 'gene_phenotype.7955.tsv.gz',
+                          generated['zp'], 'ZFIN', 'NCBITaxon:7955',
+                          genes, per_subject, rng)
+    write_tool_placeholders(fixtures)
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves fixture files (with ETag and Range support) under /files/ and a
+    minimal Zenodo deposition API under /api/.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _base_url(self) -> str:
+        return f"http://{self.headers['Host']}"
+
+    def _send_file(self, head: bool) -> None:
+        path = self.server.fixtures / self.path[len('/files/'):]
+        if not path.is_file():
+            self._send_json(404, {'message': 'not found'})
+            return
+        stat = path.stat()
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = 0, stat.st_size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        partial = match is not None and (if_range is None or if_range == etag)
+        if partial:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), end)
+
+        self.send_response(206 if partial else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified',
+                         email.utils.formatdate(stat.st_mtime, usegmt=True))
+        if partial:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{stat.st_size}")
+        self.end_headers()
+        if head:
+            return
+        with path.open('rb') as handle:
+            handle.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = handle.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def _draft(self) -> Dict:
+        draft = self.server.draft
+        return {
+            'id': draft['id'],
+            'submitted': draft['submitted'],
+            'metadata': draft['metadata'],
+            'files': [{'id': name, 'filename': name, 'filesize': size,
+                       'checksum': md5}
+                      for name, (size, md5) in draft['files'].items()],
+            'links': {'bucket': f"{self._base_url()}/api/files/bucket"},
+        }
+
+    def do_HEAD(self):
+        if self.path.startswith('/files/'):
+            self._send_file(head=True)
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+    def do_GET(self):
+        if self.path.startswith('/files/'):
+            self._send_file(head=False)
+        elif self.path == f"/api/deposit/depositions/{self.server.draft['id']}":
+            self._send_json(200, self._draft())
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+    def do_POST(self):
+        self._read_body()
+        draft = self.server.draft
+        if self.path.endswith('/actions/newversion'):
+            self._send_json(201, {'links': {'latest_draft':
+                f"{self._base_url()}/api/deposit/depositions/{draft['id']}"}})
+        elif self.path.endswith('/actions/publish'):
+            draft['submitted'] = True
+            self._send_json(202, self._draft())
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+    def do_PUT(self):
+        draft = self.server.draft
+        if self.path.startswith('/api/files/bucket/'):
+            name = self.path.rsplit('/', 1)[1]
+            remaining = int(self.headers.get('Content-Length', 0))
+            digest = hashlib.md5()
+            size = remaining
+            while remaining > 0:
+                chunk = self.rfile.read(min(1024 * 1024, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+            draft['files'][name] = (size, digest.hexdigest())
+            self._send_json(201, {'key': name, 'size': size,
+                                  'checksum': f"md5:{digest.hexdigest()}"})
+        else:
+            payload = json.loads(self._read_body() or b'{}')
+            draft['metadata'] = payload.get('metadata', {})
+            self._send_json(200, self._draft())
+
+    def do_DELETE(self):
+        self.server.draft['files'].pop(self.path.rsplit('/', 1)[1], None)
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    """Local HTTP server for fixture downloads and the Zenodo stand-in."""
+
+    daemon_threads = True
+
+    def __init__(self, fixtures: Path, handler=StandInHandler):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.fixtures = fixtures
+        self.draft = {'id': 2, 'submitted': False, 'metadata': {},
+                      'files': {'previous_release.tar.gz': (0, '')}}
+
+    def start(self) -> str:
+        """Serve in a background thread and return the base URL."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+def run_pipeline(workspace: Path, fixtures: Path, base_url: str,
+                 jobs: int) -> Dict[str, Dict]:
+    """Run every pipeline stage against the fixtures and return the metrics."""
+    config = PipelineConfig(workspace / 'run', custom_phenio=fixtures / 'phenio.db')
+    config.ontology_dbs = {key: fixtures / f"{key}.db" for key, _, _ in ONTOLOGIES}
+    config.artifact_dir = workspace / 'artifacts'
+    config.tool_urls = {
+        'duckdb': f"{base_url}/files/duckdb_cli-linux-amd64.zip",
+    }
+    config.association_urls = {
+        'HPOA': f"{base_url}/files/phenotype.hpoa",
+        'MPA': f"{base_url}/files/gene_phenotype.10090.tsv.gz",
+        'ZPA': f"{base_url}/files/gene_phenotype.7955.tsv.gz",
+    }
+    config.jobs = jobs
+    config.oak_backend = 'python'
+    config.labeler = 'streaming'
+
+    runner = PipelineRunner(config)
+    runner.setup()
+    runner.run_comparisons(list(COMPARISONS))
+    tarballs = [config.working_dir /
+                config.tarball_name(getattr(config, f"{key}_prefix"))
+                for key in COMPARISONS]
+    runner.upload_results_to_zenodo('1', 'benchmark-token', 'benchmark',
+                                    tarballs, base_url=f"{base_url}/api")
+    return runner.metrics.snapshot()
+
+
+def summarize(metrics: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Reduce pipeline metrics to the benchmarked figures of each stage.
+
+    Peak memory is the peak RSS of the stage's commands if it ran any, and
+    otherwise the peak RSS of the pipeline process when the stage finished.
+    Throughput is the downloaded, written or (for uploads) read bytes per
+    second of wall time.
+    """
+    summary = {}
+    for name, record in metrics.items():
+        wall = record['wall_seconds']
+        if record.get('commands'):
+            peak_rss = record['child_max_rss_bytes']
+        else:
+            peak_rss = record.get('process_max_rss_bytes', 0)
+        volume = (record.get('downloaded_bytes') or record.get('output_bytes')
+                  or record.get('input_bytes') or 0)
+        summary[name] = {
+            'wall_seconds': wall,
+            'cpu_seconds': round(record['thread_cpu_seconds'] +
+                                 record['child_user_cpu_seconds'] +
+                                 record['child_system_cpu_seconds'], 3),
+            'peak_rss_bytes': peak_rss,
+            'throughput_bytes_per_second': round(volume / wall) if wall else 0,
+            'output_lines': sum(record.get('output_lines', {}).values()),
+        }
+    return summary
+
+
+def compare_with_baseline(results: Dict, baseline: Dict, threshold: float,
+                          min_seconds: float, min_rss_bytes: int) -> List[str]:
+    """
+    Return a description of every stage that regressed against the baseline.
+
+    A stage regresses if its wall time or peak RSS exceeds the baseline by
+    more than threshold (a fraction) and by more than the absolute noise
+    floor (min_seconds / min_rss_bytes).
+    """
+    regressions = []
+    for name, current in results['stages'].items():
+        previous = baseline['stages'].get(name)
+        if previous is None:
+            continue
+        for field, floor in (('wall_seconds', min_seconds),
+                             ('peak_rss_bytes', min_rss_bytes)):
+            before, after = previous[field], current[field]
+            if after > before * (1 + threshold) and after - before > floor:
+                change = (after - before) / before * 100 if before else float('inf')
+                regressions.append(f"{name}: {field} {before} -> {after} (+{change:.0f}%)")
+    return regressions
+
+
+def print_report(results: Dict, baseline: Optional[Dict]) -> None:
+    """Print per-stage figures, with the change against the baseline."""
+    print(f"{'stage':<36} {'wall (s)':>9} {'vs base':>8} {'peak RSS':>11} "
+          f"{'throughput':>13} {'lines':>10}")
+    for name, stage in results['stages'].items():
+        change = ''
+        previous = (baseline or {}).get('stages', {}).get(name)
+        if previous and previous['wall_seconds']:
+            ratio = stage['wall_seconds'] / previous['wall_seconds'] - 1
+            change = f"{ratio * 100:+.0f}%"
+        print(f"{name:<36} {stage['wall_seconds']:>9.2f} {change:>8} "
+              f"{format_bytes(stage['peak_rss_bytes']):>11} "
+              f"{format_bytes(stage['throughput_bytes_per_second']) + '/s':>13} "
+              f"{stage['output_lines']:>10}")
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline offline on synthetic data")
+    parser.add_argument('--terms', type=int, default=500,
+                        help='Terms per synthetic ontology (default: 500)')
+    parser.add_argument('--genes', type=int, default=1000,
+                        help='Genes per MP/ZP association table (default: 1000)')
+    parser.add_argument('--diseases', type=int, default=1000,
+                        help='Diseases in the HPO annotation table (default: 1000)')
+    parser.add_argument('--annotations', type=int, default=5,
+                        help='Phenotypes per gene or disease (default: 5)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Random seed for the synthetic data (default: 1)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Pipeline stages to run in parallel (default: 1)')
+    parser.add_argument('--workdir', type=Path, default=None,
+                        help='Directory for fixtures and outputs, kept after the run '
+                             '(default: a temporary directory that is removed)')
+    parser.add_argument('--results', type=Path, default=Path('benchmark_results.json'),
+                        help='Where to write the results (default: benchmark_results.json)')
+    parser.add_argument('--baseline', type=Path, default=Path('benchmark_baseline.json'),
+                        help='Baseline to compare with (default: benchmark_baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store the results as the new baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown or memory growth as a fraction (default: 0.25)')
+    parser.add_argument('--min-seconds', type=float, default=0.5,
+                        help='Ignore wall-time increases smaller than this (default: 0.5)')
+    parser.add_argument('--min-rss-mb', type=float, default=32,
+                        help='Ignore peak RSS increases smaller than this (default: 32)')
+    args = parser.parse_args()
+    # The pipeline changes into its working directory
+    args.results = args.results.absolute()
+    args.baseline = args.baseline.absolute()
+
+    parameters = {'terms': args.terms, 'genes': args.genes,
+                  'diseases': args.diseases, 'annotations': args.annotations,
+                  'seed': args.seed, 'jobs': args.jobs}
+    baseline = None
+    if not args.save_baseline and args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get('parameters') != parameters:
+            sys.exit(f"Baseline {args.baseline} was recorded with different "
+                     f"parameters: {baseline.get('parameters')}")
+
+    workspace = (args.workdir.absolute() if args.workdir
+                 else Path(tempfile.mkdtemp(prefix='pheno-benchmark-')))
+    fixtures = workspace / 'fixtures'
+    server = None
+    try:
+        print(f"Generating synthetic data in {fixtures}...")
+        generate_fixtures(fixtures, args.terms, args.genes, args.diseases,
+                          args.annotations, args.seed)
+        server = StandInServer(fixtures)
+        base_url = server.start()
+        metrics = run_pipeline(workspace, fixtures, base_url, args.jobs)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if args.workdir is None:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    results = {'parameters': parameters, 'stages': summarize(metrics)}
+    args.results.write_text(json.dumps(results, indent=2) + '\n')
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + '\n')
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    regressions = compare_with_baseline(
+        results, baseline, args.threshold, args.min_seconds,
+        int(args.min_rss_mb * 1024 * 1024))
+    if regressions:
+        print(f"Regressions above {args.threshold * 100:.0f}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions above {args.threshold * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Convert a binary similarity result back into a labeled similarity TSV.
+
+With --binary, every labeled result is also written as *.simbin: a term
+dictionary, fixed-width rows of int32 term indexes and float32 scores, and a
+JSON metadata trailer (after the rows) holding the dictionary and the ontology
+versions. In Python, load it without parsing with
+run_pipeline.read_binary_result, which memory-maps the rows as a NumPy
+structured array. This script writes the TSV form (requires numpy).
+
+Usage:
+    python binary_to_tsv.py HP_vs_HP_semsimian_phenio_YYYYMMDD.simbin [-o result.tsv]
+"""
+
+import argparse
+from pathlib import Path
+
+from run_pipeline import binary_result_to_tsv
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Convert a binary similarity result (*.simbin) into a labeled TSV")
+    parser.add_argument('input', type=str,
+                        help='Binary similarity result')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Output TSV (default: <input> with a .tsv suffix)')
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    output_path = (Path(args.output) if args.output
+                   else input_path.with_suffix('.tsv'))
+    if not args.output and output_path.exists():
+        parser.error(f"{output_path} exists; choose the output with -o")
+    rows = binary_result_to_tsv(input_path, output_path)
+    print(f"Wrote {rows} rows to {output_path}")
+
+
+if __name__ == '__main__':
+    main()
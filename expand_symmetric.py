@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Expand a symmetric similarity result into the full pair matrix.
+
+With --symmetric, same-ontology comparisons (HP vs HP) store each unordered
+pair of terms once, as the upper triangle of the pair matrix; their
+_log.yaml contains 'symmetric: true'. This script writes the full matrix,
+adding the mirrored (object, subject) row of every off-diagonal pair.
+
+Usage:
+    python expand_symmetric.py HP_vs_HP_semsimian_phenio_YYYYMMDD.tsv [-o full.tsv]
+"""
+
+import argparse
+from pathlib import Path
+
+from run_pipeline import expand_symmetric_result
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Expand a symmetric (upper triangle) similarity TSV into the full matrix")
+    parser.add_argument('input', type=str,
+                        help='Symmetric similarity TSV (labeled or unlabeled)')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Output TSV (default: <input>_full.tsv)')
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    output_path = (Path(args.output) if args.output
+                   else input_path.with_name(f"{input_path.stem}_full.tsv"))
+    rows = expand_symmetric_result(input_path, output_path)
+    print(f"Wrote {rows} rows to {output_path}")
+
+
+if __name__ == '__main__':
+    main()
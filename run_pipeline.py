@@ -27,12 +27,23 @@ Examples:
 """
 
 import argparse
+import contextvars
+import csv
 import gzip
+import hashlib
+import heapq
 import http.client
+import importlib.util
 import json
 import logging
+import math
 import os
+import resource
+import shlex
 import shutil
+import sqlite3
+import ssl
+import struct
 import subprocess
 import sys
 import tarfile
@@ -42,9 +53,13 @@ import urllib.error
 import urllib.parse
 import urllib.request
 import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Deque, Dict, List, Optional, Union
 
 
 # Configure logging
@@ -54,24 +69,822 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Comparison definitions, keyed by the config attribute prefix
+COMPARISONS: Dict[str, Dict[str, str]] = {
+    'hp_vs_hp': dict(
+        ont1='hp', ont2='hp',
+        ont1_root='HP:0000118', ont2_root='HP:0000118',
+        ont1_prefix='HPO', ont2_prefix='HPO',
+        association_file='hpoa.tsv', association_type='hpoa'
+    ),
+    'hp_vs_mp': dict(
+        ont1='hp', ont2='mp',
+        ont1_root='HP:0000118', ont2_root='MP:0000001',
+        ont1_prefix='HPO', ont2_prefix='MP',
+        association_file='mpa.tsv', association_type='g2t'
+    ),
+    'hp_vs_zp': dict(
+        ont1='hp', ont2='zp',
+        ont1_root='HP:0000118', ont2_root='ZP:0000000',
+        ont1_prefix='HPO', ont2_prefix='ZP',
+        association_file='zpa.tsv', association_type='g2t'
+    ),
+}
+
+# Download locations of the command-line tools
+TOOL_URLS: Dict[str, str] = {
+    'duckdb': "https://github.com/duckdb/duckdb/releases/download/v0.10.3/duckdb_cli-linux-amd64.zip",
+}
+
+# Base URL of the pre-built SemSQL databases fetched by oaklib for sqlite:obo:<name>
+# (https://github.com/INCATools/semantic-sql); overridable like oaklib's
+SEMSQL_URL_BASE = os.environ.get('OAKLIB_SEMSQL_SQLITE_URL_BASE',
+                                 "https://semanticsql.berkeleybop.io")
+
+# Headers sent with every download (the SemSQL CDN rejects urllib's default User-Agent)
+DOWNLOAD_HEADERS: Dict[str, str] = {'User-Agent': 'pheno-compare'}
+
+# Download locations of the association tables
+ASSOCIATION_URLS: Dict[str, str] = {
+    # HPOA (Human Phenotype Ontology Annotations)
+    'HPOA': "http://purl.obolibrary.org/obo/hp/hpoa/phenotype.hpoa",
+    # MPA (Mouse Phenotype Annotations)
+    'MPA': "https://data.monarchinitiative.org/dipper-kg/final/tsv/gene_associations/gene_phenotype.10090.tsv.gz",
+    # ZPA (Zebrafish Phenotype Annotations)
+    'ZPA': "https://data.monarchinitiative.org/dipper-kg/final/tsv/gene_associations/gene_phenotype.7955.tsv.gz",
+}
+
+
+def format_bytes(num_bytes: float) -> str:
+    """Format a byte count into a readable string."""
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TiB"
+
+
+class IncompleteDownloadError(Exception):
+    """Raised when a download ends before the expected number of bytes."""
+
+
+# Errors after which an interrupted download is retried (see is_retryable_download_error)
+RETRYABLE_DOWNLOAD_ERRORS = (OSError, http.client.HTTPException,
+                             IncompleteDownloadError)
+
+# Upload progress of an unfinished Zenodo release, kept in the working dir
+ZENODO_UPLOAD_STATE = 'zenodo_upload_state.json'
+
+# Files smaller than this are never split into parallel range requests
+PARALLEL_RANGE_MIN_BYTES = 64 * 1024 * 1024
+
+
+class ZenodoUploadError(RuntimeError):
+    """Raised when a Zenodo upload fails; retryable for 5xx/429 and bad checksums."""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def file_digest(file_path: Path, algorithm: str = 'sha256',
+                chunk_size: int = 1024 * 1024) -> str:
+    """Return the hex digest of a file with a hashlib algorithm (e.g., 'md5')."""
+    digest = hashlib.new(algorithm)
+    with file_path.open('rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def zenodo_md5(checksum: Optional[str]) -> Optional[str]:
+    """Normalize a Zenodo checksum ("md5:<hex>" or bare hex) to hex."""
+    if not checksum:
+        return None
+    algorithm, _, value = checksum.rpartition(':')
+    if algorithm and algorithm.lower() != 'md5':
+        return None
+    return value.lower()
+
+
+def is_retryable_download_error(error: Exception) -> bool:
+    """Return True for transient network errors, False for client HTTP errors."""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code == 429
+    return True
+
+
+class StreamingTsvFilter:
+    """
+    Streaming gzip decompressor that projects and filters TSV rows.
+
+    Compressed bytes are passed to feed() as they arrive; matching rows are
+    written to a temporary file that close() renames to the output path.
+    """
 
-class ProgressTimer:
-    """A simple timer that prints elapsed time periodically for long-running operations."""
+    def __init__(self, output_path: Path, columns: Optional[List[int]] = None,
+                 filter_column: Optional[int] = None, prefix: Optional[str] = None):
+        """
+        Initialize the filter.
+
+        Args:
+            output_path: Path of the filtered output file
+            columns: Zero-based columns to keep (default: all, unfiltered bytes)
+            filter_column: Zero-based column that must start with prefix
+            prefix: Required prefix of filter_column (e.g., 'MP:')
+        """
+        self.output_path = output_path
+        self.tmp_path = output_path.with_name(output_path.name + '.tmp')
+        self.columns = columns
+        self.filter_column = filter_column
+        self.prefix = prefix.encode('utf-8') if prefix else None
+        self.min_fields = 1 + max(
+            (columns or []) + ([filter_column] if filter_column is not None else []),
+            default=0)
+        self.handle = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard all output and start again from the first compressed byte."""
+        if self.handle is not None:
+            self.handle.close()
+        self.handle = open(self.tmp_path, 'wb')
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.in_member = False
+        self.pending = b''
+        self.kept = 0
+        self.dropped = 0
+
+    def feed(self, data: bytes) -> None:
+        """Decompress a chunk of compressed bytes and write the matching rows."""
+        while data:
+            self.in_member = True
+            self._write(self.decompressor.decompress(data))
+            data = b''
+            if self.decompressor.eof:
+                # Start of the next member of a multi-member gzip file
+                data = self.decompressor.unused_data
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                self.in_member = False
+
+    def _write(self, data: bytes) -> None:
+        if self.columns is None and self.filter_column is None:
+            self.handle.write(data)
+            return
+
+        lines = (self.pending + data).split(b'\n')
+        self.pending = lines.pop()
+        self._write_lines(lines)
+
+    def _write_lines(self, lines: List[bytes]) -> None:
+        rows = []
+        for line in lines:
+            fields = line.rstrip(b'\r').split(b'\t')
+            if len(fields) < self.min_fields or (
+                    self.prefix is not None and
+                    not fields[self.filter_column].startswith(self.prefix)):
+                self.dropped += 1
+                continue
+            if self.columns is not None:
+                fields = [fields[index] for index in self.columns]
+            rows.append(b'\t'.join(fields))
+            self.kept += 1
+        if rows:
+            self.handle.write(b'\n'.join(rows) + b'\n')
+
+    def close(self) -> None:
+        """Flush remaining rows and move the output into place."""
+        if self.in_member:
+            raise IncompleteDownloadError(
+                f"Truncated gzip data for {self.output_path.name}")
+        if self.pending:
+            self._write_lines([self.pending])
+            self.pending = b''
+        self.handle.close()
+        os.replace(self.tmp_path, self.output_path)
+
+    def discard(self) -> None:
+        """Close and remove the temporary output."""
+        self.handle.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+# Column order of labeled similarity results
+LABELED_COLUMNS = [
+    'subject_id', 'subject_label', 'subject_source',
+    'object_id', 'object_label', 'object_source',
+    'ancestor_id', 'ancestor_label', 'ancestor_source',
+    'object_information_content', 'subject_information_content',
+    'ancestor_information_content', 'jaccard_similarity',
+    'cosine_similarity', 'dice_similarity', 'phenodigm_score'
+]
+
+# Similarity columns that --top-k can rank objects by
+TOP_K_METRICS: Dict[str, str] = {
+    'phenodigm': 'phenodigm_score',
+    'jaccard': 'jaccard_similarity',
+    'ancestor-ic': 'ancestor_information_content',
+}
+
+# Minimum number of row blocks a symmetric self comparison is split into; block
+# k is compared against the terms from its first row onwards, so with B blocks
+# about 1/2 + 1/(2B) of the full cross product is computed
+SYMMETRIC_BLOCKS = 8
+
+# Approximate memory of a label map entry beyond its text (two str objects and
+# a dict slot), and of a buffered row beyond its text (a str, int and tuple)
+LABEL_ENTRY_OVERHEAD = 200
+ROW_OVERHEAD = 150
+
+# Rows per Parquet row group, and the size of the sorted runs Parquet output
+# is spilled in when --max-memory is not set
+PARQUET_ROW_GROUP_ROWS = 1024 * 1024
+PARQUET_SORT_RUN_BYTES = 256 * 1024 * 1024
+
+# Labeled result columns stored as float32 scores in Parquet output
+SCORE_COLUMNS = [
+    'object_information_content', 'subject_information_content',
+    'ancestor_information_content', 'jaccard_similarity',
+    'cosine_similarity', 'dice_similarity', 'phenodigm_score'
+]
+
+
+def tsv_field(value: str) -> str:
+    """Quote a TSV field the way DuckDB's CSV writer does."""
+    if '\t' in value or '"' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def labeled_line(fields: List[str], positions: List[Optional[int]],
+                 subject_label: str, object_label: str) -> str:
+    """Format a similarity row as a LABELED_COLUMNS line with the given labels."""
+    values = {'subject_label': subject_label, 'object_label': object_label}
+    return '\t'.join(
+        tsv_field(values[name]) if name in values
+        else (fields[position] if position is not None else '')
+        for name, position in zip(LABELED_COLUMNS, positions)
+    ) + '\n'
+
+
+def mirror_positions(header: List[str]) -> List[int]:
+    """Column positions of a similarity row with its subject and object swapped."""
+    index = {name: position for position, name in enumerate(header)}
+    positions = list(range(len(header)))
+    for name in header:
+        if name.startswith('subject_'):
+            mirrored = 'object_' + name[len('subject_'):]
+            if mirrored in index:
+                positions[index[name]] = index[mirrored]
+                positions[index[mirrored]] = index[name]
+    return positions
+
+
+def expand_symmetric_result(input_path: Path, output_path: Path) -> int:
+    """
+    Expand a symmetric (upper triangle) similarity TSV into the full matrix.
+
+    Every row with different subject and object is followed by its mirror,
+    with the subject and object IDs, labels, sources and information content
+    swapped; the shared scores apply to both directions.
+
+    Returns:
+        Number of rows written
+    """
+    written = 0
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    with input_path.open(encoding='utf-8') as in_file, \
+            tmp_path.open('w', encoding='utf-8') as out_file:
+        header_line = in_file.readline()
+        header = header_line.rstrip('\r\n').split('\t')
+        positions = mirror_positions(header)
+        subject_pos = header.index('subject_id')
+        object_pos = header.index('object_id')
+        out_file.write(header_line)
+        for line in in_file:
+            fields = line.rstrip('\r\n').split('\t')
+            out_file.write('\t'.join(fields) + '\n')
+            written += 1
+            if fields[subject_pos] != fields[object_pos]:
+                out_file.write('\t'.join(fields[position] for position in positions) + '\n')
+                written += 1
+    os.replace(tmp_path, output_path)
+    return written
+
+
+def load_term_labels(labels_path: Path) -> Dict[str, str]:
+    """Load a 'CURIE<TAB>label' file into an interned CURIE -> label map."""
+    labels: Dict[str, str] = {}
+    with labels_path.open(encoding='utf-8') as handle:
+        for line in handle:
+            fields = line.rstrip('\r\n').split('\t')
+            if not fields[0]:
+                continue
+            curie = sys.intern(fields[0])
+            if curie not in labels:
+                labels[curie] = sys.intern(fields[1] if len(fields) > 1 else '')
+    return labels
+
+
+def read_term_list(term_path: Path) -> Dict[str, str]:
+    """Load a 'CURIE ! label' term list into an ordered CURIE -> line map."""
+    terms: Dict[str, str] = {}
+    with term_path.open(encoding='utf-8') as handle:
+        for line in handle:
+            curie = line.split(' ! ', 1)[0].strip()
+            if curie:
+                terms.setdefault(curie, line if line.endswith('\n') else line + '\n')
+    return terms
+
+
+def read_information_content(ic_path: Path) -> Dict[str, float]:
+    """Load a headerless 'CURIE<TAB>IC' file."""
+    scores: Dict[str, float] = {}
+    with ic_path.open(encoding='utf-8') as handle:
+        for line in handle:
+            fields = line.rstrip('\r\n').split('\t')
+            if len(fields) >= 2 and fields[0]:
+                try:
+                    scores[fields[0]] = float(fields[1])
+                except ValueError:
+                    continue
+    return scores
+
+
+def read_ancestors(ancestors_path: Path) -> Dict[str, frozenset]:
+    """Load a 'CURIE<TAB>ancestor,ancestor,...' file (see write_ancestors)."""
+    ancestors: Dict[str, frozenset] = {}
+    with ancestors_path.open(encoding='utf-8') as handle:
+        for line in handle:
+            curie, _, closure = line.rstrip('\r\n').partition('\t')
+            if curie:
+                ancestors[curie] = frozenset(filter(None, closure.split(',')))
+    return ancestors
+
+
+def read_ontology_version(db_path: Path) -> Optional[str]:
+    """
+    Read the owl:versionIRI of the ontology declared in a SemSQL database.
+
+    The header statements are queried directly (read-only), without loading
+    the ontology through oaklib.
+    """
+    connection = sqlite3.connect(f"{Path(db_path).absolute().as_uri()}?mode=ro", uri=True)
+    try:
+        row = connection.execute(
+            "SELECT version.object, version.value FROM statements AS version "
+            "WHERE version.predicate = 'owl:versionIRI' AND EXISTS ("
+            "SELECT 1 FROM statements AS ontology "
+            "WHERE ontology.subject = version.subject "
+            "AND ontology.predicate = 'rdf:type' AND ontology.object = 'owl:Ontology') "
+            "LIMIT 1").fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return None
+    return row[0] or row[1]
+
+
+def parse_version_iri(metadata: str) -> Optional[str]:
+    """Extract the first owl:versionIRI from 'runoak ontology-metadata --all' YAML output."""
+    lines = metadata.splitlines()
+    for position, line in enumerate(lines):
+        key, _, value = line.partition(':versionIRI:')
+        if key != 'owl':
+            continue
+        if not value.strip() and position + 1 < len(lines):
+            value = lines[position + 1].strip()
+            if not value.startswith('-'):
+                return None
+            value = value[1:]
+        return value.strip().strip('\'"') or None
+    return None
+
+
+# Binary similarity results (--binary): a preamble, fixed-width rows and a
+# JSON metadata trailer. Term columns hold int32 indexes into the term
+# dictionary, the other text columns int32 indexes into a string table, and
+# scores are float32 (NaN for 'None')
+BINARY_MAGIC = b'PHSIMBIN'
+BINARY_FORMAT_VERSION = 1
+BINARY_ROWS_OFFSET = 64
+BINARY_TERM_COLUMNS = ['subject_id', 'object_id', 'ancestor_id']
+BINARY_STRING_COLUMNS = ['subject_source', 'object_source', 'ancestor_label',
+                         'ancestor_source']
+BINARY_ROW = struct.Struct(
+    f"<{len(BINARY_TERM_COLUMNS) + len(BINARY_STRING_COLUMNS)}i{len(SCORE_COLUMNS)}f")
+BINARY_TRAILER = struct.Struct('<Q8s')
+
+
+def binary_row_dtype():
+    """NumPy structured dtype of a binary result row (see BINARY_ROW)."""
+    import numpy
+    return numpy.dtype([(name, '<i4') for name in BINARY_TERM_COLUMNS + BINARY_STRING_COLUMNS]
+                       + [(name, '<f4') for name in SCORE_COLUMNS])
+
+
+def write_binary_result(tsv_path: Path, labels_path: Path, output_path: Path,
+                        metadata: Dict, batch_rows: int = 65536) -> int:
+    """
+    Write a labeled similarity TSV as a binary similarity result.
+
+    The term dictionary holds the terms of labels_path (a *_terms.tsv file)
+    in file order with their labels, followed by any other term of the
+    result (e.g., ancestors outside both term lists). Labels quoted by
+    tsv_field in the TSV are compared with the dictionary unquoted. The rows
+    are written in one pass after a BINARY_ROWS_OFFSET-byte preamble; the
+    metadata (ontology versions, dictionary, string table and row count)
+    follows them as a JSON trailer, like a Parquet footer, as the row count
+    is only known at the end.
+
+    Returns:
+        Number of rows written
+    """
+    term_index: Dict[str, int] = {}
+    terms: List[List[str]] = []
+    for curie, label in load_term_labels(labels_path).items():
+        term_index[curie] = len(terms)
+        terms.append([curie, label])
+    string_index: Dict[str, int] = {}
+    strings: List[str] = []
+    mismatched = 0
+
+    def term(curie: str, label: Optional[str]) -> int:
+        nonlocal mismatched
+        index = term_index.get(curie)
+        if index is None:
+            index = term_index[curie] = len(terms)
+            terms.append([curie, label or ''])
+        elif label is not None and label != terms[index][1]:
+            mismatched += 1
+        return index
+
+    def string(value: str) -> int:
+        index = string_index.get(value)
+        if index is None:
+            index = string_index[value] = len(strings)
+            strings.append(value)
+        return index
+
+    rows = 0
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    with tsv_path.open(encoding='utf-8', newline='') as in_file, \
+            tmp_path.open('wb') as out_file:
+        # The csv reader undoes the DuckDB-style quoting of labels
+        reader = csv.reader(in_file, delimiter='\t')
+        header = next(reader)
+        index = {name: position for position, name in enumerate(header)}
+        subject_pos, object_pos, ancestor_pos = (index[name] for name in BINARY_TERM_COLUMNS)
+        subject_label_pos = index['subject_label']
+        object_label_pos = index['object_label']
+        string_positions = [index[name] for name in BINARY_STRING_COLUMNS]
+        score_positions = [index[name] for name in SCORE_COLUMNS]
+        pack = BINARY_ROW.pack
+        nan = float('nan')
+
+        out_file.write(BINARY_MAGIC.ljust(BINARY_ROWS_OFFSET, b'\0'))
+        batch: List[bytes] = []
+        for fields in reader:
+            batch.append(pack(
+                term(fields[subject_pos], fields[subject_label_pos]),
+                term(fields[object_pos], fields[object_label_pos]),
+                term(fields[ancestor_pos], None),
+                *(string(fields[position]) for position in string_positions),
+                *(nan if fields[position] in ('None', '') else float(fields[position])
+                  for position in score_positions)))
+            if len(batch) >= batch_rows:
+                out_file.write(b''.join(batch))
+                rows += len(batch)
+                batch.clear()
+        out_file.write(b''.join(batch))
+        rows += len(batch)
+
+        trailer = json.dumps({
+            **metadata,
+            'format_version': BINARY_FORMAT_VERSION,
+            'rows': rows,
+            'rows_offset': BINARY_ROWS_OFFSET,
+            'row_size': BINARY_ROW.size,
+            'term_columns': BINARY_TERM_COLUMNS,
+            'string_columns': BINARY_STRING_COLUMNS,
+            'score_columns': SCORE_COLUMNS,
+            'columns': header,
+            'terms': terms,
+            'strings': strings,
+        }).encode('utf-8')
+        out_file.write(trailer)
+        out_file.write(BINARY_TRAILER.pack(len(trailer), BINARY_MAGIC))
+    os.replace(tmp_path, output_path)
+    if mismatched:
+        logger.warning(f"{output_path.name}: {mismatched} term labels differ from "
+                       f"{labels_path.name}; the dictionary keeps the latter")
+    return rows
+
+
+def read_binary_result(path: Path):
+    """
+    Memory-map a binary similarity result (see write_binary_result).
+
+    Only the metadata trailer is read: the rows are a read-only NumPy memmap,
+    so loading a full matrix takes no time and no copy.
+
+    Returns:
+        Tuple of (metadata, rows). rows is a structured array with one field
+        per BINARY_ROW column; term columns index metadata['terms']
+        ([CURIE, label] pairs) and string columns metadata['strings']
+    """
+    import numpy
+
+    with path.open('rb') as handle:
+        handle.seek(-BINARY_TRAILER.size, os.SEEK_END)
+        length, magic = BINARY_TRAILER.unpack(handle.read(BINARY_TRAILER.size))
+        if magic != BINARY_MAGIC:
+            raise RuntimeError(f"{path} is not a binary similarity result")
+        handle.seek(-BINARY_TRAILER.size - length, os.SEEK_END)
+        metadata = json.loads(handle.read(length))
+    if metadata['format_version'] != BINARY_FORMAT_VERSION:
+        raise RuntimeError(
+            f"{path} has binary format version {metadata['format_version']}, "
+            f"expected {BINARY_FORMAT_VERSION}")
+
+    dtype = binary_row_dtype()
+    if not metadata['rows']:
+        return metadata, numpy.zeros(0, dtype=dtype)
+    rows = numpy.memmap(path, dtype=dtype, mode='r', offset=metadata['rows_offset'],
+                        shape=(metadata['rows'],))
+    return metadata, rows
+
+
+def binary_result_to_tsv(path: Path, output_path: Path, batch_rows: int = 65536) -> int:
+    """
+    Convert a binary similarity result back into a labeled similarity TSV.
+
+    The TSV has the columns of the original, with labels quoted by
+    tsv_field as the labelers write them. Scores are float32 and are
+    written in their shortest exact form (about 7 significant digits).
+
+    Returns:
+        Number of rows written
+    """
+    import numpy
+
+    metadata, rows = read_binary_result(path)
+    curies = numpy.array([curie for curie, _label in metadata['terms']] or [''], dtype=object)
+    labels = numpy.array([tsv_field(label) for _curie, label in metadata['terms']] or [''],
+                         dtype=object)
+    strings = numpy.array(metadata['strings'] or [''], dtype=object)
+    header = metadata['columns']
+
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    with tmp_path.open('w', encoding='utf-8') as out_file:
+        out_file.write('\t'.join(header) + '\n')
+        for start in range(0, len(rows), batch_rows):
+            batch = rows[start:start + batch_rows]
+            columns = {}
+            for name in BINARY_TERM_COLUMNS:
+                columns[name] = curies[batch[name]]
+            columns['subject_label'] = labels[batch['subject_id']]
+            columns['object_label'] = labels[batch['object_id']]
+            for name in BINARY_STRING_COLUMNS:
+                columns[name] = strings[batch[name]]
+            for name in SCORE_COLUMNS:
+                scores = batch[name]
+                columns[name] = numpy.where(numpy.isnan(scores), 'None', scores.astype(str))
+            out_file.writelines(
+                '\t'.join(row) + '\n'
+                for row in zip(*(columns[name].tolist() for name in header)))
+    os.replace(tmp_path, output_path)
+    return len(rows)
+
+
+class ParallelGzipWriter:
+    """
+    Write-only file object producing pigz-style multi-member gzip output.
+
+    Data is cut into fixed-size blocks that are compressed as independent
+    gzip members by a thread pool (zlib releases the GIL) and written in
+    order. Concatenated members are a valid gzip stream, so the output can
+    be read by gzip, tar xzf and Python's gzip/tarfile modules.
+    """
+
+    def __init__(self, fileobj, threads: int, block_size: int = 4 * 1024 * 1024,
+                 compresslevel: int = 6):
+        self.fileobj = fileobj
+        self.block_size = block_size
+        self.compresslevel = compresslevel
+        self.pool = ThreadPoolExecutor(max_workers=max(1, threads))
+        self.max_pending = 2 * max(1, threads)
+        self.pending = []
+        self.buffer = bytearray()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _compress(self, block: bytes) -> bytes:
+        return gzip.compress(block, compresslevel=self.compresslevel, mtime=0)
+
+    def _submit(self, block: bytes) -> None:
+        self.pending.append(self.pool.submit(self._compress, block))
+        while len(self.pending) >= self.max_pending:
+            self._flush_one()
+
+    def _flush_one(self) -> None:
+        compressed = self.pending.pop(0).result()
+        self.fileobj.write(compressed)
+        self.bytes_out += len(compressed)
+
+    def write(self, data: bytes) -> int:
+        self.buffer.extend(data)
+        self.bytes_in += len(data)
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def tell(self) -> int:
+        """Number of uncompressed bytes written so far."""
+        return self.bytes_in
+
+    def append_gzip(self, gzip_path: Path, size: int) -> None:
+        """
+        Append an already gzip-compressed file as is, after the data written so far.
+
+        Args:
+            gzip_path: gzip file (e.g., written by GzipCopyWriter)
+            size: Uncompressed size of the file's content
+        """
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self._flush_one()
+        with gzip_path.open('rb') as handle:
+            shutil.copyfileobj(handle, self.fileobj, 1024 * 1024)
+        self.bytes_in += size
+        self.bytes_out += gzip_path.stat().st_size
+
+    def close(self) -> None:
+        """Compress the remaining data and wait for all blocks to be written."""
+        if self.buffer or not self.bytes_in:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self._flush_one()
+        self.pool.shutdown()
+
+
+class GzipCopyWriter:
+    """
+    Text file writer that also writes a parallel-gzip copy of its content.
+
+    Writing a result and its compressed copy in one pass lets the tarball
+    take the copy as is (ParallelGzipWriter.append_gzip) instead of reading
+    the result back and compressing it again.
+    """
+
+    def __init__(self, path: Path, copy_path: Path, threads: int):
+        self.file = path.open('wb')
+        self.copy_file = copy_path.open('wb')
+        self.copy = ParallelGzipWriter(self.copy_file, threads)
+
+    def write(self, text: str) -> int:
+        data = text.encode('utf-8')
+        self.file.write(data)
+        self.copy.write(data)
+        return len(text)
+
+    def writelines(self, lines) -> None:
+        self.write(''.join(lines))
+
+    def close(self) -> None:
+        """Close the file, then finish the copy (so the copy is never older)."""
+        self.file.close()
+        self.copy.close()
+        self.copy_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ProgressStatus:
+    """
+    Machine-readable status of the pipeline, written as JSON for schedulers to poll.
+
+    Holds the progress-timed operations that are running (see ProgressTimer)
+    and the overall pipeline state. The file is replaced atomically whenever
+    an operation starts, reports progress or finishes; nothing is written
+    until a path is set.
+    """
+
+    def __init__(self):
+        self.path: Optional[Path] = None
+        self.state = "running"
+        self.operations: Dict[int, Dict] = {}
+        self.finished = 0
+        self.lock = threading.Lock()
+
+    def update(self, key: int, entry: Dict) -> None:
+        """Add or update the entry of a running operation."""
+        with self.lock:
+            self.operations[key] = entry
+            self._write()
+
+    def remove(self, key: int) -> None:
+        """Remove a finished operation."""
+        with self.lock:
+            if self.operations.pop(key, None) is not None:
+                self.finished += 1
+            self._write()
+
+    def set_state(self, state: str) -> None:
+        """Set the overall pipeline state (running, completed or failed)."""
+        with self.lock:
+            self.state = state
+            self._write()
+
+    def _write(self) -> None:
+        if self.path is None:
+            return
+        status = {
+            "state": self.state,
+            "pid": os.getpid(),
+            "updated": datetime.now().isoformat(timespec='seconds'),
+            "finished_operations": self.finished,
+            "operations": list(self.operations.values()),
+        }
+        try:
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            tmp_path.write_text(json.dumps(status, indent=2) + '\n')
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.debug(f"Could not write {self.path}: {e}")
+
+
+# Status of the running operations, written to config.status_file by PipelineRunner
+PROGRESS_STATUS = ProgressStatus()
+
+# Seconds between refreshes of the status file while an operation runs
+STATUS_INTERVAL = 5
 
-    def __init__(self, operation_name: str, update_interval: int = 30):
+
+class ProgressTimer:
+    """
+    A timer that reports elapsed time periodically for long-running operations.
+
+    When the amount of work done can be measured (pairs compared, bytes
+    downloaded or compressed), each update also reports the rate, the
+    percentage of the total and the estimated time remaining. The work done
+    is either polled from the progress callable or pushed with set_done()
+    and advance(). Running operations are listed in PROGRESS_STATUS.
+    """
+
+    def __init__(self, operation_name: str, update_interval: int = 30,
+                 progress: Optional[Callable[[], float]] = None,
+                 total: Optional[float] = None, unit: str = 'bytes'):
         """
         Initialize the progress timer.
 
         Args:
             operation_name: Name of the operation being timed
             update_interval: Seconds between progress updates (default: 30)
+            progress: Optional callable returning the amount of work done so far
+            total: Total amount of work, if known (see also set_total())
+            unit: Unit of the work amounts, 'bytes' or e.g. 'pairs'
         """
         self.operation_name = operation_name
         self.update_interval = update_interval
+        self.progress = progress
+        self.total = total
+        self.unit = unit
+        self.done: Optional[float] = None
+        self.initial_done: Optional[float] = None
+        self.stage = None
         self.start_time = None
         self.stop_flag = threading.Event()
+        self.lock = threading.Lock()
         self.thread = None
 
+    def set_total(self, total: Optional[float]) -> None:
+        """Set the total amount of work (e.g., from a Content-Length header)."""
+        self.total = total
+
+    def set_done(self, done: float) -> None:
+        """Set the amount of work done so far."""
+        with self.lock:
+            self.done = done
+            if self.initial_done is None:
+                # Work done before the timer started (e.g., a resumed download)
+                # does not count towards the rate
+                self.initial_done = done
+
+    def advance(self, amount: float) -> None:
+        """Add to the amount of work done (safe to call from several threads)."""
+        with self.lock:
+            if self.done is None:
+                self.done = self.initial_done = 0
+            self.done += amount
+
     def _format_elapsed(self, seconds: float) -> str:
         """Format elapsed seconds into a readable string."""
         if seconds < 60:
@@ -85,21 +898,83 @@ class ProgressTimer:
             mins = int((seconds % 3600) / 60)
             return f"{hours}h {mins}m"
 
+    def _format_amount(self, amount: float) -> str:
+        """Format an amount of work in the timer's unit."""
+        if self.unit == 'bytes':
+            return format_bytes(amount)
+        return f"{int(amount):,} {self.unit}"
+
+    def snapshot(self) -> Dict:
+        """Return the current progress as a status entry."""
+        if self.progress is not None:
+            try:
+                self.set_done(self.progress())
+            except OSError:
+                pass
+        elapsed = time.time() - self.start_time
+        entry = {
+            "operation": self.operation_name,
+            "stage": self.stage,
+            "started": datetime.fromtimestamp(self.start_time).isoformat(timespec='seconds'),
+            "elapsed_seconds": round(elapsed, 1),
+            "unit": self.unit,
+            "done": self.done,
+            "total": self.total,
+            "rate_per_second": None,
+            "percent": None,
+            "eta_seconds": None,
+        }
+        if self.done is None:
+            return entry
+        rate = max(self.done - self.initial_done, 0) / max(elapsed, 1e-6)
+        entry["rate_per_second"] = round(rate, 1)
+        if self.total:
+            done = min(self.done, self.total)
+            entry["percent"] = round(100.0 * done / self.total, 1)
+            if rate > 0:
+                entry["eta_seconds"] = round((self.total - done) / rate, 1)
+        return entry
+
+    def _report(self, entry: Dict) -> None:
+        """Log a progress update."""
+        elapsed = self._format_elapsed(entry["elapsed_seconds"])
+        if entry["done"] is None:
+            logger.info(f"  [{self.operation_name}] Still running... (elapsed: {elapsed})")
+            return
+        rate = (format_bytes(entry["rate_per_second"]) if self.unit == 'bytes'
+                else f"{entry['rate_per_second']:,.0f} {self.unit}")
+        done = (self._format_amount(entry['done']) if self.unit == 'bytes'
+                 else f"{int(entry['done']):,}")
+        parts = [f"{done} of {self._format_amount(entry['total'])}" if entry["total"]
+                 else self._format_amount(entry['done']),
+                 f"{rate}/s"]
+        if entry["eta_seconds"] is not None:
+            parts.append(f"ETA {self._format_elapsed(entry['eta_seconds'])}")
+        percent = f"{entry['percent']:.1f}% " if entry["percent"] is not None else ""
+        logger.info(f"  [{self.operation_name}] {percent}({', '.join(parts)}, "
+                    f"elapsed: {elapsed})")
+
     def _print_progress(self):
-        """Print progress updates until stopped."""
-        while not self.stop_flag.wait(self.update_interval):
-            if self.start_time is not None:
-                elapsed = time.time() - self.start_time
-                logger.info(
-                    f"  [{self.operation_name}] Still running... (elapsed: {self._format_elapsed(elapsed)})")
+        """Print progress updates, and refresh the status file, until stopped."""
+        last_report = time.time()
+        while not self.stop_flag.wait(min(STATUS_INTERVAL, self.update_interval)):
+            if self.start_time is None:
+                continue
+            entry = self.snapshot()
+            PROGRESS_STATUS.update(id(self), entry)
+            if time.time() - last_report >= self.update_interval:
+                last_report = time.time()
+                self._report(entry)
 
     def start(self):
         """Start the progress timer."""
         self.start_time = time.time()
+        self.stage = _current_stage_name.get()
         self.stop_flag.clear()
         self.thread = threading.Thread(
             target=self._print_progress, daemon=True)
         self.thread.start()
+        PROGRESS_STATUS.update(id(self), self.snapshot())
         logger.info(f"Starting: {self.operation_name}")
 
     def stop(self):
@@ -107,11 +982,15 @@ class ProgressTimer:
         if self.thread and self.thread.is_alive():
             self.stop_flag.set()
             self.thread.join(timeout=1)
+        PROGRESS_STATUS.remove(id(self))
 
         if self.start_time is not None:
             elapsed = time.time() - self.start_time
             logger.info(
                 f"Completed: {self.operation_name} (took {self._format_elapsed(elapsed)})")
+            record = _current_stage_metrics.get()
+            if record is not None:
+                record.setdefault("operations", {})[self.operation_name] = round(elapsed, 3)
 
     def __enter__(self):
         """Context manager entry."""
@@ -124,6 +1003,363 @@ class ProgressTimer:
         return False
 
 
+# Metrics record of the stage running in the current thread (see MetricsRecorder)
+_current_stage_metrics: contextvars.ContextVar = contextvars.ContextVar(
+    "current_stage_metrics", default=None)
+
+# Name of the stage running in the current thread, for per-stage command logs
+_current_stage_name: contextvars.ContextVar = contextvars.ContextVar(
+    "current_stage_name", default=None)
+
+# Lines of command output kept for the error message of a failed command
+ERROR_TAIL_LINES = 50
+
+# ru_maxrss is reported in KiB on Linux and in bytes on macOS
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# Output files whose lines are counted in the stage metrics
+COUNTED_SUFFIXES = ('.tsv', '.txt')
+
+
+def count_lines(path: Path, chunk_size: int = 1024 * 1024) -> int:
+    """Count the newline-terminated lines of a file."""
+    lines = 0
+    with path.open('rb') as handle:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            lines += chunk.count(b'\n')
+    return lines
+
+
+class SimilarityProgress:
+    """
+    Pairs compared by one or more similarity runs, estimated from their outputs.
+
+    Each run compares the terms of two term files and writes the rows of
+    each subject together. A finished run counts all of its pairs; a running
+    run counts every object for each subject seen in its output so far (read
+    incrementally, so each poll only scans the appended bytes). semsimian
+    compares all pairs before it writes any row, so a single run advances in
+    its writing phase; a comparison split into shards or blocks also
+    advances as each of them finishes.
+    """
+
+    def __init__(self, working_dir: Path):
+        self.working_dir = working_dir
+        self.runs: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    def add(self, set1_file: str, set2_file: str, output_file: str) -> None:
+        """Add a run comparing set1_file with set2_file into output_file."""
+        subjects = len(read_term_list(self.working_dir / set1_file))
+        objects = len(read_term_list(self.working_dir / set2_file))
+        path = self.working_dir / output_file
+        # An output left by an earlier run is ignored until it is rewritten
+        stale = path.stat() if path.exists() else None
+        self.runs[output_file] = {'pairs': subjects * objects, 'objects': objects,
+                                  'finished': False, 'offset': 0, 'partial': b'',
+                                  'subjects': set(),
+                                  'stale': stale and (stale.st_size, stale.st_mtime_ns)}
+
+    def finish(self, output_file: str) -> None:
+        """Mark a run as finished."""
+        self.runs[output_file]['finished'] = True
+
+    def total(self) -> int:
+        """Number of pairs compared by all runs."""
+        return sum(run['pairs'] for run in self.runs.values())
+
+    def _read_subjects(self, output_file: str, run: Dict) -> None:
+        path = self.working_dir / output_file
+        if not path.exists():
+            return
+        stat = path.stat()
+        if (stat.st_size, stat.st_mtime_ns) == run['stale']:
+            return
+        if stat.st_size < run['offset']:
+            run.update(offset=0, partial=b'', subjects=set())
+        with path.open('rb') as handle:
+            handle.seek(run['offset'])
+            for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+                run['offset'] += len(chunk)
+                lines = (run['partial'] + chunk).split(b'\n')
+                run['partial'] = lines.pop()
+                run['subjects'].update(line.split(b'\t', 1)[0] for line in lines)
+        run['subjects'].discard(b'subject_id')
+
+    def __call__(self) -> int:
+        """Number of pairs compared so far."""
+        done = 0
+        with self.lock:
+            for output_file, run in self.runs.items():
+                if run['finished']:
+                    done += run['pairs']
+                    continue
+                self._read_subjects(output_file, run)
+                done += min(len(run['subjects']) * run['objects'], run['pairs'])
+        return done
+
+
+@contextmanager
+def peak_directory_size(directory: Path, interval: float = 0.5):
+    """
+    Sample the total size of the files in a directory while the context runs.
+
+    Yields a dict whose 'bytes' entry holds the largest size seen, for spill
+    files that a command removes again before it exits.
+    """
+    peak = {'bytes': 0}
+    done = threading.Event()
+
+    def sample() -> None:
+        while True:
+            size = 0
+            for root, _dirs, files in os.walk(directory):
+                for name in files:
+                    try:
+                        size += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        continue
+            peak['bytes'] = max(peak['bytes'], size)
+            if done.wait(interval):
+                break
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield peak
+    finally:
+        done.set()
+        sampler.join()
+
+
+def run_with_rusage(command, shell: Optional[bool] = None, cwd: Optional[str] = None,
+                    stdout_path: Optional[Path] = None, capture_stdout: bool = False,
+                    log_path: Optional[Path] = None,
+                    tail_lines: int = ERROR_TAIL_LINES):
+    """
+    Run a command to completion, streaming its output and measuring its resource usage.
+
+    Output is read line by line as the child writes it: each line is appended
+    to log_path (if given) and logged at debug level, and only the last
+    tail_lines lines are kept in memory for the error message. stdout is
+    written to stdout_path (instead of a shell redirect), kept in full with
+    capture_stdout, or otherwise streamed like stderr. A string
+    command runs through the shell, an argv list without one (unless shell
+    is given).
+
+    The child is reaped with os.wait4, which returns the rusage of that
+    process alone, so concurrent commands are measured independently.
+
+    Returns:
+        Tuple of (CompletedProcess, resource.struct_rusage); stdout holds the
+        captured output (or ''), stderr the last tail_lines streamed lines
+    """
+    if shell is None:
+        shell = isinstance(command, str)
+    display = command if isinstance(command, str) else shlex.join(command)
+    log_file = None
+    if log_path is not None:
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        # Line buffered appends, so concurrent commands of a stage interleave whole lines
+        log_file = log_path.open('a', encoding='utf-8', buffering=1)
+        log_file.write(f"$ {display}\n")
+    stdout_file = stdout_path.open('wb') if stdout_path is not None else None
+    captured: List[str] = []
+    stderr_tail: Deque[str] = deque(maxlen=tail_lines)
+    try:
+        process = subprocess.Popen(
+            command, shell=shell, cwd=cwd, text=True, errors='replace',
+            stdout=stdout_file if stdout_file is not None else subprocess.PIPE,
+            stderr=subprocess.PIPE)
+    except BaseException:
+        for handle in (log_file, stdout_file):
+            if handle is not None:
+                handle.close()
+        raise
+    if stdout_file is not None:
+        stdout_file.close()
+
+    def drain(stream, keep: Callable[[str], None], name: str) -> None:
+        for line in stream:
+            keep(line)
+            if log_file is not None:
+                log_file.write(line if line.endswith('\n') else line + '\n')
+            logger.debug(f"[{name}] {line.rstrip()}")
+        stream.close()
+
+    streams = [(process.stderr, stderr_tail.append, 'stderr')]
+    if process.stdout is not None:
+        streams.append((process.stdout,
+                        captured.append if capture_stdout else stderr_tail.append,
+                        'stdout'))
+    readers = [threading.Thread(target=drain, args=stream, daemon=True)
+               for stream in streams]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if log_file is not None:
+        log_file.write(f"# exit status {process.returncode}\n")
+        log_file.close()
+    result = subprocess.CompletedProcess(command, process.returncode,
+                                         ''.join(captured), ''.join(stderr_tail))
+    return result, usage
+
+
+class MetricsRecorder:
+    """
+    Collects resource metrics per pipeline stage.
+
+    Each stage runs inside stage(), which records its wall time and the CPU
+    time of its thread. Commands started through PipelineRunner.run_command
+    add the user/system CPU time, peak RSS and block I/O of their child
+    processes to the stage that is current in the calling thread.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record the metrics of the work done inside the context as stage name."""
+        record = {
+            "status": "running",
+            "wall_seconds": 0.0,
+            "thread_cpu_seconds": 0.0,
+            "child_user_cpu_seconds": 0.0,
+            "child_system_cpu_seconds": 0.0,
+            "child_max_rss_bytes": 0,
+            "child_read_bytes": 0,
+            "child_write_bytes": 0,
+            "commands": 0,
+        }
+        with self.lock:
+            self.stages[name] = record
+        token = _current_stage_metrics.set(record)
+        name_token = _current_stage_name.set(name)
+        start = time.time()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+            if record["status"] == "running":
+                record["status"] = "completed"
+        except BaseException:
+            record["status"] = "failed"
+            raise
+        finally:
+            record["wall_seconds"] = round(time.time() - start, 3)
+            record["thread_cpu_seconds"] = round(time.thread_time() - cpu_start, 3)
+            record["process_max_rss_bytes"] = (
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT)
+            _current_stage_metrics.reset(token)
+            _current_stage_name.reset(name_token)
+
+    @staticmethod
+    def add_child_usage(usage) -> None:
+        """Add the rusage of a finished child process to the current stage."""
+        record = _current_stage_metrics.get()
+        if record is None:
+            return
+        record["commands"] += 1
+        record["child_user_cpu_seconds"] = round(
+            record["child_user_cpu_seconds"] + usage.ru_utime, 3)
+        record["child_system_cpu_seconds"] = round(
+            record["child_system_cpu_seconds"] + usage.ru_stime, 3)
+        record["child_max_rss_bytes"] = max(
+            record["child_max_rss_bytes"], usage.ru_maxrss * MAXRSS_UNIT)
+        record["child_read_bytes"] += usage.ru_inblock * 512
+        record["child_write_bytes"] += usage.ru_oublock * 512
+
+    @staticmethod
+    def add(field: str, value: float) -> None:
+        """Add value to a counter of the current stage."""
+        record = _current_stage_metrics.get()
+        if record is not None:
+            record[field] = record.get(field, 0) + value
+
+    @staticmethod
+    def record_files(record: Dict, working_dir: Path, inputs: List[str],
+                     outputs: List[str]) -> None:
+        """Record input/output sizes and output line counts of a stage."""
+        record["input_bytes"] = sum(
+            (working_dir / name).stat().st_size for name in inputs
+            if (working_dir / name).exists())
+        record["output_bytes"] = 0
+        record["output_lines"] = {}
+        for name in outputs:
+            path = working_dir / name
+            if not path.exists():
+                continue
+            record["output_bytes"] += path.stat().st_size
+            if name.endswith(COUNTED_SUFFIXES):
+                record["output_lines"][name] = count_lines(path)
+
+    def snapshot(self, names: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Return a copy of the recorded stages (optionally only the given names)."""
+        with self.lock:
+            return {name: json.loads(json.dumps(record))
+                    for name, record in self.stages.items()
+                    if names is None or name in names}
+
+    def write(self, working_dir: Path) -> None:
+        """Write pipeline_metrics.json and the Prometheus textfile pipeline_metrics.prom."""
+        stages = self.snapshot()
+        json_path = working_dir / 'pipeline_metrics.json'
+        tmp_path = json_path.with_name(json_path.name + '.tmp')
+        tmp_path.write_text(json.dumps({"stages": stages}, indent=2) + '\n')
+        os.replace(tmp_path, json_path)
+
+        lines = []
+        for field, help_text in PROMETHEUS_METRICS:
+            metric = f"pheno_pipeline_stage_{field}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for name, record in stages.items():
+                if field in record:
+                    lines.append(f'{metric}{{stage="{name}"}} {record[field]}')
+        lines.append("# HELP pheno_pipeline_stage_output_lines Lines written to a stage output file.")
+        lines.append("# TYPE pheno_pipeline_stage_output_lines gauge")
+        for name, record in stages.items():
+            for output, count in record.get("output_lines", {}).items():
+                lines.append(
+                    f'pheno_pipeline_stage_output_lines{{stage="{name}",file="{output}"}} {count}')
+        lines.append("# HELP pheno_pipeline_stage_failed Whether a stage failed (1) or not (0).")
+        lines.append("# TYPE pheno_pipeline_stage_failed gauge")
+        for name, record in stages.items():
+            failed = 1 if record["status"] == "failed" else 0
+            lines.append(f'pheno_pipeline_stage_failed{{stage="{name}"}} {failed}')
+
+        # The textfile collector may read at any time, so replace atomically
+        prom_path = working_dir / 'pipeline_metrics.prom'
+        tmp_path = prom_path.with_name(prom_path.name + '.tmp')
+        tmp_path.write_text('\n'.join(lines) + '\n')
+        os.replace(tmp_path, prom_path)
+
+
+# Per-stage fields exported to the Prometheus textfile, with their help text
+PROMETHEUS_METRICS = [
+    ("wall_seconds", "Wall-clock time of a pipeline stage."),
+    ("thread_cpu_seconds", "CPU time of the pipeline thread running a stage."),
+    ("child_user_cpu_seconds", "User CPU time of the commands run by a stage."),
+    ("child_system_cpu_seconds", "System CPU time of the commands run by a stage."),
+    ("child_max_rss_bytes", "Largest peak RSS of a command run by a stage."),
+    ("process_max_rss_bytes", "Peak RSS of the pipeline process when a stage finished."),
+    ("child_read_bytes", "Bytes read from disk by the commands run by a stage."),
+    ("child_write_bytes", "Bytes written to disk by the commands run by a stage."),
+    ("input_bytes", "Size of the input files of a stage."),
+    ("output_bytes", "Size of the output files of a stage."),
+    ("downloaded_bytes", "Bytes downloaded by a stage."),
+    ("spilled_bytes", "Bytes spilled to disk by a stage to stay within --max-memory."),
+]
+
+
 class PipelineConfig:
     """Configuration for the phenotype comparison pipeline."""
 
@@ -140,6 +1376,76 @@ class PipelineConfig:
         # Pipeline parameters
         self.resnik_threshold = '1.5'
 
+        # Scheduling
+        self.jobs = 1
+        self.memory_budget_gb: Optional[float] = None
+
+        # Stage cache (disabled unless a cache directory is set)
+        self.cache_dir: Optional[Path] = None
+        self.cache_max_gb = 100.0
+
+        # Sharded similarity analysis (1 shard runs a single process;
+        # 0 workers means one worker per shard)
+        self.similarity_shards = 1
+        self.similarity_workers = 0
+
+        # Keep only the k best objects per subject by a TOP_K_METRICS metric
+        # (None keeps the full cross product)
+        self.top_k: Optional[int] = None
+        self.top_k_metric = 'phenodigm'
+
+        # Compute and store each unordered pair of same-ontology comparisons
+        # (e.g., HP vs HP) once, as the upper triangle of the pair matrix
+        self.symmetric = False
+
+        # Labeling backend: 'duckdb' or 'streaming' (in-process hash join)
+        self.labeler = 'duckdb'
+
+        # Memory budget of the labeling stages; above it they spill to disk
+        # (None leaves memory unbounded; the spill directory defaults to
+        # <working_dir>/spill)
+        self.max_memory_gb: Optional[float] = None
+        self.spill_dir: Optional[Path] = None
+
+        # Stream similarity rows through a FIFO into the labeler, so the
+        # unlabeled result is never written to disk
+        self.stream = False
+
+        # Also write each labeled result as Parquet (requires pyarrow)
+        self.parquet = False
+
+        # Also write each labeled result in the memory-mappable binary format
+        self.binary = False
+
+        # Tarball compression: 'gzip' (parallel multi-member) or 'zstd';
+        # 0 threads means one per CPU
+        self.compression = 'gzip'
+        self.compression_threads = 0
+
+        # Concurrent Zenodo file deletions and uploads
+        self.zenodo_workers = 4
+
+        # JSON status of the running operations (progress, rate, ETA) for
+        # schedulers to poll (None disables it)
+        self.status_file: Optional[Path] = self.working_dir / 'pipeline_status.json'
+
+        # Incremental similarity: outputs of the previous build to update,
+        # and the IC difference below which a term counts as unchanged
+        self.previous_release: Optional[Path] = None
+        self.ic_tolerance = 1e-9
+
+        # Ontology access backend: 'runoak' (subprocesses) or 'python'
+        # (in-process oaklib)
+        self.oak_backend = 'runoak'
+
+        # Information content engine: 'native' (sparse closure with numpy and
+        # scipy) or 'oak' (the oaklib backend above)
+        self.ic_engine = 'native'
+
+        # Concurrent association downloads, and byte ranges per large download
+        self.download_workers = 3
+        self.download_range_workers = 1
+
         # Output prefixes
         self.hp_vs_hp_prefix = "HP_vs_HP_semsimian_phenio"
         self.hp_vs_mp_prefix = "HP_vs_MP_semsimian_phenio"
@@ -158,7 +1464,24 @@ class PipelineConfig:
 
         # Tools
         self.duckdb_path = self.working_dir / 'duckdb'
-        self.yq_path = self.working_dir / 'yq'
+
+        # Download locations (overridable, e.g., to run against a local mirror)
+        self.tool_urls = dict(TOOL_URLS)
+        self.association_urls = dict(ASSOCIATION_URLS)
+
+        # Local SemSQL databases used instead of sqlite:obo:<ontology>
+        # (a custom PHENIO is set through custom_phenio). Relative paths are
+        # resolved against the working directory.
+        self.ontology_dbs: Dict[str, Path] = {}
+
+        # Machine-wide store of tools and SemSQL databases (None disables it)
+        self.artifact_dir: Optional[Path] = None
+        self.semsql_url_base = SEMSQL_URL_BASE
+
+    def tarball_name(self, prefix: str) -> str:
+        """Get the tarball file name for an output prefix."""
+        extension = 'tar.zst' if self.compression == 'zstd' else 'tar.gz'
+        return f"{prefix}.{extension}"
 
     def get_phenio_identifier(self) -> str:
         """
@@ -170,6 +1493,9 @@ class PipelineConfig:
         if self.custom_phenio:
             # Use custom PHENIO database file
             return f"sqlite:{self.custom_phenio}"
+        elif self.ontology_dbs.get('phenio'):
+            # Use PHENIO database linked from the artifact store
+            return f"sqlite:{self.ontology_dbs['phenio']}"
         else:
             # Use default OBO PHENIO
             return "sqlite:obo:phenio"
@@ -184,17 +1510,105 @@ class PipelineConfig:
         if self.custom_phenio:
             # Use custom PHENIO database file with semsimian
             return f"semsimian:sqlite:{self.custom_phenio}"
+        elif self.ontology_dbs.get('phenio'):
+            # Use PHENIO database linked from the artifact store with semsimian
+            return f"semsimian:sqlite:{self.ontology_dbs['phenio']}"
         else:
             # Use default OBO PHENIO with semsimian
             return "semsimian:sqlite:obo:phenio"
 
 
+class ConnectionPool:
+    """Thread-safe pool of keep-alive HTTP(S) connections, reused per host."""
+
+    def __init__(self, timeout: float = 300.0):
+        self.timeout = timeout
+        # One context for all connections, so TLS settings are shared
+        self.ssl_context = ssl.create_default_context()
+        self.idle: Dict[tuple, List[http.client.HTTPConnection]] = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, scheme: str, netloc: str):
+        """
+        Take an idle connection to a host, or open a new one.
+
+        Returns:
+            Tuple of (connection, whether it was reused)
+        """
+        with self.lock:
+            idle = self.idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(
+                netloc, timeout=self.timeout, context=self.ssl_context)
+        else:
+            connection = http.client.HTTPConnection(netloc, timeout=self.timeout)
+        return connection, False
+
+    def release(self, scheme: str, netloc: str, connection, reusable: bool) -> None:
+        """Return a connection to the pool, or close it if it cannot be reused."""
+        if not reusable:
+            connection.close()
+            return
+        with self.lock:
+            self.idle.setdefault((scheme, netloc), []).append(connection)
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None):
+        """
+        Send a request with a replayable body over a pooled connection.
+
+        A reused keep-alive connection that the server has since closed is
+        replaced by a fresh one and the request is sent again.
+
+        Returns:
+            Tuple of (status, reason, response body)
+        """
+        parsed = urllib.parse.urlparse(url)
+        target = parsed.path + (f"?{parsed.query}" if parsed.query else '')
+        while True:
+            connection, reused = self.acquire(parsed.scheme, parsed.netloc)
+            try:
+                connection.request(method, target, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            self.release(parsed.scheme, parsed.netloc, connection,
+                         not response.will_close)
+            return response.status, response.reason, data
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+
 class ZenodoClient:
-    """Minimal Zenodo API client for creating new versions and uploading files."""
+    """
+    Minimal Zenodo API client for creating new versions and uploading files.
 
-    def __init__(self, token: str, base_url: str = "https://zenodo.org/api"):
+    Requests share a pool of keep-alive connections, and file deletions and
+    uploads run concurrently on up to max_workers connections.
+    """
+
+    def __init__(self, token: str, base_url: str = "https://zenodo.org/api",
+                 max_workers: int = 4):
         self.token = token
         self.base_url = base_url.rstrip('/')
+        self.max_workers = max(1, max_workers)
+        self.pool = ConnectionPool()
 
     def _request(self, method: str, url: str, payload: Optional[Dict] = None,
                  expect_json: bool = True) -> Optional[Dict]:
@@ -204,17 +1618,14 @@ class ZenodoClient:
             data = json.dumps(payload).encode('utf-8')
             headers["Content-Type"] = "application/json"
 
-        request = urllib.request.Request(url, data=data,
-                                         headers=headers, method=method)
-        try:
-            with urllib.request.urlopen(request) as response:
-                body = response.read()
-        except urllib.error.HTTPError as exc:
-            error_body = exc.read().decode('utf-8', 'ignore')
+        status, reason, body = self.pool.request(method, url, body=data,
+                                                 headers=headers)
+        if status >= 400:
+            error_body = body.decode('utf-8', 'ignore')
             raise RuntimeError(
                 f"Zenodo API request failed ({method} {url}): "
-                f"{exc.code} {exc.reason} {error_body}"
-            ) from exc
+                f"{status} {reason} {error_body}"
+            )
 
         if not expect_json:
             return None
@@ -241,15 +1652,20 @@ class ZenodoClient:
 
     def delete_draft_files(self, draft_id: int, files: List[Dict]) -> None:
         """Delete all files copied into the draft from the previous version."""
-        for file_info in files:
-            file_id = file_info.get("id")
-            if file_id is None:
-                continue
-            self._request(
-                "DELETE",
-                f"{self.base_url}/deposit/depositions/{draft_id}/files/{file_id}",
-                expect_json=False
-            )
+        file_ids = [file_info.get("id") for file_info in files
+                    if file_info.get("id") is not None]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [
+                pool.submit(
+                    self._request,
+                    "DELETE",
+                    f"{self.base_url}/deposit/depositions/{draft_id}/files/{file_id}",
+                    expect_json=False
+                )
+                for file_id in file_ids
+            ]
+            for future in futures:
+                future.result()
 
     def update_metadata(self, draft_id: int, metadata: Dict) -> None:
         """Update draft metadata."""
@@ -259,17 +1675,33 @@ class ZenodoClient:
             payload={"metadata": metadata}
         )
 
-    def upload_file(self, bucket_url: str, file_path: Path) -> None:
-        """Stream a file upload to the Zenodo bucket URL."""
+    def get_deposition(self, draft_id: int) -> Dict:
+        """Fetch a deposition, including its file list and checksums."""
+        return self._request(
+            "GET", f"{self.base_url}/deposit/depositions/{draft_id}")
+
+    def upload_file(self, bucket_url: str, file_path: Path) -> str:
+        """
+        Stream a file upload to the Zenodo bucket URL.
+
+        The MD5 of the bytes sent is computed during the upload and compared
+        with the checksum Zenodo reports for the stored file.
+
+        Returns:
+            Hex MD5 digest of the uploaded file
+        """
         parsed = urllib.parse.urlparse(bucket_url)
-        if parsed.scheme != "https":
+        allowed_schemes = {"https", urllib.parse.urlparse(self.base_url).scheme}
+        if parsed.scheme not in allowed_schemes:
             raise ValueError(f"Unexpected Zenodo bucket URL: {bucket_url}")
 
         target_path = parsed.path.rstrip(
             '/') + '/' + urllib.parse.quote(file_path.name)
         file_size = file_path.stat().st_size
+        digest = hashlib.md5()
 
-        connection = http.client.HTTPSConnection(parsed.netloc)
+        connection, _ = self.pool.acquire(parsed.scheme, parsed.netloc)
+        reusable = False
         try:
             connection.putrequest("PUT", target_path)
             connection.putheader("Authorization", f"Bearer {self.token}")
@@ -282,17 +1714,97 @@ class ZenodoClient:
                     chunk = handle.read(1024 * 1024)
                     if not chunk:
                         break
+                    digest.update(chunk)
                     connection.send(chunk)
 
             response = connection.getresponse()
             body = response.read().decode('utf-8', 'ignore')
+            reusable = not response.will_close
             if response.status >= 400:
-                raise RuntimeError(
+                raise ZenodoUploadError(
                     f"Zenodo upload failed for {file_path.name}: "
-                    f"{response.status} {response.reason} {body}"
+                    f"{response.status} {response.reason} {body}",
+                    retryable=response.status >= 500 or response.status == 429
                 )
         finally:
-            connection.close()
+            self.pool.release(parsed.scheme, parsed.netloc, connection, reusable)
+
+        local_md5 = digest.hexdigest()
+        try:
+            remote_md5 = zenodo_md5(json.loads(body).get("checksum"))
+        except (ValueError, AttributeError):
+            remote_md5 = None
+        if remote_md5 is None:
+            logger.warning(
+                f"Zenodo did not report an MD5 checksum for {file_path.name}")
+        elif remote_md5 != local_md5:
+            raise ZenodoUploadError(
+                f"Checksum mismatch for {file_path.name}: "
+                f"local md5 {local_md5}, Zenodo md5 {remote_md5}",
+                retryable=True
+            )
+        return local_md5
+
+    def upload_file_with_retry(self, bucket_url: str, file_path: Path,
+                               retries: int = 5, backoff: float = 2.0) -> str:
+        """
+        Upload a file, retrying transient failures with exponential backoff.
+
+        A PUT to the same bucket key replaces the stored object, so a failed
+        or corrupted upload is simply sent again.
+
+        Returns:
+            Hex MD5 digest of the uploaded file
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.upload_file(bucket_url, file_path)
+            except (ZenodoUploadError, OSError, http.client.HTTPException) as exc:
+                retryable = getattr(exc, "retryable", True)
+                if not retryable or attempt >= retries:
+                    raise
+                delay = backoff * (2 ** attempt)
+                attempt += 1
+                logger.warning(
+                    f"Upload of {file_path.name} failed ({exc}); "
+                    f"retry {attempt}/{retries} in {delay:.0f}s")
+                time.sleep(delay)
+
+    def upload_files(self, bucket_url: str, file_paths: List[Path],
+                     on_uploaded: Optional[Callable[[Path, str], None]] = None,
+                     retries: int = 5) -> None:
+        """
+        Upload files concurrently and log the aggregate throughput.
+
+        Args:
+            bucket_url: Bucket URL of the draft deposition
+            file_paths: Files to upload
+            on_uploaded: Called with (path, md5) after each verified upload
+            retries: Retries per file for transient failures
+        """
+        start = time.time()
+
+        def upload(file_path: Path) -> int:
+            logger.info(f"Uploading {file_path.name} to Zenodo...")
+            file_start = time.time()
+            md5 = self.upload_file_with_retry(bucket_url, file_path, retries)
+            size = file_path.stat().st_size
+            elapsed = max(time.time() - file_start, 1e-6)
+            logger.info(
+                f"Uploaded {file_path.name} ({format_bytes(size)}, "
+                f"{format_bytes(size / elapsed)}/s, md5 verified)")
+            if on_uploaded:
+                on_uploaded(file_path, md5)
+            return size
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            total = sum(pool.map(upload, file_paths))
+
+        elapsed = max(time.time() - start, 1e-6)
+        logger.info(
+            f"Uploaded {len(file_paths)} files to Zenodo: {format_bytes(total)} "
+            f"in {elapsed:.1f}s ({format_bytes(total / elapsed)}/s aggregate)")
 
     def publish(self, draft_id: int) -> None:
         """Publish the Zenodo draft deposition."""
@@ -302,66 +1814,1166 @@ class ZenodoClient:
             expect_json=False
         )
 
+    def close(self) -> None:
+        """Close pooled connections."""
+        self.pool.close()
+
+
+# ioctl cloning the extents of one file into another (Linux FICLONE)
+FICLONE = 0x40049409
+
+
+def link_or_clone(source: Path, target: Path) -> None:
+    """
+    Hard link source to target, falling back to a reflink, then to a copy.
+
+    A reflink (a copy-on-write clone on Btrfs or XFS) shares the data blocks
+    of the source like a hard link, and also works where hard links do not,
+    e.g., between bind mounts of one filesystem.
+    """
+    if target.exists() or target.is_symlink():
+        target.unlink()
+    try:
+        os.link(source, target)
+        return
+    except OSError:
+        pass
+    try:
+        import fcntl
+        with source.open('rb') as src, target.open('wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, target)
+        return
+    except (ImportError, OSError):
+        target.unlink(missing_ok=True)
+    shutil.copy2(source, target)
+
+
+class StageCache:
+    """Persistent, content-addressed cache of stage outputs with LRU eviction."""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        """
+        Initialize the stage cache.
+
+        Args:
+            cache_dir: Directory holding cache entries (created if missing)
+            max_bytes: Total size above which least recently used entries are evicted
+        """
+        self.cache_dir = Path(cache_dir).absolute()
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._hashes: Dict[tuple, str] = {}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def input_digest(self, path: Path) -> str:
+        """Return the SHA-256 digest of a file, memoized on size and mtime."""
+        stat = path.stat()
+        memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            digest = self._hashes.get(memo_key)
+        if digest is None:
+            digest = file_digest(path)
+            with self.lock:
+                self._hashes[memo_key] = digest
+        return digest
+
+    def stage_key(self, stage: 'Stage', working_dir: Path) -> str:
+        """Compute the cache key of a stage from its parameters and input hashes."""
+        inputs = {path: self.input_digest(working_dir / path)
+                  for path in stage.inputs}
+        material = json.dumps(
+            {'stage': stage.name, 'params': stage.cache_params,
+             'inputs': inputs, 'outputs': len(stage.outputs)},
+            sort_keys=True
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def restore(self, key: str, outputs: List[Path]) -> bool:
+        """Restore cached outputs for a key. Returns True on a cache hit."""
+        entry = self.cache_dir / key
+        meta_path = entry / 'meta.json'
+        with self.lock:
+            if not meta_path.exists() or not all(
+                    (entry / f"output-{index}").exists()
+                    for index in range(len(outputs))):
+                return False
+            for index, output in enumerate(outputs):
+                link_or_clone(entry / f"output-{index}", output)
+            meta = json.loads(meta_path.read_text())
+            meta['last_used'] = time.time()
+            meta_path.write_text(json.dumps(meta))
+        return True
+
+    def store(self, key: str, stage_name: str, outputs: List[Path]) -> None:
+        """Store stage outputs under a key, then evict entries over the size limit."""
+        entry = self.cache_dir / key
+        staging = self.cache_dir / f".{key}.{threading.get_ident()}.tmp"
+        if staging.exists():
+            shutil.rmtree(staging)
+        staging.mkdir()
+        for index, output in enumerate(outputs):
+            link_or_clone(output, staging / f"output-{index}")
+        meta = {'stage': stage_name, 'created': time.time(),
+                'last_used': time.time(),
+                'outputs': [output.name for output in outputs]}
+        (staging / 'meta.json').write_text(json.dumps(meta))
+
+        with self.lock:
+            if entry.exists():
+                shutil.rmtree(entry)
+            staging.rename(entry)
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits max_bytes."""
+        entries = []
+        total = 0
+        for entry in self.cache_dir.iterdir():
+            meta_path = entry / 'meta.json'
+            if not entry.is_dir() or not meta_path.exists():
+                continue
+            size = sum(path.stat().st_size for path in entry.iterdir())
+            last_used = json.loads(meta_path.read_text()).get('last_used', 0)
+            entries.append((last_used, size, entry))
+            total += size
+
+        for last_used, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.info(f"Evicting cache entry {entry.name[:12]} ({size} bytes)")
+            shutil.rmtree(entry)
+            total -= size
+
+
+class ArtifactStore:
+    """
+    Machine-wide store of downloaded tools and SemSQL databases.
+
+    Each download URL has an entry directory holding the artifact and a
+    ``<name>.meta.json`` recording the URL, the upstream version (ETag or
+    Last-Modified) and the SHA-256 digest of the artifact. Working
+    directories get hard links (or reflinks) to stored artifacts, so a new
+    working directory does not download or copy them again. An updated
+    upstream file replaces the stored one with a new inode, leaving the
+    links of earlier working directories intact.
+    """
+
+    def __init__(self, store_dir: Path):
+        """
+        Initialize the artifact store.
+
+        Args:
+            store_dir: Directory holding the store entries (created if missing)
+        """
+        self.store_dir = Path(store_dir).absolute()
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+    def entry(self, url: str) -> Path:
+        """Return the entry directory of a download URL, creating it if missing."""
+        name = urllib.parse.urlparse(url).path.rsplit('/', 1)[-1] or 'artifact'
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+        entry = self.store_dir / f"{key}-{name}"
+        entry.mkdir(exist_ok=True)
+        return entry
+
+    @contextmanager
+    def locked(self, url: str):
+        """Hold the entry of a URL exclusively, across processes; yields the entry directory."""
+        import fcntl
+        entry = self.entry(url)
+        with (entry / '.lock').open('w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield entry
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _meta_path(self, path: Path) -> Path:
+        return path.with_name(path.name + '.meta.json')
+
+    def verify(self, path: Path) -> bool:
+        """
+        Return True if a stored artifact exists and matches its recorded digest.
+
+        The digest is only recomputed when the size or mtime of the file has
+        changed since it was recorded.
+        """
+        meta_path = self._meta_path(path)
+        if not path.exists() or not meta_path.exists():
+            return False
+        meta = json.loads(meta_path.read_text())
+        stat = path.stat()
+        if stat.st_size == meta.get('size') and stat.st_mtime_ns == meta.get('mtime_ns'):
+            return True
+        if stat.st_size == meta.get('size') and file_digest(path) == meta.get('sha256'):
+            meta['mtime_ns'] = stat.st_mtime_ns
+            meta_path.write_text(json.dumps(meta, indent=2))
+            return True
+        logger.warning(f"Stored {path.name} does not match its recorded checksum")
+        return False
+
+    def record(self, path: Path, url: str) -> None:
+        """
+        Record the upstream version and digest of a newly fetched artifact.
+
+        The version is the ETag / Last-Modified the download stored beside
+        the file (``<name>.http.json``); pinned downloads have none.
+        """
+        version = None
+        validators_path = path.with_name(path.name + '.http.json')
+        if validators_path.exists():
+            validators = json.loads(validators_path.read_text())
+            version = validators.get('etag') or validators.get('last_modified')
+        stat = path.stat()
+        meta = {'url': url, 'version': version, 'sha256': file_digest(path),
+                'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                'fetched': time.time()}
+        self._meta_path(path).write_text(json.dumps(meta, indent=2))
+        logger.info(f"Stored {path.name} ({format_bytes(stat.st_size)}, "
+                    f"sha256 {meta['sha256'][:12]}) in {path.parent}")
+
+
+class OakSession:
+    """
+    In-process oaklib session that keeps ontology adapters open across stages.
+
+    Each ``runoak`` invocation starts a new interpreter, imports oaklib and
+    reopens the SemSQL database; this session imports oaklib once and reuses
+    one adapter per ontology (and association set) for the whole run.
+    """
+
+    def __init__(self):
+        # Imported here so the runoak backend works without oaklib importable
+        from oaklib import get_adapter
+        from oaklib.datamodels.vocabulary import IS_A
+
+        self._get_adapter = get_adapter
+        self.is_a = IS_A
+        self.adapters: Dict[tuple, object] = {}
+        self.adapter_locks: Dict[tuple, threading.Lock] = {}
+        self.lock = threading.Lock()
+
+    def adapter(self, identifier: str, association_file: Optional[Path] = None,
+                association_type: Optional[str] = None):
+        """
+        Return a cached adapter and the lock guarding its use.
+
+        Adapters loaded with associations are cached per association file,
+        since associations are added to the adapter itself.
+        """
+        key = (identifier, str(association_file) if association_file else None)
+        with self.lock:
+            if key not in self.adapters:
+                start = time.time()
+                adapter = self._get_adapter(identifier)
+                if association_file:
+                    from oaklib.parsers.association_parser_factory import get_association_parser
+                    parser = get_association_parser(association_type)
+                    with open(association_file) as handle:
+                        adapter.add_associations(list(parser.parse(handle)))
+                logger.debug(
+                    f"Loaded adapter {identifier} in {time.time() - start:.1f}s")
+                self.adapters[key] = adapter
+                self.adapter_locks[key] = threading.Lock()
+            return self.adapters[key], self.adapter_locks[key]
+
+    def ontology_version(self, identifier: str) -> Optional[str]:
+        """Return the owl:versionIRI of an ontology, as runoak ontology-metadata does."""
+        adapter, lock = self.adapter(identifier)
+        with lock:
+            for ontology in adapter.ontologies():
+                version = adapter.ontology_metadata_map(ontology).get('owl:versionIRI')
+                if isinstance(version, list):
+                    version = version[0] if version else None
+                if version:
+                    return str(version)
+        return None
+
+    def write_descendants(self, identifier: str, root_term: str,
+                          txt_path: Path, tsv_path: Path) -> None:
+        """Write is_a descendants of a term as 'CURIE ! label' and 'CURIE<TAB>label' files."""
+        adapter, lock = self.adapter(identifier)
+        with lock:
+            curies = list(adapter.descendants(
+                [root_term], predicates=[self.is_a], reflexive=True))
+            with txt_path.open('w') as txt_file, tsv_path.open('w') as tsv_file:
+                for curie in curies:
+                    label = adapter.label(curie) or ''
+                    txt_file.write(f"{curie} ! {label}\n")
+                    tsv_file.write(f"{curie}\t{label}\n")
+
+    def ancestors(self, identifier: str, curies: List[str]) -> Dict[str, set]:
+        """Return the reflexive is_a ancestors of each CURIE."""
+        adapter, lock = self.adapter(identifier)
+        with lock:
+            return {curie: set(adapter.ancestors(
+                        curie, predicates=[self.is_a], reflexive=True))
+                    for curie in curies}
+
+    def write_information_content(self, identifier: str, association_file: Path,
+                                  association_type: str, output_path: Path) -> None:
+        """
+        Write annotation-based IC as headerless 'CURIE<TAB>IC' rows.
+
+        Every term annotated (directly or through an is_a descendant) is
+        written in entity order, scored as oaklib does: -log2 of the fraction
+        of annotated subjects. Unannotated terms are skipped, as by
+        InformationContentEngine.
+        """
+        adapter, lock = self.adapter(identifier, association_file, association_type)
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+        with lock:
+            num_subjects = len({association.subject
+                                for association in adapter.associations()})
+            if num_subjects == 0:
+                raise RuntimeError(f"No associations found in {association_file}")
+            counts = dict(adapter.association_subject_counts(
+                object_closure_predicates=[self.is_a]))
+            with tmp_path.open('w') as out_file:
+                for curie in adapter.entities(filter_obsoletes=False):
+                    count = counts.get(curie)
+                    if count:
+                        score = -math.log(count / num_subjects) / math.log(2)
+                        out_file.write(f"{curie}\t{score}\n")
+        os.replace(tmp_path, output_path)
+
+
+class InformationContentEngine:
+    """
+    Annotation-based information content computed natively from a SemSQL database.
+
+    The reflexive is_a closure (``entailed_edge``) is loaded once into a sparse
+    term-by-ancestor matrix and shared by all association sets. The IC of every
+    term is then one sparse product of the subject-by-term annotation matrix
+    with the closure, giving the same scores as ``runoak information-content
+    -p i --use-associations``: -log2 of the fraction of annotated subjects
+    annotated to the term or a descendant. Every annotated term is written,
+    in oaklib's entity order and formatting; unannotated terms are skipped.
+    """
+
+    # Comment character, subject column and object column of each association
+    # format, as read by oaklib's association parsers
+    ASSOCIATION_FORMATS = {
+        'hpoa': ('#', 0, 3),
+        'g2t': ('!', 0, 1),
+    }
+
+    def __init__(self, db_path: Path):
+        # Imported here so the pipeline runs without numpy and scipy installed
+        import numpy
+        from scipy import sparse
+
+        self.np = numpy
+        self.sparse = sparse
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.term_index: Dict[str, int] = {}
+        self.entities: List[str] = []
+        self.closure = None
+
+    def load_closure(self):
+        """Load the entities and the reflexive is_a closure once."""
+        with self.lock:
+            if self.closure is not None:
+                return self.closure
+            start = time.time()
+            np = self.np
+            index = self.term_index
+            connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            try:
+                # Same query (and row order) as oaklib's entities() for '.all'
+                self.entities = [
+                    row[0] for row in connection.execute("SELECT id FROM node")
+                    if row[0] and not row[0].startswith(('_:', '<urn:swrl'))
+                ]
+                for curie in self.entities:
+                    index.setdefault(curie, len(index))
+                subjects = []
+                objects = []
+                for subject, obj in connection.execute(
+                        "SELECT subject, object FROM entailed_edge "
+                        "WHERE predicate = 'rdfs:subClassOf'"):
+                    subjects.append(index.setdefault(subject, len(index)))
+                    objects.append(index.setdefault(obj, len(index)))
+            finally:
+                connection.close()
+
+            size = len(index)
+            rows = np.concatenate([np.array(subjects, dtype=np.int64),
+                                   np.arange(size, dtype=np.int64)])
+            columns = np.concatenate([np.array(objects, dtype=np.int64),
+                                      np.arange(size, dtype=np.int64)])
+            self.closure = self.sparse.csr_matrix(
+                (np.ones(len(rows), dtype=bool), (rows, columns)),
+                shape=(size, size))
+            logger.info(
+                f"Loaded is_a closure of {size} terms ({self.closure.nnz} pairs) "
+                f"in {time.time() - start:.1f}s")
+            return self.closure
+
+    def read_associations(self, association_file: Path, association_type: str):
+        """Return the subject-by-term annotation matrix of an association file."""
+        np = self.np
+        if association_type not in self.ASSOCIATION_FORMATS:
+            raise ValueError(f"Unsupported association type: {association_type}")
+        comment, subject_column, object_column = self.ASSOCIATION_FORMATS[association_type]
+        width = max(subject_column, object_column) + 1
+
+        subject_index: Dict[str, int] = {}
+        rows = []
+        columns = []
+        with open(association_file) as handle:
+            for line in handle:
+                if line.startswith(comment):
+                    continue
+                values = line.rstrip().split('\t')
+                if len(values) < width:
+                    continue
+                subject = values[subject_column]
+                if subject.startswith('MGI:MGI:'):
+                    subject = subject.replace('MGI:MGI:', 'MGI:')
+                row = subject_index.setdefault(subject, len(subject_index))
+                # Every subject counts towards the corpus, but terms missing
+                # from the ontology have no ancestors to annotate
+                column = self.term_index.get(values[object_column])
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+
+        size = len(self.term_index)
+        return self.sparse.csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, columns)),
+            shape=(len(subject_index), size))
+
+    def information_content(self, association_file: Path, association_type: str):
+        """Return the IC and annotation count of every indexed term for one association set."""
+        np = self.np
+        closure = self.load_closure()
+        annotations = self.read_associations(association_file, association_type)
+        num_subjects = annotations.shape[0]
+        if num_subjects == 0:
+            raise RuntimeError(f"No associations found in {association_file}")
+
+        # Subjects annotated to each term or one of its descendants
+        annotated = annotations @ closure
+        counts = np.bincount(annotated.indices, minlength=closure.shape[0])
+
+        # Scores are computed per distinct count with math.log, so they are
+        # bit-identical to oaklib's
+        scores = np.zeros(closure.shape[0])
+        used = counts > 0
+        distinct, inverse = np.unique(counts[used], return_inverse=True)
+        per_count = np.array(
+            [-math.log(int(count) / num_subjects) / math.log(2) for count in distinct])
+        scores[used] = per_count[inverse]
+        return scores, counts
+
+    def write_information_content(self, association_file: Path, association_type: str,
+                                  output_path: Path) -> None:
+        """Write the IC of annotated entities as headerless 'CURIE<TAB>IC' rows."""
+        scores, counts = self.information_content(association_file, association_type)
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+        with tmp_path.open('w') as out_file:
+            for curie in self.entities:
+                index = self.term_index[curie]
+                if counts[index]:
+                    out_file.write(f"{curie}\t{float(scores[index])}\n")
+        os.replace(tmp_path, output_path)
+
+
+class Stage:
+    """A single unit of pipeline work with declared file inputs and outputs."""
+
+    def __init__(self, name: str, action: Callable[[], None],
+                 inputs: Optional[List[str]] = None,
+                 outputs: Optional[List[str]] = None,
+                 memory_gb: float = 0.0, reuse_existing: bool = False,
+                 cache_params: Optional[Dict] = None,
+                 temporary: Optional[List[str]] = None):
+        """
+        Initialize a stage.
+
+        Args:
+            name: Unique stage name (stages with the same name are built once)
+            action: Callable that produces the stage outputs
+            inputs: Files (relative to the working directory) the stage reads
+            outputs: Files (relative to the working directory) the stage writes
+            memory_gb: Estimated peak memory, used against the scheduler budget
+            reuse_existing: Skip the action if all outputs already exist
+            cache_params: Command and parameters identifying the stage output
+                (e.g., thresholds and ontology versions). Stages without
+                cache_params are never cached.
+            temporary: Intermediate outputs (e.g., unlabeled results) that the
+                graph removes once every stage reading them has finished
+        """
+        self.name = name
+        self.action = action
+        self.inputs = list(inputs or [])
+        self.outputs = list(outputs or [])
+        self.memory_gb = memory_gb
+        self.reuse_existing = reuse_existing
+        self.cache_params = cache_params
+        self.temporary = list(temporary or [])
+        unknown = set(self.temporary) - set(self.outputs)
+        if unknown:
+            raise ValueError(
+                f"Temporary files of stage {name} are not outputs: "
+                f"{', '.join(sorted(unknown))}")
+
+    def run(self, working_dir: Path, cache: Optional[StageCache] = None) -> str:
+        """
+        Run the stage action unless its outputs can be reused or restored.
+
+        Returns:
+            'reused', 'restored' or 'completed'
+        """
+        if self.reuse_existing and self.outputs and all(
+                (working_dir / output).exists() for output in self.outputs):
+            logger.info(f"Reusing existing outputs for stage {self.name}")
+            return 'reused'
+
+        if cache is None or self.cache_params is None or not self.outputs:
+            self.action()
+            return 'completed'
+
+        outputs = [working_dir / output for output in self.outputs]
+        key = cache.stage_key(self, working_dir)
+        if cache.restore(key, outputs):
+            logger.info(f"Restored stage {self.name} from cache ({key[:12]})")
+            return 'restored'
+
+        # Outputs hard linked from the cache must not be overwritten in place
+        for output in outputs:
+            if output.exists() and output.stat().st_nlink > 1:
+                output.unlink()
+
+        self.action()
+        cache.store(key, self.name, outputs)
+        return 'completed'
+
+
+class StageGraph:
+    """Dependency graph of pipeline stages, wired by their declared files."""
+
+    def __init__(self, working_dir: Path, cache: Optional[StageCache] = None,
+                 metrics: Optional[MetricsRecorder] = None):
+        self.working_dir = working_dir
+        self.cache = cache
+        self.metrics = metrics or MetricsRecorder()
+        self.stages: Dict[str, Stage] = {}
+
+    def add(self, stage: Stage) -> Stage:
+        """
+        Add a stage to the graph.
+
+        A stage whose name is already registered is treated as shared and is
+        not added again, so it is only built once per run.
+        """
+        existing = self.stages.get(stage.name)
+        if existing is not None:
+            if existing.outputs != stage.outputs:
+                raise ValueError(
+                    f"Stage {stage.name} registered with different outputs")
+            return existing
+
+        for other in self.stages.values():
+            overlap = set(other.outputs) & set(stage.outputs)
+            if overlap:
+                raise ValueError(
+                    f"Stages {other.name} and {stage.name} both produce "
+                    f"{', '.join(sorted(overlap))}")
+
+        self.stages[stage.name] = stage
+        return stage
+
+    def dependencies(self, stage: Stage) -> List[str]:
+        """Return the names of the stages producing this stage's inputs."""
+        producers = {output: other.name
+                     for other in self.stages.values()
+                     for output in other.outputs}
+        return sorted({producers[path] for path in stage.inputs
+                       if path in producers and producers[path] != stage.name})
+
+    def topological_order(self) -> List[Stage]:
+        """Return the stages in dependency order, rejecting cycles."""
+        order: List[Stage] = []
+        state: Dict[str, str] = {}
+
+        def visit(name: str) -> None:
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"Cycle detected in stage graph at {name}")
+            state[name] = 'visiting'
+            for dependency in self.dependencies(self.stages[name]):
+                visit(dependency)
+            state[name] = 'done'
+            order.append(self.stages[name])
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def run_stage(self, stage: Stage) -> None:
+        """Run one stage and record its metrics."""
+        with self.metrics.stage(stage.name) as record:
+            record["status"] = stage.run(self.working_dir, self.cache)
+            MetricsRecorder.record_files(record, self.working_dir,
+                                         stage.inputs, stage.outputs)
+
+    def remove_temporary_files(self, stage: Stage, readers: Dict[str, set]) -> None:
+        """
+        Remove temporary files that no unfinished stage reads any more.
+
+        Args:
+            stage: Stage that has just finished successfully
+            readers: Names of the unfinished stages reading each temporary
+                file; updated in place
+        """
+        finished = [path for path in stage.temporary if not readers[path]]
+        for path in stage.inputs:
+            if path in readers:
+                readers[path].discard(stage.name)
+                if not readers[path]:
+                    finished.append(path)
+        for path in finished:
+            logger.debug(f"Removing temporary file {path}")
+            (self.working_dir / path).unlink(missing_ok=True)
+
+    def run(self, jobs: int = 1, memory_budget_gb: Optional[float] = None) -> None:
+        """
+        Run all stages, executing independent stages in parallel.
+
+        Args:
+            jobs: Maximum number of stages running at once
+            memory_budget_gb: Maximum summed memory estimate of running stages.
+                A stage larger than the budget still runs, but only on its own.
+        """
+        jobs = max(1, jobs)
+        order = self.topological_order()
+        dependencies = {stage.name: set(self.dependencies(stage))
+                        for stage in order}
+        pending = [stage.name for stage in order]
+        readers = {path: {other.name for other in order if path in other.inputs}
+                   for stage in order for path in stage.temporary}
+        done = set()
+        running = {}
+        reserved_gb = 0.0
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            while pending or running:
+                if errors:
+                    pending.clear()
+
+                for name in list(pending):
+                    if len(running) >= jobs:
+                        break
+                    if not dependencies[name] <= done:
+                        continue
+                    stage = self.stages[name]
+                    if (memory_budget_gb is not None and running and
+                            reserved_gb + stage.memory_gb > memory_budget_gb):
+                        continue
+                    pending.remove(name)
+                    reserved_gb += stage.memory_gb
+                    logger.debug(f"Scheduling stage {name}")
+                    future = pool.submit(self.run_stage, stage)
+                    running[future] = stage
+
+                if not running:
+                    if pending:
+                        raise RuntimeError(
+                            f"Unable to schedule stages: {', '.join(pending)}")
+                    break
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    reserved_gb -= stage.memory_gb
+                    error = future.exception()
+                    if error is not None:
+                        logger.error(f"Stage {stage.name} failed: {error}")
+                        errors.append(error)
+                    else:
+                        done.add(stage.name)
+                        self.remove_temporary_files(stage, readers)
+
+        if errors:
+            raise errors[0]
+
 
 class PipelineRunner:
     """Main pipeline runner class."""
 
     def __init__(self, config: PipelineConfig):
         self.config = config
+        self.metrics = MetricsRecorder()
+        self._oak_session: Optional[OakSession] = None
+        self._oak_lock = threading.Lock()
+        self._ic_engine: Optional[InformationContentEngine] = None
+        self._artifact_store: Optional[ArtifactStore] = None
+        PROGRESS_STATUS.path = config.status_file
+
+    def oak_session(self) -> Optional[OakSession]:
+        """
+        Return the shared in-process oaklib session.
+
+        Returns None when the runoak backend is configured, or when oaklib
+        cannot be imported, in which case runoak subprocesses are used.
+        """
+        if self.config.oak_backend != 'python':
+            return None
+        with self._oak_lock:
+            if self._oak_session is None:
+                try:
+                    self._oak_session = OakSession()
+                except ImportError as e:
+                    logger.warning(
+                        f"oaklib not importable ({e}); falling back to runoak")
+                    self.config.oak_backend = 'runoak'
+                    return None
+            return self._oak_session
+
+    def artifact_store(self) -> Optional[ArtifactStore]:
+        """Return the machine-wide artifact store, or None when it is disabled."""
+        if self.config.artifact_dir is None:
+            return None
+        with self._oak_lock:
+            if self._artifact_store is None:
+                self._artifact_store = ArtifactStore(self.config.artifact_dir)
+            return self._artifact_store
+
+    def ic_engine(self) -> Optional[InformationContentEngine]:
+        """
+        Return the shared native information content engine.
+
+        Returns None when the oak engine is configured, or when numpy and
+        scipy cannot be imported or the PHENIO database cannot be located,
+        in which case the oaklib backend computes IC.
+        """
+        if self.config.ic_engine != 'native':
+            return None
+        with self._oak_lock:
+            if self._ic_engine is not None:
+                return self._ic_engine
+        db_path = self.ontology_db_path('phenio')
+        if db_path is None:
+            logger.warning("PHENIO database path unknown; falling back to oaklib for IC")
+            self.config.ic_engine = 'oak'
+            return None
+        with self._oak_lock:
+            if self._ic_engine is None:
+                try:
+                    self._ic_engine = InformationContentEngine(db_path)
+                except ImportError as e:
+                    logger.warning(
+                        f"numpy/scipy not importable ({e}); falling back to oaklib for IC")
+                    self.config.ic_engine = 'oak'
+                    return None
+            return self._ic_engine
+
+    def ontology_db_path(self, ontology: str) -> Optional[Path]:
+        """
+        Return the SemSQL database file of an ontology.
 
-    def run_command(self, command: str, shell: bool = True, check: bool = True) -> subprocess.CompletedProcess:
-        """Run a shell command and return the result."""
-        logger.info(f"Running: {command}")
+        Local databases are used as configured; for sqlite:obo: identifiers
+        oaklib downloads (or finds) the database. Returns None when the path
+        cannot be determined, e.g., with the runoak backend.
+        """
+        if ontology == 'phenio' and self.config.custom_phenio:
+            return self.config.custom_phenio
+        local_db = self.config.ontology_dbs.get(ontology)
+        if local_db:
+            return self.config.working_dir / local_db
+        session = self.oak_session()
+        if session is None:
+            return None
+        adapter, _lock = session.adapter(self.get_ontology_identifier(ontology))
+        database = getattr(getattr(adapter, 'engine', None), 'url', None)
+        database = database.database if database is not None else None
+        return Path(database) if database else None
+
+    def get_ontology_identifier(self, ontology: str) -> str:
+        """Get the oaklib identifier of an ontology, honoring a custom PHENIO."""
+        if ontology == 'phenio':
+            return self.config.get_phenio_identifier()
+        local_db = self.config.ontology_dbs.get(ontology.lower())
+        if local_db:
+            return f"sqlite:{local_db}"
+        return f"sqlite:obo:{ontology.lower()}"
+
+    def command_log_path(self) -> Path:
+        """Log file of the commands run by the current stage (logs/<stage>.log)."""
+        name = _current_stage_name.get() or 'pipeline'
+        safe_name = ''.join(char if char.isalnum() or char in '._-' else '_'
+                            for char in name)
+        return self.config.working_dir / 'logs' / f"{safe_name}.log"
+
+    def run_command(self, command: Union[str, List[str]], shell: Optional[bool] = None,
+                    check: bool = True, stdout: Optional[str] = None,
+                    capture_stdout: bool = False) -> subprocess.CompletedProcess:
+        """
+        Run a command and return the result.
+
+        An argv list runs without a shell; a string runs through the shell.
+        stdout names a file in the working directory that receives the
+        command's standard output, and capture_stdout keeps it in the result.
+        All other output is streamed line by line into the current stage's
+        log file (see command_log_path) and the debug log; the last
+        ERROR_TAIL_LINES lines are logged when the command fails.
+
+        The resource usage of the command (CPU time, peak RSS, block I/O) is
+        added to the metrics of the current stage.
+        """
+        display = command if isinstance(command, str) else shlex.join(command)
+        log_path = self.command_log_path()
+        logger.info(f"Running: {display}")
         try:
-            result = subprocess.run(
-                command,
-                shell=shell,
-                check=check,
-                capture_output=True,
-                text=True,
-                cwd=str(self.config.working_dir)
-            )
-            if result.stdout:
-                logger.debug(f"Output: {result.stdout}")
+            result, usage = run_with_rusage(
+                command, shell=shell, cwd=str(self.config.working_dir),
+                stdout_path=self.config.working_dir / stdout if stdout else None,
+                capture_stdout=capture_stdout, log_path=log_path)
+            MetricsRecorder.add_child_usage(usage)
+            if check and result.returncode != 0:
+                raise subprocess.CalledProcessError(
+                    result.returncode, command, result.stdout, result.stderr)
             return result
         except subprocess.CalledProcessError as e:
-            logger.error(f"Command failed: {command}")
-            logger.error(f"Error output: {e.stderr}")
+            logger.error(f"Command failed with exit status {e.returncode}: {display}")
+            logger.error(f"Last output lines (full output in {log_path}):\n"
+                         f"{e.stderr.rstrip()}")
+            raise
+
+    def _validators_path(self, output_path: Path) -> Path:
+        """Path of the file storing HTTP cache validators beside a download."""
+        return output_path.with_name(output_path.name + '.http.json')
+
+    def _conditional_headers(self, output_path: Path) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since headers from stored validators."""
+        headers = {}
+        validators_path = self._validators_path(output_path)
+        if output_path.exists() and validators_path.exists():
+            validators = json.loads(validators_path.read_text())
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def _save_validators(self, headers, output_path: Path) -> None:
+        """Store the ETag / Last-Modified of a response beside a file."""
+        validators = {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified')
+        }
+        if validators['etag'] or validators['last_modified']:
+            self._validators_path(output_path).write_text(json.dumps(validators))
+
+    def _log_throughput(self, output_path: Path, num_bytes: int, start: float) -> None:
+        """Log the transfer size and rate of a completed download."""
+        MetricsRecorder.add("downloaded_bytes", num_bytes)
+        elapsed = max(time.time() - start, 1e-6)
+        logger.info(
+            f"Downloaded {output_path.name}: {format_bytes(num_bytes)} in "
+            f"{elapsed:.1f}s ({format_bytes(num_bytes / elapsed)}/s)")
+
+    def _fetch_to_part(self, url: str, part_path: Path, chunk_size: int,
+                       headers: Dict[str, str], consumer=None,
+                       progress: Optional[ProgressTimer] = None):
+        """
+        Fetch a URL into a partial file, resuming from its current size.
+
+        If given, consumer receives every byte of the file in order through
+        its feed() method, and reset() when the download restarts from zero,
+        and progress is told the file's length and the bytes received.
+
+        Returns:
+            Tuple of (response headers, expected total length or None, bytes
+            transferred), or None if the server reports the file unchanged
+        """
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        request_headers = dict(headers)
+        part_validators = self._validators_path(part_path)
+        if offset:
+            request_headers['Range'] = f"bytes={offset}-"
+            if part_validators.exists():
+                validators = json.loads(part_validators.read_text())
+                validator = validators.get('etag') or validators.get('last_modified')
+                if validator:
+                    request_headers['If-Range'] = validator
+
+        request = urllib.request.Request(url, headers={**DOWNLOAD_HEADERS, **request_headers})
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as exc:
+            if exc.code == 304 and headers:
+                return None
+            if exc.code == 416 and offset:
+                # Stale partial file; start over on the next attempt
+                part_path.unlink()
+                part_validators.unlink(missing_ok=True)
+                raise IncompleteDownloadError(
+                    f"Range not satisfiable for {url}") from exc
+            raise
+
+        with response:
+            if response.status == 206:
+                content_range = response.headers.get('Content-Range', '')
+                range_start = content_range.split(' ')[-1].split('-')[0]
+                if range_start != str(offset):
+                    raise IncompleteDownloadError(
+                        f"Unexpected Content-Range for {url}: {content_range}")
+                total = content_range.rsplit('/', 1)[-1]
+                expected_length = int(total) if total.isdigit() else None
+                mode = 'ab'
+            else:
+                if offset:
+                    logger.info(f"Server ignored range request; restarting {url}")
+                    if consumer is not None:
+                        consumer.reset()
+                length = response.headers.get('Content-Length')
+                expected_length = int(length) if length else None
+                offset = 0
+                mode = 'wb'
+                self._save_validators(response.headers, part_path)
+
+            if progress is not None:
+                progress.set_total(expected_length)
+                progress.set_done(offset)
+            transferred = 0
+            with open(part_path, mode) as out_file:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    out_file.write(chunk)
+                    transferred += len(chunk)
+                    if consumer is not None:
+                        consumer.feed(chunk)
+                    if progress is not None:
+                        progress.advance(len(chunk))
+
+            if expected_length is not None and offset + transferred < expected_length:
+                raise IncompleteDownloadError(
+                    f"Connection closed after {offset + transferred} of "
+                    f"{expected_length} bytes from {url}")
+            return response.headers, expected_length, transferred
+
+    def _fetch_ranges_to_part(self, url: str, part_path: Path, chunk_size: int,
+                              headers: Dict[str, str], range_workers: int,
+                              retries: int, backoff: float,
+                              progress: Optional[ProgressTimer] = None):
+        """
+        Fetch a URL into a partial file as several byte ranges in parallel.
+
+        Falls back to a single-stream fetch when the server does not support
+        ranges or the file is below PARALLEL_RANGE_MIN_BYTES.
+
+        Returns:
+            Same as _fetch_to_part
+        """
+        head = urllib.request.Request(url, headers={**DOWNLOAD_HEADERS, **headers},
+                                      method='HEAD')
+        try:
+            with urllib.request.urlopen(head) as response:
+                response_headers = response.headers
+        except urllib.error.HTTPError as exc:
+            if exc.code == 304 and headers:
+                return None
+            raise
+
+        length = response_headers.get('Content-Length')
+        if (response_headers.get('Accept-Ranges') != 'bytes' or not length or
+                int(length) < PARALLEL_RANGE_MIN_BYTES):
+            return self._fetch_to_part(url, part_path, chunk_size, headers,
+                                       progress=progress)
+
+        total = int(length)
+        step = -(-total // range_workers)
+        ranges = [(start, min(start + step, total) - 1)
+                  for start in range(0, total, step)]
+        with open(part_path, 'wb') as out_file:
+            out_file.truncate(total)
+
+        validator = response_headers.get('ETag') or response_headers.get('Last-Modified')
+        if progress is not None:
+            progress.set_total(total)
+            progress.set_done(0)
+
+        def fetch_range(first: int, last: int) -> int:
+            for attempt in range(retries + 1):
+                range_headers = {'Range': f"bytes={first}-{last}"}
+                if validator:
+                    range_headers['If-Range'] = validator
+                received = 0
+                try:
+                    request = urllib.request.Request(
+                        url, headers={**DOWNLOAD_HEADERS, **range_headers})
+                    with urllib.request.urlopen(request) as response:
+                        if response.status != 206:
+                            raise IncompleteDownloadError(
+                                f"Server ignored range request for {url}")
+                        with open(part_path, 'r+b') as out_file:
+                            out_file.seek(first)
+                            while True:
+                                chunk = response.read(chunk_size)
+                                if not chunk:
+                                    break
+                                out_file.write(chunk)
+                                received += len(chunk)
+                                if progress is not None:
+                                    progress.advance(len(chunk))
+                    if received != last - first + 1:
+                        raise IncompleteDownloadError(
+                            f"Range {first}-{last} of {url} truncated")
+                    return received
+                except RETRYABLE_DOWNLOAD_ERRORS as exc:
+                    if progress is not None:
+                        # The range is fetched again from its start
+                        progress.advance(-received)
+                    if attempt == retries or not is_retryable_download_error(exc):
+                        raise
+                    time.sleep(backoff * 2 ** attempt)
+            return 0
+
+        try:
+            with ThreadPoolExecutor(max_workers=range_workers) as pool:
+                transferred = sum(pool.map(lambda r: fetch_range(*r), ranges))
+        except Exception:
+            # A preallocated file cannot be resumed by size, so discard it
+            part_path.unlink(missing_ok=True)
             raise
+        return response_headers, total, transferred
 
-    def download_file(self, url: str, output_path: Path, chunk_size: int = 8192) -> None:
+    def download_file(self, url: str, output_path: Path,
+                      chunk_size: int = 1024 * 1024, conditional: bool = False,
+                      sha256: Optional[str] = None, retries: int = 5,
+                      backoff: float = 2.0, range_workers: Optional[int] = None,
+                      consumer=None, validators_for: Optional[Path] = None) -> bool:
         """
         Download a file from URL to output path using Python urllib.
 
+        The file is written to ``<output_path>.part``, resumed with HTTP Range
+        requests after interruptions (including across runs), and only renamed
+        to output_path once its length and checksum have been verified.
+
         Args:
             url: URL to download from
             output_path: Path where to save the file
             chunk_size: Size of chunks to read at a time
+            conditional: Skip the download if the server reports the file
+                unchanged since the ETag / Last-Modified stored beside it
+            sha256: Expected SHA-256 hex digest of the file, if known
+            retries: Number of retries after a failed or interrupted transfer
+            backoff: Initial delay in seconds between retries, doubled each time
+            range_workers: Number of byte ranges fetched in parallel for large
+                files (default: config.download_range_workers)
+            consumer: Optional stream processor (e.g., StreamingTsvFilter) fed
+                the downloaded bytes in order while they are written. Disables
+                parallel range requests.
+            validators_for: File whose stored ETag / Last-Modified are sent
+                and updated by conditional requests (default: output_path)
+
+        Returns:
+            True if the file was downloaded, False if it was unchanged
         """
         logger.info(f"Downloading {url}...")
+        part_path = output_path.with_name(output_path.name + '.part')
+        if range_workers is None:
+            range_workers = self.config.download_range_workers
+        if consumer is not None:
+            range_workers = 1
+
+        progress = ProgressTimer(f"Download of {output_path.name}", unit='bytes')
         try:
-            with urllib.request.urlopen(url) as response:
-                with open(output_path, 'wb') as out_file:
-                    while True:
-                        chunk = response.read(chunk_size)
-                        if not chunk:
-                            break
-                        out_file.write(chunk)
+            progress.start()
+            start = time.time()
+            headers = {}
+            if conditional and not part_path.exists():
+                headers = self._conditional_headers(validators_for or output_path)
+
+            for attempt in range(retries + 1):
+                if consumer is not None:
+                    # Bring the consumer up to the point the transfer resumes from
+                    consumer.reset()
+                    if part_path.exists():
+                        with part_path.open('rb') as handle:
+                            for chunk in iter(lambda: handle.read(chunk_size), b''):
+                                consumer.feed(chunk)
+                try:
+                    if range_workers > 1 and not part_path.exists():
+                        result = self._fetch_ranges_to_part(
+                            url, part_path, chunk_size, headers,
+                            range_workers, retries, backoff, progress)
+                    else:
+                        result = self._fetch_to_part(
+                            url, part_path, chunk_size, headers, consumer, progress)
+                    break
+                except RETRYABLE_DOWNLOAD_ERRORS as exc:
+                    if attempt == retries or not is_retryable_download_error(exc):
+                        raise
+                    delay = backoff * 2 ** attempt
+                    logger.warning(
+                        f"Download of {url} interrupted ({exc}); "
+                        f"retrying in {delay:.0f}s...")
+                    time.sleep(delay)
+
+            if result is None:
+                logger.info(f"{output_path.name} is up to date")
+                return False
+            response_headers, expected_length, transferred = result
+
+            self.verify_download(part_path, expected_length, sha256)
+            self._validators_path(output_path).unlink(missing_ok=True)
+            os.replace(part_path, output_path)
+            self._validators_path(part_path).unlink(missing_ok=True)
+            if conditional:
+                self._save_validators(response_headers, validators_for or output_path)
+
+            self._log_throughput(output_path, transferred, start)
             logger.debug(f"Downloaded to {output_path}")
+            return True
         except Exception as e:
             logger.error(f"Failed to download {url}: {e}")
             raise
+        finally:
+            progress.stop()
+
+    def verify_download(self, path: Path, expected_length: Optional[int],
+                        sha256: Optional[str]) -> None:
+        """
+        Verify the length and checksum of a downloaded file.
+
+        A file failing the checksum is deleted so the next attempt starts over.
+        """
+        size = path.stat().st_size
+        if expected_length is not None and size != expected_length:
+            raise IncompleteDownloadError(
+                f"{path.name} has {size} bytes, expected {expected_length}")
+
+        if sha256:
+            digest = file_digest(path)
+            if digest != sha256.lower():
+                path.unlink()
+                self._validators_path(path).unlink(missing_ok=True)
+                raise RuntimeError(
+                    f"Checksum mismatch for {path.name}: expected {sha256}, "
+                    f"got {digest}")
 
-    def download_and_extract_zip(self, url: str, extract_to: Path) -> None:
+    def download_and_extract_zip(self, url: str, extract_to: Path,
+                                 sha256: Optional[str] = None) -> None:
         """
         Download a zip file and extract it.
 
         Args:
             url: URL of the zip file
             extract_to: Directory to extract files to
+            sha256: Expected SHA-256 hex digest of the zip file, if known
         """
         zip_path = extract_to / "temp_download.zip"
-        self.download_file(url, zip_path)
+        self.download_file(url, zip_path, sha256=sha256)
 
         logger.info(f"Extracting {zip_path.name}...")
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
@@ -371,166 +2983,1144 @@ class PipelineRunner:
         zip_path.unlink()
         logger.debug("Extraction complete")
 
-    def download_and_decompress_gzip(self, url: str, output_path: Path) -> None:
+    def download_and_decompress_gzip(self, url: str, output_path: Path,
+                                     conditional: bool = False,
+                                     columns: Optional[List[int]] = None,
+                                     filter_column: Optional[int] = None,
+                                     prefix: Optional[str] = None,
+                                     retries: int = 5) -> bool:
         """
-        Download a gzipped file and decompress it.
+        Download a gzipped file and decompress it, optionally filtering rows.
+
+        Decompression (and column projection / prefix filtering) happens while
+        the file streams in, so the full decompressed file is never written.
+        The compressed file is only kept while the download is incomplete
+        (``<output_path>.gz.part``), so interrupted downloads can resume; the
+        ETag / Last-Modified used for conditional requests are stored beside
+        the decompressed output.
 
         Args:
             url: URL of the gzipped file
             output_path: Path where to save the decompressed file
+            conditional: Skip the download if the server reports the file
+                unchanged since the ETag / Last-Modified stored beside it
+            columns: Zero-based TSV columns to keep (default: all)
+            filter_column: Zero-based TSV column that must start with prefix
+            prefix: Required prefix of filter_column (e.g., 'MP:')
+            retries: Number of retries after a failed or interrupted transfer
+
+        Returns:
+            True if the file was downloaded, False if it was unchanged
         """
-        logger.info(f"Downloading and decompressing {url}...")
+        gz_path = output_path.with_name(output_path.name + '.gz')
+        tsv_filter = StreamingTsvFilter(output_path, columns, filter_column, prefix)
+        updated = False
         try:
-            with urllib.request.urlopen(url) as response:
-                with gzip.GzipFile(fileobj=response) as gzip_file:
-                    with open(output_path, 'wb') as out_file:
-                        shutil.copyfileobj(gzip_file, out_file)
-            logger.debug(f"Decompressed to {output_path}")
+            updated = self.download_file(url, gz_path, conditional=conditional,
+                                         retries=retries, consumer=tsv_filter,
+                                         validators_for=output_path)
+            if not updated:
+                tsv_filter.discard()
+                return False
+            tsv_filter.close()
         except Exception as e:
+            tsv_filter.discard()
+            if updated:
+                # The new validators must not vouch for the old output
+                self._validators_path(output_path).unlink(missing_ok=True)
             logger.error(f"Failed to download and decompress {url}: {e}")
             raise
+        finally:
+            # Without a pending transfer to resume, the compressed copy is not needed
+            gz_path.unlink(missing_ok=True)
+            self._validators_path(gz_path).unlink(missing_ok=True)
+
+        if filter_column is not None:
+            logger.info(
+                f"{output_path.name}: kept {tsv_filter.kept} rows, "
+                f"dropped {tsv_filter.dropped} rows")
+        logger.debug(f"Decompressed to {output_path}")
+        return True
 
     def setup_working_directory(self):
         """Create and initialize the working directory."""
         logger.info(f"Setting up working directory: {self.config.working_dir}")
         self.config.working_dir.mkdir(parents=True, exist_ok=True)
+        PROGRESS_STATUS.set_state("running")
         os.chdir(self.config.working_dir)
 
+    def install_from_store(self, url: str, filename: str, target: Path,
+                           fetch: Callable[[Path], bool],
+                           pinned: bool = False) -> None:
+        """
+        Link an artifact from the artifact store, fetching it into the store if needed.
+
+        Args:
+            url: Download URL of the artifact, which keys its store entry
+            filename: Name of the artifact file in the store entry
+            target: Path the artifact is linked to
+            fetch: Called with the store path to download the artifact into
+                the store, or update it; returns True if the file changed
+            pinned: The URL names a fixed version, so a verified stored copy
+                is used without checking upstream for updates
+        """
+        store = self.artifact_store()
+        with store.locked(url) as entry:
+            path = entry / filename
+            if store.verify(path):
+                updated = False
+                if not pinned:
+                    try:
+                        updated = fetch(path)
+                    except (OSError, http.client.HTTPException) as e:
+                        logger.warning(f"Could not check {url} for updates ({e}); "
+                                       f"using the stored {filename}")
+            else:
+                path.unlink(missing_ok=True)
+                fetch(path)
+                updated = True
+            if updated:
+                store.record(path, url)
+            else:
+                logger.info(f"Using stored {filename} from {entry}")
+            link_or_clone(path, target)
+
     def install_tools(self):
-        """Download and install required command-line tools (duckdb, yq)."""
+        """Download and install required command-line tools (duckdb)."""
         logger.info("Installing required tools...")
 
         # Install DuckDB
-        if not self.config.duckdb_path.exists():
-            logger.info("Downloading DuckDB...")
-            duckdb_url = "https://github.com/duckdb/duckdb/releases/download/v0.10.3/duckdb_cli-linux-amd64.zip"
-            self.download_and_extract_zip(duckdb_url, self.config.working_dir)
-            self.run_command(f"chmod +x {self.config.duckdb_path}")
-            logger.info("DuckDB installed")
-        else:
+        if self.config.duckdb_path.exists():
             logger.info("DuckDB already installed")
-
-        # Install yq
-        if not self.config.yq_path.exists():
-            logger.info("Downloading yq...")
-            yq_url = "https://github.com/mikefarah/yq/releases/download/v4.2.0/yq_linux_amd64"
-            self.download_file(yq_url, self.config.yq_path)
-            self.run_command(f"chmod +x {self.config.yq_path}")
-            logger.info("yq installed")
+            return
+        url = self.config.tool_urls['duckdb']
+        if self.artifact_store() is not None:
+            def fetch_duckdb(path: Path) -> bool:
+                logger.info("Downloading DuckDB...")
+                self.download_and_extract_zip(url, path.parent)
+                path.chmod(0o755)
+                return True
+
+            self.install_from_store(url, 'duckdb', self.config.duckdb_path,
+                                    fetch_duckdb, pinned=True)
         else:
-            logger.info("yq already installed")
+            logger.info("Downloading DuckDB...")
+            self.download_and_extract_zip(url, self.config.working_dir)
+            self.config.duckdb_path.chmod(0o755)
+        logger.info("DuckDB installed")
 
-    def get_ontology_versions(self):
-        """Retrieve version information for all ontologies."""
-        logger.info("Retrieving ontology versions...")
+    def install_ontology_databases(self):
+        """
+        Link the SemSQL databases of HP, MP, ZP and PHENIO from the artifact store.
 
-        ontologies = {
-            'hp': 'HP',
+        Databases are fetched into the store (or updated, when upstream has
+        changed) in parallel, linked into the working directory as
+        ``<ontology>.db`` and used instead of sqlite:obo:<ontology>. Locally
+        configured databases are left alone; without an artifact store oaklib
+        fetches the databases itself.
+        """
+        if self.artifact_store() is None:
+            logger.info("Artifact store disabled; oaklib fetches the ontology databases")
+            return
+
+        pending = [ontology for ontology in ('hp', 'mp', 'zp', 'phenio')
+                   if not (ontology == 'phenio' and self.config.custom_phenio)
+                   and not self.config.ontology_dbs.get(ontology)]
+
+        def install(ontology: str) -> None:
+            url = f"{self.config.semsql_url_base}/{ontology}.db.gz"
+
+            def fetch_database(path: Path) -> bool:
+                # Only retry checks for updates briefly when a stored copy exists
+                return self.download_and_decompress_gzip(
+                    url, path, conditional=True, retries=1 if path.exists() else 5)
+
+            self.install_from_store(url, f"{ontology}.db",
+                                    self.config.working_dir / f"{ontology}.db",
+                                    fetch_database)
+
+        with ThreadPoolExecutor(max_workers=self.config.download_workers) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, install, ontology)
+                       for ontology in pending]
+            for future in futures:
+                future.result()
+        self.attach_ontology_databases()
+
+    def attach_ontology_databases(self):
+        """Use the ontology databases linked into the working directory, if any."""
+        if self.artifact_store() is None:
+            return
+        for ontology in ('hp', 'mp', 'zp', 'phenio'):
+            if ontology == 'phenio' and self.config.custom_phenio:
+                continue
+            if (not self.config.ontology_dbs.get(ontology) and
+                    (self.config.working_dir / f"{ontology}.db").exists()):
+                # Relative to the working directory, so stage cache keys do
+                # not depend on where the working directory is
+                self.config.ontology_dbs[ontology] = Path(f"{ontology}.db")
+
+    def probe_ontology_version(self, ontology: str, cache: Dict[str, dict]) -> Optional[str]:
+        """
+        Return the version of an ontology, read from its SemSQL database.
+
+        Versions are cached against the database's path, mtime and size, so an
+        unchanged database is not queried again. When the database path is
+        unknown (runoak backend with a sqlite:obo: ontology), the version is
+        taken from runoak ontology-metadata.
+        """
+        db_path = self.ontology_db_path(ontology)
+        if db_path is None:
+            result = self.run_command(
+                ['runoak', '-i', self.get_ontology_identifier(ontology),
+                 'ontology-metadata', '--all'], capture_stdout=True)
+            return parse_version_iri(result.stdout)
+
+        stat = db_path.stat()
+        key = {'db': str(db_path.absolute()), 'mtime_ns': stat.st_mtime_ns,
+               'size': stat.st_size}
+        cached = cache.get(ontology)
+        if cached and all(cached.get(name) == value for name, value in key.items()):
+            logger.debug(f"Using cached version of {db_path}")
+            return cached['version']
+        version = read_ontology_version(db_path)
+        cache[ontology] = dict(key, version=version)
+        return version
+
+    def get_ontology_versions(self):
+        """Retrieve version information for all ontologies, in parallel."""
+        logger.info("Retrieving ontology versions...")
+
+        ontologies = {
+            'hp': 'HP',
             'mp': 'MP',
             'zp': 'ZP',
             'phenio': 'PHENIO'
         }
 
-        for key, ont_id in ontologies.items():
-            logger.info(f"Getting version for {ont_id}...")
+        cache_path = self.config.working_dir / 'ontology_versions.json'
+        cache: Dict[str, dict] = {}
+        if cache_path.exists():
+            try:
+                cache = json.loads(cache_path.read_text())
+            except ValueError:
+                logger.warning(f"Ignoring unreadable version cache {cache_path}")
+
+        with ThreadPoolExecutor(max_workers=len(ontologies)) as pool:
+            futures = {
+                key: pool.submit(contextvars.copy_context().run,
+                                 self.probe_ontology_version, key, cache)
+                for key in ontologies
+            }
+            versions = {key: future.result() for key, future in futures.items()}
+
+        tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+        tmp_path.write_text(json.dumps(cache, indent=2))
+        os.replace(tmp_path, cache_path)
 
-            # Use custom PHENIO identifier if provided
-            if key == 'phenio':
-                ont_identifier = self.config.get_phenio_identifier()
-            else:
-                ont_lower = ont_id.lower()
-                ont_identifier = f"sqlite:obo:{ont_lower}"
-
-            cmd = (
-                f"runoak -i {ont_identifier} ontology-metadata --all | "
-                f"{self.config.yq_path} eval '.[\"owl:versionIRI\"][0]' - > {key}_version"
-            )
-            self.run_command(cmd)
-
-            # Read version from file
-            version_file = self.config.working_dir / f"{key}_version"
-            if version_file.exists():
-                version = version_file.read_text().strip()
+        for key, ont_id in ontologies.items():
+            version = versions[key]
+            if version:
+                # Version files are read back by --skip-setup runs
+                (self.config.working_dir / f"{key}_version").write_text(f"{version}\n")
                 setattr(self.config, f"{key}_version", version)
                 logger.info(f"{ont_id} version: {version}")
             else:
                 logger.warning(f"Could not read version for {ont_id}")
 
     def download_association_tables(self):
-        """Download and preprocess association tables."""
+        """
+        Download and preprocess association tables.
+
+        MP and ZP associations are reduced to pairwise (gene, phenotype)
+        associations while they are downloaded, keeping only rows whose
+        object ID (column 5) has the ontology prefix.
+        """
         logger.info("Downloading association tables...")
 
-        # Download HPOA (Human Phenotype Ontology Annotations)
-        logger.info("Downloading HPOA...")
-        hpoa_url = "http://purl.obolibrary.org/obo/hp/hpoa/phenotype.hpoa"
-        self.download_file(hpoa_url, self.config.working_dir / 'hpoa.tsv')
-
-        # Download MPA (Mouse Phenotype Annotations)
-        logger.info("Downloading MPA...")
-        mpa_url = "https://data.monarchinitiative.org/dipper-kg/final/tsv/gene_associations/gene_phenotype.10090.tsv.gz"
-        self.download_and_decompress_gzip(
-            mpa_url, self.config.working_dir / 'mpa.tsv')
-
-        # Download ZPA (Zebrafish Phenotype Annotations)
-        logger.info("Downloading ZPA...")
-        zpa_url = "https://data.monarchinitiative.org/dipper-kg/final/tsv/gene_associations/gene_phenotype.7955.tsv.gz"
-        self.download_and_decompress_gzip(
-            zpa_url, self.config.working_dir / 'zpa.tsv')
-
-        # Preprocess MP and ZP to pairwise associations
-        logger.info("Preprocessing association tables...")
-        self.run_command(
-            'cut -f1,5 mpa.tsv | grep "MP" > mpa.tsv.tmp && mv mpa.tsv.tmp mpa.tsv')
-        self.run_command(
-            'cut -f1,5 zpa.tsv | grep "ZP" > zpa.tsv.tmp && mv zpa.tsv.tmp zpa.tsv')
+        working_dir = self.config.working_dir
+        urls = self.config.association_urls
+        downloads = {
+            'HPOA': (self.download_file, urls['HPOA'],
+                     working_dir / 'hpoa.tsv', {}),
+            'MPA': (self.download_and_decompress_gzip, urls['MPA'],
+                    working_dir / 'mpa.tsv',
+                    dict(columns=[0, 4], filter_column=4, prefix='MP:')),
+            'ZPA': (self.download_and_decompress_gzip, urls['ZPA'],
+                    working_dir / 'zpa.tsv',
+                    dict(columns=[0, 4], filter_column=4, prefix='ZP:')),
+        }
+
+        with ThreadPoolExecutor(max_workers=self.config.download_workers) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, download, url,
+                            output_path, conditional=True, **options)
+                for download, url, output_path, options in downloads.values()
+            ]
+            for future in futures:
+                future.result()
 
     def get_ontology_terms(self, ontology: str, root_term: str, output_prefix: str):
         """Get descendant terms for an ontology."""
-        cmd = (
-            f"runoak -i sqlite:obo:{ontology.lower()} descendants -p i {root_term} > {output_prefix}_terms.txt && "
-            f'sed "s/ [!] /\\t/g" {output_prefix}_terms.txt > {output_prefix}_terms.tsv'
-        )
+        session = self.oak_session()
+        if session is not None:
+            with ProgressTimer(f"Extracting {ontology} terms from {root_term}"):
+                session.write_descendants(
+                    self.get_ontology_identifier(ontology), root_term,
+                    self.config.working_dir / f"{output_prefix}_terms.txt",
+                    self.config.working_dir / f"{output_prefix}_terms.tsv")
+            return
 
+        terms_path = self.config.working_dir / f"{output_prefix}_terms.txt"
         with ProgressTimer(f"Extracting {ontology} terms from {root_term}"):
-            self.run_command(cmd)
+            self.run_command(
+                ['runoak', '-i', self.get_ontology_identifier(ontology),
+                 'descendants', '-p', 'i', root_term],
+                stdout=terms_path.name)
+            # 'CURIE ! label' rows -> 'CURIE<TAB>label'
+            with terms_path.open(encoding='utf-8') as in_file, \
+                    terms_path.with_suffix('.tsv').open('w', encoding='utf-8') as out_file:
+                for line in in_file:
+                    out_file.write(line.replace(' ! ', '\t'))
 
     def calculate_information_content(self, association_file: str, association_type: str, output_file: str, ontology: str = 'phenio'):
         """Calculate information content using associations."""
         # Use custom PHENIO if provided, otherwise use default ontology identifier
-        if ontology == 'phenio':
-            ontology_identifier = self.config.get_phenio_identifier()
-        else:
-            ontology_identifier = f"sqlite:obo:{ontology}"
+        ontology_identifier = self.get_ontology_identifier(ontology)
+
+        engine = self.ic_engine() if ontology == 'phenio' else None
+        if engine is not None:
+            with ProgressTimer(f"Calculating information content from {association_file}"):
+                engine.write_information_content(
+                    self.config.working_dir / association_file,
+                    association_type,
+                    self.config.working_dir / output_file)
+            return
 
-        cmd = (
-            f"runoak -g {association_file} -G {association_type} -i {ontology_identifier} "
-            f"information-content -p i --use-associations .all > {output_file} && "
-            f'tail -n +2 "{output_file}" > "{output_file}.tmp" && mv "{output_file}.tmp" "{output_file}"'
-        )
+        session = self.oak_session()
+        if session is not None:
+            with ProgressTimer(f"Calculating information content from {association_file}"):
+                session.write_information_content(
+                    ontology_identifier,
+                    self.config.working_dir / association_file,
+                    association_type,
+                    self.config.working_dir / output_file)
+            return
 
+        output_path = self.config.working_dir / output_file
+        tmp_path = output_path.with_name(f"{output_file}.tmp")
         with ProgressTimer(f"Calculating information content from {association_file}"):
-            self.run_command(cmd)
+            self.run_command(
+                ['runoak', '-g', association_file, '-G', association_type,
+                 '-i', ontology_identifier, 'information-content', '-p', 'i',
+                 '--use-associations', '.all'],
+                stdout=output_file)
+            # Drop the header row
+            with output_path.open(encoding='utf-8') as in_file, \
+                    tmp_path.open('w', encoding='utf-8') as out_file:
+                in_file.readline()
+                shutil.copyfileobj(in_file, out_file)
+            os.replace(tmp_path, output_path)
+
+    def similarity_command(self, set1_file: str, set2_file: str, ic_file: str,
+                           output_file: str) -> List[str]:
+        """Build the argv of the runoak semsimian similarity command."""
+        phenio_identifier = self.config.get_semsimian_phenio_identifier()
+
+        return [
+            'runoak', '-i', phenio_identifier, 'similarity', '--no-autolabel',
+            '--information-content-file', ic_file, '-p', 'i',
+            '--set1-file', set1_file, '--set2-file', set2_file,
+            '-O', 'csv', '-o', output_file,
+            '--min-ancestor-information-content', str(self.config.resnik_threshold),
+        ]
 
     def run_similarity_analysis(self, set1_file: str, set2_file: str, ic_file: str, output_file: str):
         """Run semantic similarity analysis using semsimian."""
-        phenio_identifier = self.config.get_semsimian_phenio_identifier()
+        if self.config.symmetric and set1_file == set2_file:
+            self.run_symmetric_similarity_analysis(set1_file, ic_file, output_file)
+            return
 
-        cmd = (
-            f"runoak -i {phenio_identifier} similarity --no-autolabel "
-            f"--information-content-file {ic_file} -p i "
-            f"--set1-file {set1_file} --set2-file {set2_file} "
-            f"-O csv -o {output_file} "
-            f"--min-ancestor-information-content {self.config.resnik_threshold}"
-        )
+        if self.config.similarity_shards > 1:
+            self.run_sharded_similarity_analysis(
+                set1_file, set2_file, ic_file, output_file)
+            return
 
-        with ProgressTimer(f"Similarity analysis -> {output_file}"):
+        cmd = self.similarity_command(set1_file, set2_file, ic_file, output_file)
+        progress = SimilarityProgress(self.config.working_dir)
+        progress.add(set1_file, set2_file, output_file)
+
+        with ProgressTimer(f"Similarity analysis -> {output_file}", progress=progress,
+                           total=progress.total(), unit='pairs'):
             self.run_command(cmd)
 
+    def run_streaming_similarity(self, set1_file: str, set2_file: str, ic_file: str,
+                                 labels_file: str, output_file: str,
+                                 gzip_copy: Optional[str] = None) -> None:
+        """
+        Run the similarity analysis and label its rows while they are produced.
+
+        runoak writes the unlabeled rows into a FIFO that the labeler reads,
+        so the unlabeled result is never written to disk: the labeled TSV,
+        and its gzip copy if requested, are written once.
+        """
+        fifo = self.config.working_dir / f"{output_file}.fifo"
+        fifo.unlink(missing_ok=True)
+        os.mkfifo(fifo)
+        cmd = self.similarity_command(set1_file, set2_file, ic_file, fifo.name)
+        # Labeled rows are counted, as the unlabeled ones only pass through the FIFO
+        progress = SimilarityProgress(self.config.working_dir)
+        progress.add(set1_file, set2_file, f"{output_file}.tmp")
+        errors: List[Exception] = []
+        labeling_done = threading.Event()
+
+        def produce():
+            try:
+                self.run_command(cmd)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                # Open and close the write end, so the labeler reaches the end
+                # of the stream even if runoak failed before opening the FIFO
+                while not labeling_done.is_set():
+                    try:
+                        os.close(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+                        break
+                    except OSError:
+                        time.sleep(0.1)
+
+        producer = threading.Thread(target=contextvars.copy_context().run, args=(produce,))
+        with ProgressTimer(f"Similarity analysis -> {output_file} (streaming)",
+                           progress=progress, total=progress.total(), unit='pairs'):
+            producer.start()
+            try:
+                self.add_labels(fifo.name, labels_file, output_file, gzip_copy)
+            except Exception as e:
+                labeling_done.set()
+                # Open and close the read end until runoak exits, so it fails
+                # with a broken pipe instead of blocking on the FIFO
+                while producer.is_alive():
+                    os.close(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK))
+                    producer.join(0.1)
+                if errors:
+                    raise errors[0] from e
+                raise
+            finally:
+                labeling_done.set()
+                producer.join()
+                fifo.unlink()
+        if errors:
+            raise errors[0]
+
+    def split_term_file(self, term_file: str, shards: int, shard_prefix: str) -> List[str]:
+        """
+        Split a term file into contiguous, balanced shards.
+
+        Returns:
+            Names of the non-empty shard files, in term order
+        """
+        lines = (self.config.working_dir / term_file).read_text().splitlines(keepends=True)
+        base, extra = divmod(len(lines), shards)
+        shard_files = []
+        start = 0
+        for index in range(shards):
+            end = start + base + (1 if index < extra else 0)
+            if end > start:
+                shard_file = f"{shard_prefix}.shard{index}.txt"
+                (self.config.working_dir / shard_file).write_text(''.join(lines[start:end]))
+                shard_files.append(shard_file)
+            start = end
+        return shard_files
+
+    def concatenate_files(self, input_files: List[str], output_file: str) -> None:
+        """Concatenate files of the working directory into output_file."""
+        tmp_path = self.config.working_dir / f"{output_file}.tmp"
+        with tmp_path.open('wb') as out_file:
+            for input_file in input_files:
+                with (self.config.working_dir / input_file).open('rb') as in_file:
+                    shutil.copyfileobj(in_file, out_file, 1024 * 1024)
+        os.replace(tmp_path, self.config.working_dir / output_file)
+
+    def merge_similarity_shards(self, shard_outputs: List[str], output_file: str) -> None:
+        """Concatenate shard outputs in shard order, keeping the first header only."""
+        tmp_path = self.config.working_dir / f"{output_file}.tmp"
+        with tmp_path.open('wb') as out_file:
+            for index, shard_output in enumerate(shard_outputs):
+                with (self.config.working_dir / shard_output).open('rb') as in_file:
+                    header = in_file.readline()
+                    if index == 0:
+                        out_file.write(header)
+                    shutil.copyfileobj(in_file, out_file, 1024 * 1024)
+        os.replace(tmp_path, self.config.working_dir / output_file)
+
+    def run_sharded_similarity_analysis(self, set1_file: str, set2_file: str,
+                                        ic_file: str, output_file: str):
+        """
+        Run semantic similarity analysis as parallel shards of set1.
+
+        set1_file is split into config.similarity_shards balanced chunks, each
+        compared against set2_file by its own runoak/semsimian process (at most
+        config.similarity_workers at a time). Shard outputs are merged in shard
+        order, so the row order of the final TSV is deterministic.
+        """
+        shard_sets = self.split_term_file(
+            set1_file, self.config.similarity_shards, output_file)
+        shard_outputs = [f"{shard_set[:-len('.txt')]}.tsv" for shard_set in shard_sets]
+        workers = self.config.similarity_workers or len(shard_sets)
+        progress = SimilarityProgress(self.config.working_dir)
+        for shard_set, shard_output in zip(shard_sets, shard_outputs):
+            progress.add(shard_set, set2_file, shard_output)
+
+        def run_shard(shard_set: str, shard_output: str) -> None:
+            self.run_command(self.similarity_command(
+                shard_set, set2_file, ic_file, shard_output))
+            progress.finish(shard_output)
+
+        with ProgressTimer(f"Similarity analysis -> {output_file} "
+                           f"({len(shard_sets)} shards, {workers} workers)",
+                           progress=progress, total=progress.total(), unit='pairs'):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # Run each shard in a copy of this context so its resource
+                # usage is attributed to the similarity stage
+                futures = [
+                    pool.submit(contextvars.copy_context().run,
+                                run_shard, shard_set, shard_output)
+                    for shard_set, shard_output in zip(shard_sets, shard_outputs)
+                ]
+                for future in futures:
+                    future.result()
+
+            self.merge_similarity_shards(shard_outputs, output_file)
+
+        for shard_file in shard_sets + shard_outputs:
+            (self.config.working_dir / shard_file).unlink()
+
+    def run_symmetric_similarity_analysis(self, term_file: str, ic_file: str,
+                                          output_file: str) -> None:
+        """
+        Compare a term list with itself, keeping each unordered pair once.
+
+        The term list is split into row blocks (at least SYMMETRIC_BLOCKS, or
+        config.similarity_shards), each compared by its own runoak/semsimian
+        process against the terms from the block's first row onwards. Blocks
+        are sized to take about the same time, and run
+        similarity_parallelism() at a time. Pairs below the diagonal within a
+        block are dropped while the outputs are merged, so the result holds
+        the upper triangle (diagonal included) in block order.
+        """
+        working_dir = self.config.working_dir
+        terms = list(read_term_list(working_dir / term_file).values())
+        count = len(terms)
+        blocks = max(1, min(count, max(self.config.similarity_shards, SYMMETRIC_BLOCKS)))
+        # Equal areas of the triangle, so blocks take about the same time
+        starts = sorted({round(count * (1 - math.sqrt(1 - index / blocks)))
+                         for index in range(blocks)})
+        runs = []
+        for index, (start, end) in enumerate(zip(starts, starts[1:] + [count])):
+            set1 = f"{output_file}.block{index}.set1.txt"
+            set2 = f"{output_file}.block{index}.set2.txt"
+            (working_dir / set1).write_text(''.join(terms[start:end]))
+            (working_dir / set2).write_text(''.join(terms[start:]))
+            runs.append((set1, set2, f"{output_file}.block{index}.tsv"))
+        workers = self.similarity_parallelism()
+        progress = SimilarityProgress(working_dir)
+        for set1, set2, block_output in runs:
+            progress.add(set1, set2, block_output)
+
+        def run_block(set1: str, set2: str, block_output: str) -> None:
+            self.run_command(self.similarity_command(set1, set2, ic_file, block_output))
+            progress.finish(block_output)
+
+        with ProgressTimer(f"Similarity analysis -> {output_file} "
+                           f"(upper triangle, {len(runs)} blocks, {workers} workers)",
+                           progress=progress, total=progress.total(), unit='pairs'):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(contextvars.copy_context().run,
+                                run_block, set1, set2, block_output)
+                    for set1, set2, block_output in runs
+                ]
+                for future in futures:
+                    future.result()
+
+            self.merge_upper_triangle(
+                [block_output for _set1, _set2, block_output in runs],
+                term_file, output_file)
+
+        for run in runs:
+            for name in run:
+                (working_dir / name).unlink()
+
+    def merge_upper_triangle(self, similarity_files: List[str], term_file: str,
+                             output_file: str) -> None:
+        """
+        Concatenate similarity outputs, keeping pairs on or above the diagonal.
+
+        A row is kept when its subject comes no later than its object in
+        term_file; rows of terms missing from it are kept as they are.
+        """
+        working_dir = self.config.working_dir
+        order = {curie: index for index, curie
+                 in enumerate(read_term_list(working_dir / term_file))}
+        tmp_path = working_dir / f"{output_file}.tmp"
+        kept = 0
+        dropped = 0
+        with tmp_path.open('w', encoding='utf-8') as out_file:
+            for index, similarity_file in enumerate(similarity_files):
+                with (working_dir / similarity_file).open(encoding='utf-8') as in_file:
+                    header = in_file.readline()
+                    if index == 0:
+                        out_file.write(header)
+                    columns = header.rstrip('\r\n').split('\t')
+                    subject_pos = columns.index('subject_id')
+                    object_pos = columns.index('object_id')
+                    for line in in_file:
+                        fields = line.rstrip('\r\n').split('\t')
+                        subject_order = order.get(fields[subject_pos])
+                        object_order = order.get(fields[object_pos])
+                        if (subject_order is not None and object_order is not None
+                                and subject_order > object_order):
+                            dropped += 1
+                            continue
+                        out_file.write(line if line.endswith('\n') else line + '\n')
+                        kept += 1
+        os.replace(tmp_path, working_dir / output_file)
+        logger.info(f"Kept {kept} upper triangle rows ({dropped} mirrored rows dropped)")
+
+    def write_ancestors(self, term_file: str, output_file: str) -> None:
+        """
+        Write the PHENIO is_a closure of a term list as 'CURIE<TAB>ancestors' rows.
+
+        Incremental runs compare this file with the previous release's copy to
+        find terms whose ancestors changed.
+        """
+        terms = list(read_term_list(self.config.working_dir / term_file))
+        phenio_identifier = self.config.get_phenio_identifier()
+        session = self.oak_session()
+        with ProgressTimer(f"Computing ancestors of {term_file}"):
+            if session is not None:
+                closure = session.ancestors(phenio_identifier, terms)
+            else:
+                relationships_file = f"{output_file}.relationships.tsv"
+                self.run_command(
+                    ['runoak', '-i', phenio_identifier, 'relationships',
+                     '--include-entailed', '-p', 'i', '.idfile', term_file],
+                    stdout=relationships_file)
+                closure = {curie: {curie} for curie in terms}
+                relationships_path = self.config.working_dir / relationships_file
+                with relationships_path.open(encoding='utf-8') as handle:
+                    handle.readline()
+                    for line in handle:
+                        fields = line.split('\t')
+                        if len(fields) >= 3 and fields[0] in closure:
+                            closure[fields[0]].add(fields[2])
+                relationships_path.unlink()
+
+        tmp_path = self.config.working_dir / f"{output_file}.tmp"
+        with tmp_path.open('w', encoding='utf-8') as out_file:
+            for curie in terms:
+                out_file.write(f"{curie}\t{','.join(sorted(closure.get(curie, ())))}\n")
+        os.replace(tmp_path, self.config.working_dir / output_file)
+
+    def find_previous_result(self, output_prefix: str) -> Optional[Path]:
+        """Return the newest labeled result for output_prefix in the previous release."""
+        previous = self.config.previous_release
+        if previous is None:
+            return None
+        candidates = [
+            path for path in previous.glob(f"{output_prefix}_*.tsv")
+            if path.name[len(output_prefix) + 1:-len('.tsv')].isdigit()
+        ]
+        return max(candidates, default=None)
+
+    def affected_terms(self, term_file: str, ancestors_file: str,
+                       ic_changed: set) -> set:
+        """
+        Return the terms of a term list whose similarity rows may have changed.
+
+        A term is affected if it was added or removed since the previous
+        release, if its ancestors changed, or if the IC of the term or of any
+        of its ancestors changed (which can change the most informative
+        common ancestor of its pairs).
+        """
+        previous = self.config.previous_release
+        current_terms = read_term_list(self.config.working_dir / term_file)
+        current_ancestors = read_ancestors(self.config.working_dir / ancestors_file)
+        previous_terms = read_term_list(previous / term_file)
+        previous_ancestors_path = previous / ancestors_file
+        if previous_ancestors_path.exists():
+            previous_ancestors = read_ancestors(previous_ancestors_path)
+        else:
+            logger.warning(
+                f"{previous_ancestors_path} not found; treating all terms as changed")
+            previous_ancestors = {}
+
+        affected = set(current_terms).symmetric_difference(previous_terms)
+        for curie in current_terms:
+            ancestors = current_ancestors.get(curie, frozenset((curie,)))
+            if previous_ancestors.get(curie) != ancestors or ancestors & ic_changed:
+                affected.add(curie)
+        return affected
+
+    def changed_information_content(self, ic_file: str) -> set:
+        """Return terms whose IC differs from the previous release by more than the tolerance."""
+        current = read_information_content(self.config.working_dir / ic_file)
+        previous = read_information_content(self.config.previous_release / ic_file)
+        changed = set(current).symmetric_difference(previous)
+        tolerance = self.config.ic_tolerance
+        changed.update(curie for curie, score in current.items()
+                       if curie in previous and abs(score - previous[curie]) > tolerance)
+        return changed
+
+    def incremental_fallback_reason(self, previous_result: Optional[Path],
+                                    set1_file: str, set2_file: str,
+                                    ic_file: str) -> Optional[str]:
+        """Return why the previous release cannot be updated incrementally, if it cannot."""
+        previous = self.config.previous_release
+        if previous_result is None:
+            return f"no previous result in {previous}"
+        for name in {set1_file, set2_file, ic_file}:
+            if not (previous / name).exists():
+                return f"{previous / name} not found"
+        log_path = previous_result.with_name(f"{previous_result.stem}_log.yaml")
+        if not log_path.exists():
+            return f"{log_path} not found"
+        threshold = None
+        for line in log_path.read_text().splitlines():
+            if line.startswith('min_ancestor_information_content:'):
+                threshold = line.split(':', 1)[1].strip()
+        if threshold is None or float(threshold) != float(self.config.resnik_threshold):
+            return (f"previous min_ancestor_information_content {threshold} "
+                    f"differs from {self.config.resnik_threshold}")
+        # Rows dropped from a top-k result cannot be spliced back in
+        log_lines = log_path.read_text().splitlines()
+        if any(line.startswith('top_k:') for line in log_lines):
+            return "previous result was reduced to the top k objects per subject"
+        symmetric = self.config.symmetric and set1_file == set2_file
+        if ('symmetric: true' in log_lines) != symmetric:
+            return "previous result differs in symmetric (upper triangle) storage"
+        return None
+
+    @staticmethod
+    def copy_unaffected_rows(previous_result: Path, header: List[str], out_file,
+                             affected1: set, affected2: set,
+                             set1_terms: Dict[str, str],
+                             set2_terms: Dict[str, str]) -> int:
+        """
+        Copy the previous labeled rows whose pair is unaffected, in header's columns.
+
+        The previous result is parsed with the csv module, which undoes the
+        DuckDB-style quoting of labels, and the copied fields are quoted
+        again with tsv_field, so labels holding tabs or quotes stay intact.
+        Rows of affected terms, or of terms no longer in the term lists, are
+        skipped.
+
+        Returns:
+            Number of rows copied
+        """
+        kept = 0
+        with previous_result.open(encoding='utf-8', newline='') as in_file:
+            reader = csv.reader(in_file, delimiter='\t')
+            index = {name: position for position, name in enumerate(next(reader))}
+            positions = [index.get(name) for name in header]
+            subject_pos = index['subject_id']
+            object_pos = index['object_id']
+            for fields in reader:
+                subject_id = fields[subject_pos]
+                object_id = fields[object_pos]
+                if (subject_id in affected1 or object_id in affected2
+                        or subject_id not in set1_terms or object_id not in set2_terms):
+                    continue
+                out_file.write('\t'.join(
+                    tsv_field(fields[position]) if position is not None else ''
+                    for position in positions) + '\n')
+                kept += 1
+        return kept
+
+    def run_incremental_similarity(self, set1_prefix: str, set2_prefix: str,
+                                   ic_file: str, output_file: str,
+                                   output_prefix: str) -> None:
+        """
+        Update the previous release's similarity result instead of recomputing it.
+
+        Only pairs whose subject or object is affected (see affected_terms) are
+        recomputed, as affected subjects against all objects plus unaffected
+        subjects against affected objects. The remaining rows are copied from
+        the previous labeled result; they are relabeled by the label stage, so
+        the output has the same rows as a full recompute (in a different order).
+        Falls back to a full recompute if the previous release is incomplete,
+        used a different Resnik threshold or top k, or differs in symmetric
+        storage.
+        """
+        set1_file = f"{set1_prefix}_terms.txt"
+        set2_file = f"{set2_prefix}_terms.txt"
+        previous_result = self.find_previous_result(output_prefix)
+        reason = self.incremental_fallback_reason(
+            previous_result, set1_file, set2_file, ic_file)
+        if reason:
+            logger.warning(f"Running full similarity analysis for {output_file}: {reason}")
+            self.run_similarity_analysis(set1_file, set2_file, ic_file, output_file)
+            return
+
+        working_dir = self.config.working_dir
+        ic_changed = self.changed_information_content(ic_file)
+        affected1 = self.affected_terms(set1_file, f"{set1_prefix}_ancestors.tsv", ic_changed)
+        affected2 = (affected1 if set2_prefix == set1_prefix else
+                     self.affected_terms(set2_file, f"{set2_prefix}_ancestors.tsv", ic_changed))
+        set1_terms = read_term_list(working_dir / set1_file)
+        set2_terms = read_term_list(working_dir / set2_file)
+        symmetric = self.config.symmetric and set1_file == set2_file
+        logger.info(
+            f"Incremental update of {previous_result.name}: {len(ic_changed)} IC changes, "
+            f"{len(affected1)} affected {set1_prefix} terms, "
+            f"{len(affected2)} affected {set2_prefix} terms")
+
+        # Affected subjects x all objects, then unaffected subjects x affected objects
+        runs = [
+            ([line for curie, line in set1_terms.items() if curie in affected1], None),
+            ([line for curie, line in set1_terms.items() if curie not in affected1],
+             [line for curie, line in set2_terms.items() if curie in affected2]),
+        ]
+        partial_outputs = []
+        temporary_files = []
+        for index, (subjects, objects) in enumerate(runs):
+            if not subjects or objects == []:
+                continue
+            subject_file = f"{output_file}.update{index}.set1.txt"
+            (working_dir / subject_file).write_text(''.join(subjects))
+            object_file = set2_file
+            if objects is not None:
+                object_file = f"{output_file}.update{index}.set2.txt"
+                (working_dir / object_file).write_text(''.join(objects))
+                temporary_files.append(object_file)
+            partial_output = f"{output_file}.update{index}.tsv"
+            temporary_files += [subject_file, partial_output]
+            self.run_similarity_analysis(subject_file, object_file, ic_file, partial_output)
+            partial_outputs.append(partial_output)
+
+        # Splice the recomputed rows into the unaffected previous rows
+        header = list(LABELED_COLUMNS)
+        if partial_outputs:
+            with (working_dir / partial_outputs[0]).open(encoding='utf-8') as handle:
+                header = handle.readline().rstrip('\r\n').split('\t')
+        tmp_path = working_dir / f"{output_file}.tmp"
+        with tmp_path.open('w', encoding='utf-8') as out_file:
+            out_file.write('\t'.join(header) + '\n')
+            kept = self.copy_unaffected_rows(previous_result, header, out_file,
+                                             affected1, affected2,
+                                             set1_terms, set2_terms)
+            for partial_output in partial_outputs:
+                if symmetric:
+                    # Recomputed pairs come in both orientations, while the
+                    # previous rows already hold each pair once
+                    filtered_output = f"{partial_output}.upper.tsv"
+                    self.merge_upper_triangle([partial_output], set1_file, filtered_output)
+                    temporary_files.append(filtered_output)
+                    partial_output = filtered_output
+                with (working_dir / partial_output).open(encoding='utf-8') as in_file:
+                    in_file.readline()
+                    shutil.copyfileobj(in_file, out_file, 1024 * 1024)
+        os.replace(tmp_path, working_dir / output_file)
+
+        for name in temporary_files:
+            (working_dir / name).unlink(missing_ok=True)
+        logger.info(f"Kept {kept} rows from {previous_result.name}")
+
+    def select_top_k(self, similarity_file: str, output_file: str) -> None:
+        """
+        Keep the k best objects of each subject by the configured metric.
+
+        The similarity file is streamed once, holding only a bounded min-heap
+        of k rows per subject. Ties keep the earlier row. Subjects are written
+        in order of first appearance, each with its rows by descending score.
+        """
+        k = self.config.top_k
+        metric = TOP_K_METRICS[self.config.top_k_metric]
+        logger.info(f"Selecting the top {k} objects per subject by {metric}...")
+
+        input_path = self.config.working_dir / similarity_file
+        tmp_path = self.config.working_dir / f"{output_file}.tmp"
+        heaps: Dict[str, list] = {}
+        rows_read = 0
+        with input_path.open(encoding='utf-8') as in_file:
+            header = in_file.readline()
+            index = {name: position for position, name
+                     in enumerate(header.rstrip('\r\n').split('\t'))}
+            subject_pos = index['subject_id']
+            metric_pos = index[metric]
+            for line in in_file:
+                fields = line.rstrip('\r\n').split('\t')
+                try:
+                    score = float(fields[metric_pos])
+                except (IndexError, ValueError):
+                    score = float('-inf')
+                rows_read += 1
+                heap = heaps.get(fields[subject_pos])
+                if heap is None:
+                    heap = heaps[sys.intern(fields[subject_pos])] = []
+                # -rows_read makes later rows lose ties against earlier ones
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, -rows_read, line))
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, (score, -rows_read, line))
+
+        written = 0
+        with tmp_path.open('w', encoding='utf-8') as out_file:
+            out_file.write(header)
+            for heap in heaps.values():
+                rows = sorted(heap, reverse=True)
+                out_file.writelines(line if line.endswith('\n') else line + '\n'
+                                    for _score, _order, line in rows)
+                written += len(rows)
+        os.replace(tmp_path, self.config.working_dir / output_file)
+        logger.info(f"Kept {written} of {rows_read} rows for {len(heaps)} subjects")
+
+    def add_labels(self, similarity_file: str, labels_file: str, output_file: str,
+                   gzip_copy: Optional[str] = None):
+        """
+        Add human-readable labels to similarity results with the configured labeler.
+
+        The in-process labelers also write a gzip copy of the result to
+        gzip_copy, if given (the DuckDB labeler does not).
+        """
+        if self.config.labeler == 'duckdb':
+            self.add_labels_with_duckdb(similarity_file, labels_file, output_file)
+        elif (self.memory_budget_bytes() is not None and
+              self.label_map_bytes(labels_file) > self.memory_budget_bytes() // 2):
+            self.add_labels_partitioned(similarity_file, labels_file, output_file, gzip_copy)
+        else:
+            self.add_labels_streaming(similarity_file, labels_file, output_file,
+                                      gzip_copy=gzip_copy)
+
+    def open_labeled_output(self, tmp_path: Path, gzip_copy: Optional[str] = None):
+        """Open a temporary labeled output, with a GzipCopyWriter if a gzip copy is requested."""
+        if gzip_copy is None:
+            return tmp_path.open('w', encoding='utf-8')
+        threads = self.config.compression_threads or os.cpu_count() or 1
+        return GzipCopyWriter(tmp_path, self.config.working_dir / f"{gzip_copy}.tmp", threads)
+
+    def replace_labeled_output(self, tmp_path: Path, output_file: str,
+                               gzip_copy: Optional[str] = None) -> None:
+        """Move a labeled output, then its gzip copy, into place."""
+        os.replace(tmp_path, self.config.working_dir / output_file)
+        if gzip_copy is not None:
+            os.replace(self.config.working_dir / f"{gzip_copy}.tmp",
+                       self.config.working_dir / gzip_copy)
+
+    def memory_budget_bytes(self) -> Optional[int]:
+        """The --max-memory budget in bytes, or None if memory is unbounded."""
+        if self.config.max_memory_gb is None:
+            return None
+        return int(self.config.max_memory_gb * 1024 ** 3)
+
+    def spill_directory(self, name: str) -> Path:
+        """Create (empty) and return a spill subdirectory for one stage."""
+        spill_dir = (self.config.spill_dir or self.config.working_dir / 'spill') / name
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        spill_dir.mkdir(parents=True)
+        return spill_dir
+
+    def label_map_bytes(self, labels_file: str) -> int:
+        """Estimate the memory of the label map load_term_labels builds from a file."""
+        path = self.config.working_dir / labels_file
+        return path.stat().st_size + count_lines(path) * LABEL_ENTRY_OVERHEAD
+
+    def add_labels_streaming(self, similarity_file: str, labels_file: str,
+                             output_file: str, chunk_rows: int = 100000,
+                             gzip_copy: Optional[str] = None):
+        """
+        Add human-readable labels to similarity results as a streaming hash join.
+
+        The label map is loaded once; the similarity file is then read and
+        written in chunks of rows, so memory does not grow with the result
+        size. Like the DuckDB inner joins, rows whose subject or object has no
+        label are dropped. Output columns follow LABELED_COLUMNS.
+        """
+        logger.info(f"Adding labels to {similarity_file}...")
+        labels = load_term_labels(self.config.working_dir / labels_file)
+
+        input_path = self.config.working_dir / similarity_file
+        tmp_path = self.config.working_dir / f"{output_file}.tmp"
+        written = 0
+        dropped = 0
+        with input_path.open(encoding='utf-8') as in_file, \
+                self.open_labeled_output(tmp_path, gzip_copy) as out_file:
+            header = in_file.readline().rstrip('\r\n').split('\t')
+            index = {name: position for position, name in enumerate(header)}
+            subject_pos = index['subject_id']
+            object_pos = index['object_id']
+            positions = [index.get(name) for name in LABELED_COLUMNS]
+
+            out_file.write('\t'.join(LABELED_COLUMNS) + '\n')
+            rows = []
+            for line in in_file:
+                fields = line.rstrip('\r\n').split('\t')
+                subject_label = labels.get(fields[subject_pos])
+                object_label = labels.get(fields[object_pos])
+                if subject_label is None or object_label is None:
+                    dropped += 1
+                    continue
+                rows.append(labeled_line(fields, positions, subject_label, object_label))
+                if len(rows) >= chunk_rows:
+                    out_file.writelines(rows)
+                    written += len(rows)
+                    rows = []
+            out_file.writelines(rows)
+            written += len(rows)
+
+        self.replace_labeled_output(tmp_path, output_file, gzip_copy)
+        logger.info(f"Labeled {written} rows ({dropped} rows without labels dropped)")
+
+    def add_labels_partitioned(self, similarity_file: str, labels_file: str,
+                               output_file: str, gzip_copy: Optional[str] = None) -> None:
+        """
+        Add labels with a partitioned hash join, for label maps above the memory budget.
+
+        The label map and the numbered similarity rows are partitioned by term
+        hash into spill files, so only one label partition is held in memory
+        at a time: rows are joined with subject labels per subject partition,
+        repartitioned by object and joined with object labels. Sorted runs of
+        the labeled rows are then merged back into input order, so the output
+        is the same as add_labels_streaming's.
+        """
+        budget = self.memory_budget_bytes()
+        partitions = max(2, -(-2 * self.label_map_bytes(labels_file) // budget))
+        spill_dir = self.spill_directory(output_file)
+        logger.info(f"Adding labels to {similarity_file} in {partitions} partitions "
+                    f"(spilling to {spill_dir})...")
+        spilled = 0
+
+        def partition_of(curie: str) -> int:
+            return zlib.crc32(curie.encode('utf-8')) % partitions
+
+        def open_spill_files(kind: str):
+            return [(spill_dir / f"{kind}{index}.tsv").open('w', encoding='utf-8')
+                    for index in range(partitions)]
+
+        def close_spill_files(handles) -> None:
+            nonlocal spilled
+            for handle in handles:
+                handle.close()
+                spilled += Path(handle.name).stat().st_size
+
+        # Partition the label map by term
+        handles = open_spill_files('labels')
+        with (self.config.working_dir / labels_file).open(encoding='utf-8') as in_file:
+            for line in in_file:
+                line = line.rstrip('\r\n')
+                curie = line.split('\t', 1)[0]
+                if curie:
+                    handles[partition_of(curie)].write(line + '\n')
+        close_spill_files(handles)
+
+        # Partition the numbered similarity rows by subject
+        handles = open_spill_files('subjects')
+        with (self.config.working_dir / similarity_file).open(encoding='utf-8') as in_file:
+            header = in_file.readline().rstrip('\r\n').split('\t')
+            index = {name: position for position, name in enumerate(header)}
+            subject_pos = index['subject_id']
+            object_pos = index['object_id']
+            positions = [index.get(name) for name in LABELED_COLUMNS]
+            for number, line in enumerate(in_file):
+                row = line.rstrip('\r\n')
+                handles[partition_of(row.split('\t')[subject_pos])].write(
+                    f"{number}\t{row}\n")
+        close_spill_files(handles)
+
+        # Join subject labels, repartitioning the labeled rows by object
+        dropped = 0
+        handles = open_spill_files('objects')
+        for partition in range(partitions):
+            labels = load_term_labels(spill_dir / f"labels{partition}.tsv")
+            path = spill_dir / f"subjects{partition}.tsv"
+            with path.open(encoding='utf-8') as in_file:
+                for line in in_file:
+                    number, row = line.rstrip('\n').split('\t', 1)
+                    fields = row.split('\t')
+                    label = labels.get(fields[subject_pos])
+                    if label is None:
+                        dropped += 1
+                        continue
+                    handles[partition_of(fields[object_pos])].write(
+                        f"{number}\t{label}\t{row}\n")
+            path.unlink()
+        close_spill_files(handles)
+
+        # Join object labels, writing runs sorted by input position
+        runs: List[Path] = []
+        run_rows: List[tuple] = []
+        run_bytes = 0
+
+        def write_run() -> None:
+            nonlocal spilled, run_bytes
+            run_rows.sort()
+            path = spill_dir / f"run{len(runs)}.tsv"
+            with path.open('w', encoding='utf-8') as run_file:
+                run_file.writelines(f"{number}\t{line}" for number, line in run_rows)
+            spilled += path.stat().st_size
+            runs.append(path)
+            run_rows.clear()
+            run_bytes = 0
+
+        for partition in range(partitions):
+            labels_path = spill_dir / f"labels{partition}.tsv"
+            labels = load_term_labels(labels_path)
+            labels_path.unlink()
+            path = spill_dir / f"objects{partition}.tsv"
+            with path.open(encoding='utf-8') as in_file:
+                for line in in_file:
+                    number, subject_label, row = line.rstrip('\n').split('\t', 2)
+                    fields = row.split('\t')
+                    object_label = labels.get(fields[object_pos])
+                    if object_label is None:
+                        dropped += 1
+                        continue
+                    labeled = labeled_line(fields, positions, subject_label, object_label)
+                    run_rows.append((int(number), labeled))
+                    run_bytes += len(labeled) + ROW_OVERHEAD
+                    if run_bytes > budget // 2:
+                        write_run()
+            path.unlink()
+        if run_rows:
+            write_run()
+
+        # Merge the runs back into input order
+        def read_run(path: Path):
+            with path.open(encoding='utf-8') as run_file:
+                for line in run_file:
+                    number, labeled = line.split('\t', 1)
+                    yield int(number), labeled
+
+        tmp_path = self.config.working_dir / f"{output_file}.tmp"
+        written = 0
+        with self.open_labeled_output(tmp_path, gzip_copy) as out_file:
+            out_file.write('\t'.join(LABELED_COLUMNS) + '\n')
+            for _number, labeled in heapq.merge(*(read_run(path) for path in runs)):
+                out_file.write(labeled)
+                written += 1
+        self.replace_labeled_output(tmp_path, output_file, gzip_copy)
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+        MetricsRecorder.add('spilled_bytes', spilled)
+        logger.info(f"Labeled {written} rows ({dropped} rows without labels dropped, "
+                    f"{format_bytes(spilled)} spilled)")
+
     def add_labels_with_duckdb(self, similarity_file: str, labels_file: str, output_file: str):
-        """Add human-readable labels to similarity results using DuckDB."""
+        """
+        Add human-readable labels to similarity results using DuckDB.
+
+        With --max-memory, DuckDB is limited to the budget and spills tables
+        and joins above it to the spill directory.
+        """
         logger.info(f"Adding labels to {similarity_file}...")
 
-        duckdb_sql = f"""
+        settings = ""
+        spill_dir = None
+        if self.config.max_memory_gb is not None:
+            spill_dir = self.spill_directory(output_file)
+            settings = (f"SET memory_limit='{int(self.config.max_memory_gb * 1024)}MiB'; "
+                        f"SET temp_directory='{spill_dir}';")
+
+        duckdb_sql = f"""{settings}
         CREATE TABLE semsim AS SELECT * FROM read_csv('{similarity_file}', header=TRUE);
         CREATE TABLE labels AS SELECT * FROM read_csv('{labels_file}', header=FALSE);
         CREATE TABLE labeled1 AS SELECT * FROM semsim n JOIN labels r ON (subject_id = column0);
@@ -541,48 +4131,250 @@ class PipelineRunner:
         ALTER TABLE labeled2 RENAME column1_1 TO object_label;
         ALTER TABLE labeled2 DROP column0;
         ALTER TABLE labeled2 DROP column0_1;
-        COPY (SELECT subject_id, subject_label, subject_source, object_id, object_label, object_source, 
-              ancestor_id, ancestor_label, ancestor_source, object_information_content, 
-              subject_information_content, ancestor_information_content, jaccard_similarity, 
-              cosine_similarity, dice_similarity, phenodigm_score FROM labeled2) 
+        COPY (SELECT {', '.join(LABELED_COLUMNS)} FROM labeled2)
         TO '{output_file}.tmp' WITH (HEADER true, DELIMITER '\\t');
         """
 
-        self.run_command(f'{self.config.duckdb_path} -c "{duckdb_sql}"')
-        self.run_command(f'mv "{output_file}.tmp" "{output_file}"')
+        duckdb_command = [str(self.config.duckdb_path), '-c', duckdb_sql]
+        if spill_dir is None:
+            self.run_command(duckdb_command)
+        else:
+            with peak_directory_size(spill_dir) as peak:
+                self.run_command(duckdb_command)
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            MetricsRecorder.add('spilled_bytes', peak['bytes'])
+            logger.info(f"DuckDB spilled up to {format_bytes(peak['bytes'])}")
+        os.replace(self.config.working_dir / f"{output_file}.tmp",
+                   self.config.working_dir / output_file)
+
+    def sort_by_subject(self, tsv_file: str, sorted_path: Path) -> None:
+        """
+        Write a labeled similarity TSV to sorted_path, stably sorted by subject_id.
+
+        The rows are read in runs of half the --max-memory budget (or
+        PARQUET_SORT_RUN_BYTES), each run is sorted and spilled, and the runs
+        are merged, so memory is bounded regardless of result size. Rows with
+        the same subject keep their order in the TSV.
+        """
+        budget = self.memory_budget_bytes()
+        run_limit = budget // 2 if budget is not None else PARQUET_SORT_RUN_BYTES
+        spill_dir = sorted_path.parent
+        runs: List[Path] = []
+        run_lines: List[str] = []
+        run_bytes = 0
+
+        def subject_of(line: str) -> str:
+            return line.split('\t', 1)[0]
+
+        def write_run() -> None:
+            nonlocal run_bytes
+            run_lines.sort(key=subject_of)
+            path = spill_dir / f"run{len(runs)}.tsv"
+            with path.open('w', encoding='utf-8') as run_file:
+                run_file.writelines(run_lines)
+            runs.append(path)
+            run_lines.clear()
+            run_bytes = 0
+
+        with (self.config.working_dir / tsv_file).open(encoding='utf-8') as in_file:
+            header = in_file.readline()
+            for line in in_file:
+                if not line.endswith('\n'):
+                    line += '\n'
+                run_lines.append(line)
+                run_bytes += len(line) + ROW_OVERHEAD
+                if run_bytes > run_limit:
+                    write_run()
+        if run_lines:
+            write_run()
+
+        # heapq.merge breaks ties by run, and runs are in TSV order
+        handles = [path.open(encoding='utf-8') for path in runs]
+        try:
+            with sorted_path.open('w', encoding='utf-8') as out_file:
+                out_file.write(header)
+                out_file.writelines(heapq.merge(*handles, key=subject_of))
+        finally:
+            for handle in handles:
+                handle.close()
+        for path in runs:
+            path.unlink()
+        MetricsRecorder.add('spilled_bytes', sorted_path.stat().st_size)
+
+    def write_parquet(self, tsv_file: str, parquet_file: str) -> None:
+        """
+        Write a labeled similarity TSV as Parquet, sorted by subject_id.
+
+        The TSV is first sorted by subject_id with an external merge sort
+        (sort_by_subject), so row groups cover contiguous subject ranges and
+        readers can skip them by their min/max statistics. Term IDs, labels
+        and sources are dictionary-encoded and scores are stored as float32
+        ('None' and empty fields become nulls, as in the binary format). The
+        sorted TSV is read in blocks that are written out as they are
+        converted, so memory stays bounded regardless of result size.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError(
+                "Parquet output requires pyarrow (pip install pyarrow)") from e
+
+        logger.info(f"Writing Parquet: {parquet_file}...")
+        spill_dir = self.spill_directory(parquet_file)
+        sorted_path = spill_dir / 'sorted.tsv'
+        self.sort_by_subject(tsv_file, sorted_path)
+
+        column_types = {
+            name: (pa.float32() if name in SCORE_COLUMNS
+                   else pa.dictionary(pa.int32(), pa.string()))
+            for name in LABELED_COLUMNS
+        }
+        reader = pacsv.open_csv(
+            sorted_path,
+            read_options=pacsv.ReadOptions(block_size=64 * 1024 * 1024),
+            parse_options=pacsv.ParseOptions(delimiter='\t'),
+            convert_options=pacsv.ConvertOptions(
+                column_types=column_types, include_columns=LABELED_COLUMNS,
+                null_values=['None', ''], strings_can_be_null=True)
+        )
+
+        tmp_path = self.config.working_dir / f"{parquet_file}.tmp"
+        rows = 0
+        try:
+            with pq.ParquetWriter(tmp_path, reader.schema, compression='zstd') as writer:
+                for batch in reader:
+                    writer.write_batch(batch, row_group_size=PARQUET_ROW_GROUP_ROWS)
+                    rows += batch.num_rows
+        finally:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        os.replace(tmp_path, self.config.working_dir / parquet_file)
+        logger.info(f"Wrote {rows} rows to {parquet_file}, sorted by subject_id")
+
+    def write_binary(self, tsv_file: str, labels_file: str, binary_file: str,
+                     metadata: Dict) -> None:
+        """Write a labeled similarity TSV in the binary format (see write_binary_result)."""
+        logger.info(f"Writing binary result: {binary_file}...")
+        rows = write_binary_result(
+            self.config.working_dir / tsv_file, self.config.working_dir / labels_file,
+            self.config.working_dir / binary_file, metadata)
+        logger.info(f"Wrote {rows} rows to {binary_file} "
+                    f"({format_bytes((self.config.working_dir / binary_file).stat().st_size)})")
+
+    def create_log_file(self, name: str, versions: Dict[str, Optional[str]], output_file: str,
+                        metrics: Optional[Dict[str, Dict]] = None, symmetric: bool = False):
+        """
+        Create YAML log file with metadata and, optionally, stage metrics.
 
-    def create_log_file(self, name: str, versions: Dict[str, Optional[str]], output_file: str):
-        """Create YAML log file with metadata."""
+        symmetric marks results that hold each unordered pair once (see
+        expand_symmetric.py).
+        """
         logger.info(f"Creating log file: {output_file}...")
 
         log_content = [
             f"name: {name}",
             f"min_ancestor_information_content: {self.config.resnik_threshold}",
-            "versions:"
         ]
+        if symmetric:
+            log_content.append("symmetric: true")
+        if self.config.top_k:
+            log_content.append(f"top_k: {self.config.top_k}")
+            log_content.append(
+                f"top_k_metric: {TOP_K_METRICS[self.config.top_k_metric]}")
+        log_content.append("versions:")
 
         for key, value in versions.items():
             if value:
                 log_content.append(f"  {key}: {value}")
 
+        if metrics:
+            log_content.append("metrics:")
+            for stage_name, record in metrics.items():
+                log_content.append(f'  "{stage_name}":')
+                for key, value in record.items():
+                    if isinstance(value, dict) and not value:
+                        log_content.append(f"    {key}: {{}}")
+                    elif isinstance(value, dict):
+                        log_content.append(f"    {key}:")
+                        for item, item_value in value.items():
+                            log_content.append(f'      "{item}": {item_value}')
+                    else:
+                        log_content.append(f"    {key}: {value}")
+
         log_path = self.config.working_dir / output_file
         log_path.write_text('\n'.join(log_content) + '\n')
 
     def create_tarball(self, output_name: str, files: List[str]):
-        """Create a compressed tarball of results."""
+        """
+        Create a compressed tarball of results.
+
+        Compression runs on config.compression_threads threads, either as
+        multi-member gzip (compatible with tar xzf) or, with the 'zstd'
+        compression setting, as zstd (requires the zstandard package).
+        """
         logger.info(f"Creating tarball: {output_name}...")
 
         tarball_path = self.config.working_dir / output_name
-        with tarfile.open(tarball_path, 'w:gz') as tar:
-            for file in files:
-                file_path = self.config.working_dir / file
-                if file_path.exists():
-                    tar.add(file_path, arcname=file)
-                    logger.info(f"  Added {file}")
-                else:
-                    logger.warning(f"  File not found: {file}")
-
-        logger.info(f"Tarball created: {output_name}")
+        tmp_path = self.config.working_dir / f"{output_name}.tmp"
+        threads = self.config.compression_threads or os.cpu_count() or 1
+        start = time.time()
+
+        with tmp_path.open('wb') as raw_file:
+            if self.config.compression == 'zstd':
+                try:
+                    import zstandard
+                except ImportError as e:
+                    raise RuntimeError(
+                        "zstd compression requires zstandard (pip install zstandard)") from e
+                compressor = zstandard.ZstdCompressor(level=3, threads=threads)
+                writer = compressor.stream_writer(raw_file, closefd=False)
+            else:
+                writer = ParallelGzipWriter(raw_file, threads)
+
+            total = sum((self.config.working_dir / file).stat().st_size for file in files
+                        if (self.config.working_dir / file).exists())
+            with tarfile.open(fileobj=writer, mode='w') as tar, ProgressTimer(
+                    f"Compressing {output_name}", total=total, unit='bytes',
+                    # The gzip writer counts bytes as they are written; tar
+                    # itself only advances once a whole file has been added
+                    progress=(writer.tell if isinstance(writer, ParallelGzipWriter)
+                              else lambda: tar.offset)):
+                for file in files:
+                    file_path = self.config.working_dir / file
+                    gzip_copy = file_path.with_name(file_path.name + '.gz')
+                    if (file_path.exists() and isinstance(writer, ParallelGzipWriter) and
+                            gzip_copy.exists() and
+                            gzip_copy.stat().st_mtime_ns >= file_path.stat().st_mtime_ns):
+                        # Take the copy compressed while the file was written
+                        # (see GzipCopyWriter) instead of compressing it again
+                        tarinfo = tar.gettarinfo(file_path, arcname=file)
+                        tar.addfile(tarinfo)
+                        writer.append_gzip(gzip_copy, tarinfo.size)
+                        blocks, remainder = divmod(tarinfo.size, tarfile.BLOCKSIZE)
+                        if remainder:
+                            writer.write(b'\0' * (tarfile.BLOCKSIZE - remainder))
+                            blocks += 1
+                        tar.offset += blocks * tarfile.BLOCKSIZE
+                        logger.info(f"  Added {file} ({format_bytes(tarinfo.size)}, "
+                                    f"precompressed)")
+                    elif file_path.exists():
+                        file_start = time.time()
+                        tar.add(file_path, arcname=file)
+                        elapsed = max(time.time() - file_start, 1e-6)
+                        size = file_path.stat().st_size
+                        logger.info(
+                            f"  Added {file} ({format_bytes(size)}, "
+                            f"{format_bytes(size / elapsed)}/s)")
+                    else:
+                        logger.warning(f"  File not found: {file}")
+            writer.close()
+
+        os.replace(tmp_path, tarball_path)
+        elapsed = max(time.time() - start, 1e-6)
+        logger.info(
+            f"Tarball created: {output_name} ({format_bytes(tarball_path.stat().st_size)}, "
+            f"{elapsed:.1f}s, {threads} threads)")
 
     def upload_results_to_zenodo(self, record_id: str, token: str,
                                  version_name: str, files: List[Path],
@@ -593,13 +4385,99 @@ class PipelineRunner:
             logger.warning("No result files found to upload to Zenodo.")
             return
 
-        logger.info("Creating new Zenodo version draft...")
-        client = ZenodoClient(token=token, base_url=base_url)
-        draft = client.create_new_version_draft(record_id)
+        client = ZenodoClient(token=token, base_url=base_url,
+                              max_workers=self.config.zenodo_workers)
+        try:
+            with self.metrics.stage("zenodo:publish") as record:
+                record["input_bytes"] = sum(
+                    path.stat().st_size for path in existing_files)
+                self._publish_zenodo_version(client, record_id, version_name,
+                                             existing_files)
+        finally:
+            client.close()
+            self.write_metrics()
+
+    def _load_upload_state(self, record_id: str,
+                           version_name: str) -> Optional[Dict]:
+        """Load the upload state of an unfinished release of the same version."""
+        state_path = self.config.working_dir / ZENODO_UPLOAD_STATE
+        if not state_path.exists():
+            return None
+        try:
+            state = json.loads(state_path.read_text())
+        except (OSError, ValueError):
+            logger.warning(f"Ignoring unreadable {ZENODO_UPLOAD_STATE}")
+            return None
+        if (str(state.get("record_id")) != str(record_id)
+                or state.get("version") != version_name):
+            logger.info(
+                f"Ignoring {ZENODO_UPLOAD_STATE} from a different release")
+            return None
+        return state
+
+    def _save_upload_state(self, state: Dict) -> None:
+        """Atomically write the Zenodo upload state file."""
+        state_path = self.config.working_dir / ZENODO_UPLOAD_STATE
+        tmp_path = state_path.with_name(state_path.name + '.tmp')
+        tmp_path.write_text(json.dumps(state, indent=2, sort_keys=True))
+        os.replace(tmp_path, state_path)
+
+    def _resume_zenodo_draft(self, client: ZenodoClient,
+                             state: Dict) -> Optional[Dict]:
+        """Return the unpublished draft recorded in the upload state, if any."""
+        try:
+            draft = client.get_deposition(state["draft_id"])
+        except (KeyError, RuntimeError) as exc:
+            logger.info(f"Recorded Zenodo draft is not available ({exc})")
+            return None
+        if not draft or draft.get("submitted"):
+            logger.info("Recorded Zenodo draft was already published")
+            return None
+        return draft
+
+    def _publish_zenodo_version(self, client: ZenodoClient, record_id: str,
+                                version_name: str, files: List[Path]) -> None:
+        """
+        Create, fill and publish a Zenodo version draft.
+
+        Progress is recorded in zenodo_upload_state.json in the working
+        directory. If a previous attempt for the same record and version
+        failed before publishing, its draft is reused and only files that
+        are missing from it or whose checksum differs are uploaded again.
+        """
+        state = self._load_upload_state(record_id, version_name)
+        draft = self._resume_zenodo_draft(client, state) if state else None
+        if draft:
+            logger.info(f"Resuming Zenodo draft {draft['id']}...")
+        else:
+            logger.info("Creating new Zenodo version draft...")
+            draft = client.create_new_version_draft(record_id)
         draft_id = draft["id"]
 
-        logger.info("Clearing files inherited from previous Zenodo version...")
-        client.delete_draft_files(draft_id, draft.get("files", []))
+        bucket_url = draft.get("links", {}).get("bucket")
+        if not bucket_url:
+            raise RuntimeError(
+                "Zenodo draft does not include a bucket URL for uploads.")
+
+        state = {"record_id": str(record_id), "version": version_name,
+                 "draft_id": draft_id, "bucket_url": bucket_url, "files": {}}
+        self._save_upload_state(state)
+
+        # Keep remote files that already match a local file, drop the rest
+        # (files inherited from the previous version or corrupt uploads)
+        local_md5 = {path.name: file_digest(path, 'md5') for path in files}
+        stale = []
+        for file_info in draft.get("files", []):
+            name = file_info.get("filename") or file_info.get("key")
+            if name in local_md5 and zenodo_md5(file_info.get("checksum")) == local_md5[name]:
+                state["files"][name] = {"md5": local_md5[name],
+                                        "status": "uploaded"}
+            else:
+                stale.append(file_info)
+        if stale:
+            logger.info(f"Removing {len(stale)} stale files from Zenodo draft...")
+            client.delete_draft_files(draft_id, stale)
+        self._save_upload_state(state)
 
         metadata = draft.get("metadata", {})
         if version_name:
@@ -608,27 +4486,69 @@ class PipelineRunner:
         logger.info(f"Updating Zenodo metadata version to {version_name}...")
         client.update_metadata(draft_id, metadata)
 
-        bucket_url = draft.get("links", {}).get("bucket")
-        if not bucket_url:
-            raise RuntimeError(
-                "Zenodo draft does not include a bucket URL for uploads.")
+        pending = [path for path in files if path.name not in state["files"]]
+        skipped = len(files) - len(pending)
+        if skipped:
+            logger.info(
+                f"Skipping {skipped} files already uploaded to the draft")
 
-        for file_path in existing_files:
-            logger.info(f"Uploading {file_path.name} to Zenodo...")
-            client.upload_file(bucket_url, file_path)
+        state_lock = threading.Lock()
+
+        def record_upload(path: Path, md5: str) -> None:
+            with state_lock:
+                state["files"][path.name] = {"md5": md5, "status": "uploaded"}
+                self._save_upload_state(state)
+
+        if pending:
+            client.upload_files(bucket_url, pending, on_uploaded=record_upload)
 
         logger.info("Publishing Zenodo draft...")
         client.publish(draft_id)
+        (self.config.working_dir / ZENODO_UPLOAD_STATE).unlink()
         logger.info(f"Zenodo release published (version {version_name}).")
 
-    def run_similarity_comparison(self, ont1: str, ont2: str,
-                                  ont1_root: str, ont2_root: str,
-                                  ont1_prefix: str, ont2_prefix: str,
-                                  association_file: str, association_type: str):
+    def write_metrics(self) -> None:
+        """Write the stage metrics recorded so far to the working directory."""
+        self.metrics.write(self.config.working_dir)
+
+    def create_stage_graph(self) -> StageGraph:
+        """Create an empty stage graph, backed by the stage cache if configured."""
+        cache = None
+        if self.config.cache_dir:
+            cache = StageCache(self.config.cache_dir,
+                               int(self.config.cache_max_gb * 1024 ** 3))
+        return StageGraph(self.config.working_dir, cache=cache,
+                          metrics=self.metrics)
+
+    def similarity_parallelism(self) -> int:
+        """Number of similarity processes a similarity stage runs at once."""
+        shards = max(1, self.config.similarity_shards)
+        return min(shards, self.config.similarity_workers or shards)
+
+    def stage_cache_params(self, ontologies: List[str], **params) -> Optional[Dict]:
         """
-        Run semantic similarity comparison between two ontologies.
+        Build cache parameters for a stage that depends on ontology versions.
+
+        Returns None (disabling caching for the stage) when any of the
+        ontology versions is unknown, since the output cannot then be keyed.
+        """
+        versions = {}
+        for ontology in ontologies:
+            version = getattr(self.config, f"{ontology}_version")
+            if not version:
+                return None
+            versions[ontology] = version
+        return dict(params, versions=versions)
+
+    def add_comparison_stages(self, graph: StageGraph, ont1: str, ont2: str,
+                              ont1_root: str, ont2_root: str,
+                              ont1_prefix: str, ont2_prefix: str,
+                              association_file: str, association_type: str) -> None:
+        """
+        Add the stages of a similarity comparison between two ontologies to a graph.
 
         Args:
+            graph: Stage graph to add the comparison stages to
             ont1: First ontology code (e.g., 'hp')
             ont2: Second ontology code (e.g., 'mp', 'zp', or 'hp' for self-comparison)
             ont1_root: Root term for first ontology (e.g., 'HP:0000118')
@@ -642,43 +4562,144 @@ class PipelineRunner:
         comparison_key = f"{ont1}_vs_{ont2}"
         output_name = getattr(self.config, f"{comparison_key}_name")
         output_prefix = getattr(self.config, f"{comparison_key}_prefix")
+        symmetric = self.config.symmetric and ont1 == ont2
+
+        # Term extraction is shared between comparisons (e.g., HPO_terms.txt)
+        graph.add(Stage(
+            f"terms:{ont1_prefix}",
+            lambda: self.get_ontology_terms(ont1, ont1_root, ont1_prefix),
+            outputs=[f"{ont1_prefix}_terms.txt", f"{ont1_prefix}_terms.tsv"],
+            memory_gb=1.0,
+            reuse_existing=True,
+            cache_params=self.stage_cache_params(
+                [ont1], command='descendants', root=ont1_root)
+        ))
 
-        logger.info("=" * 80)
-        logger.info(
-            f"STAGE: {ont1.upper()} vs {ont2.upper()} Similarity Analysis")
-        logger.info("=" * 80)
-
-        # Get terms for first ontology (skip if already done)
-        if not (self.config.working_dir / f"{ont1_prefix}_terms.txt").exists():
-            self.get_ontology_terms(ont1, ont1_root, ont1_prefix)
-
-        # Get terms for second ontology (if different from first)
         if ont1 != ont2:
-            self.get_ontology_terms(ont2, ont2_root, ont2_prefix)
+            graph.add(Stage(
+                f"terms:{ont2_prefix}",
+                lambda: self.get_ontology_terms(ont2, ont2_root, ont2_prefix),
+                outputs=[f"{ont2_prefix}_terms.txt", f"{ont2_prefix}_terms.tsv"],
+                memory_gb=1.0,
+                cache_params=self.stage_cache_params(
+                    [ont2], command='descendants', root=ont2_root)
+            ))
             # Combine term files for labeling
-            self.run_command(
-                f'cat {ont1_prefix}_terms.tsv {ont2_prefix}_terms.tsv > {ont1_prefix}_{ont2_prefix}_terms.tsv')
             labels_file = f'{ont1_prefix}_{ont2_prefix}_terms.tsv'
+            graph.add(Stage(
+                f"labels:{ont1_prefix}_{ont2_prefix}",
+                lambda: self.concatenate_files(
+                    [f"{ont1_prefix}_terms.tsv", f"{ont2_prefix}_terms.tsv"], labels_file),
+                inputs=[f"{ont1_prefix}_terms.tsv", f"{ont2_prefix}_terms.tsv"],
+                outputs=[labels_file]
+            ))
         else:
             labels_file = f'{ont1_prefix}_terms.tsv'
 
         # Calculate information content
         ic_output = f"{ont2.lower()}a_ic.tsv"
-        self.calculate_information_content(
-            association_file, association_type, ic_output)
-
-        # Run similarity analysis
+        graph.add(Stage(
+            f"ic:{ic_output}",
+            lambda: self.calculate_information_content(
+                association_file, association_type, ic_output),
+            inputs=[association_file],
+            outputs=[ic_output],
+            memory_gb=4.0,
+            cache_params=self.stage_cache_params(
+                ['phenio'], command='information-content',
+                association_type=association_type,
+                ontology=self.config.get_phenio_identifier())
+        ))
+
+        # Run similarity analysis, or update the previous release's result
+        unlabeled_output = f"{output_name}_unlabeled.tsv"
         similarity_output = f"{output_name}.tsv"
-        self.run_similarity_analysis(
-            f'{ont1_prefix}_terms.txt',
-            f'{ont2_prefix}_terms.txt',
-            ic_output,
-            similarity_output
-        )
+        similarity_inputs = [f'{ont1_prefix}_terms.txt', f'{ont2_prefix}_terms.txt', ic_output]
+        if self.config.previous_release:
+            for prefix in dict.fromkeys([ont1_prefix, ont2_prefix]):
+                graph.add(Stage(
+                    f"ancestors:{prefix}",
+                    lambda prefix=prefix: self.write_ancestors(
+                        f"{prefix}_terms.txt", f"{prefix}_ancestors.tsv"),
+                    inputs=[f"{prefix}_terms.txt"],
+                    outputs=[f"{prefix}_ancestors.tsv"],
+                    memory_gb=1.0,
+                    cache_params=self.stage_cache_params(
+                        ['phenio'], command='ancestors',
+                        ontology=self.config.get_phenio_identifier())
+                ))
+                similarity_inputs.append(f"{prefix}_ancestors.tsv")
+
+            def similarity_action():
+                self.run_incremental_similarity(
+                    ont1_prefix, ont2_prefix, ic_output, unlabeled_output,
+                    output_prefix)
+        else:
+            def similarity_action():
+                self.run_similarity_analysis(
+                    f'{ont1_prefix}_terms.txt', f'{ont2_prefix}_terms.txt',
+                    ic_output, unlabeled_output)
+
+        if self.config.stream:
+            # One stage runs the similarity analysis and labels its rows from
+            # a FIFO; the gzip copy is spliced into the tarball as is
+            gzip_copy = f"{similarity_output}.gz" if self.config.compression == 'gzip' else None
+            graph.add(Stage(
+                f"similarity:{comparison_key}",
+                lambda: self.run_streaming_similarity(
+                    f'{ont1_prefix}_terms.txt', f'{ont2_prefix}_terms.txt',
+                    ic_output, labels_file, similarity_output, gzip_copy),
+                inputs=similarity_inputs + [labels_file],
+                outputs=[similarity_output] + ([gzip_copy] if gzip_copy else []),
+                memory_gb=8.0 + (self.config.max_memory_gb or 8.0),
+                cache_params=self.stage_cache_params(
+                    ['phenio'], command='similarity-labeled',
+                    resnik_threshold=self.config.resnik_threshold,
+                    ontology=self.config.get_semsimian_phenio_identifier(),
+                    labeler=self.config.labeler)
+            ))
+        else:
+            graph.add(Stage(
+                f"similarity:{comparison_key}",
+                similarity_action,
+                inputs=similarity_inputs,
+                outputs=[unlabeled_output],
+                temporary=[unlabeled_output],
+                memory_gb=8.0 * self.similarity_parallelism(),
+                cache_params=self.stage_cache_params(
+                    ['phenio'], command='similarity',
+                    resnik_threshold=self.config.resnik_threshold,
+                    ontology=self.config.get_semsimian_phenio_identifier(),
+                    shards=self.config.similarity_shards,
+                    symmetric=symmetric)
+            ))
+
+        # Optionally keep only the best objects of each subject
+        label_input = unlabeled_output
+        if self.config.top_k:
+            label_input = f"{output_name}_top{self.config.top_k}_unlabeled.tsv"
+
+            graph.add(Stage(
+                f"topk:{comparison_key}",
+                lambda: self.select_top_k(unlabeled_output, label_input),
+                inputs=[unlabeled_output],
+                outputs=[label_input],
+                temporary=[label_input],
+                memory_gb=2.0,
+                cache_params={'command': 'top-k', 'k': self.config.top_k,
+                              'metric': self.config.top_k_metric}
+            ))
 
         # Add labels
-        self.add_labels_with_duckdb(
-            similarity_output, labels_file, similarity_output)
+        if not self.config.stream:
+            graph.add(Stage(
+                f"label:{comparison_key}",
+                lambda: self.add_labels(label_input, labels_file, similarity_output),
+                inputs=[label_input, labels_file],
+                outputs=[similarity_output],
+                memory_gb=self.config.max_memory_gb or 8.0,
+                cache_params={'command': 'add-labels', 'labeler': self.config.labeler}
+            ))
 
         # Create log file with appropriate versions
         versions = {'hp': self.config.hp_version,
@@ -686,45 +4707,147 @@ class PipelineRunner:
         if ont2 != 'hp':
             versions[ont2] = getattr(self.config, f"{ont2}_version")
 
-        self.create_log_file(output_name, versions, f"{output_name}_log.yaml")
-
-        # Create tarball
-        tarball_name = f"{output_prefix}.tar.gz"
+        log_file = f"{output_name}_log.yaml"
         files = [
-            f"{output_name}.tsv",
-            f"{output_name}_log.yaml",
+            similarity_output,
+            log_file,
             ic_output
         ]
-        self.create_tarball(tarball_name, files)
+
+        # Optionally write a Parquet copy of the labeled result
+        if self.config.parquet:
+            parquet_output = f"{output_name}.parquet"
+            graph.add(Stage(
+                f"parquet:{comparison_key}",
+                lambda: self.write_parquet(similarity_output, parquet_output),
+                inputs=[similarity_output],
+                outputs=[parquet_output],
+                memory_gb=8.0,
+                cache_params={'command': 'parquet', 'order': 'subject_id'}
+            ))
+            files.append(parquet_output)
+
+        # Optionally write the labeled result in the binary format
+        if self.config.binary:
+            binary_output = f"{output_name}.simbin"
+            binary_metadata = {
+                'name': output_name,
+                'min_ancestor_information_content': self.config.resnik_threshold,
+                'symmetric': symmetric,
+                'top_k': self.config.top_k,
+                'top_k_metric': (TOP_K_METRICS[self.config.top_k_metric]
+                                 if self.config.top_k else None),
+                'versions': versions,
+            }
+            graph.add(Stage(
+                f"binary:{comparison_key}",
+                lambda: self.write_binary(
+                    similarity_output, labels_file, binary_output, binary_metadata),
+                inputs=[similarity_output, labels_file],
+                outputs=[binary_output],
+                memory_gb=1.0,
+                cache_params={'command': 'binary', 'metadata': binary_metadata}
+            ))
+            files.append(binary_output)
+
+        # The log records the metrics of the stages that produced the results
+        comparison_stages = [
+            f"terms:{ont1_prefix}", f"terms:{ont2_prefix}",
+            f"labels:{ont1_prefix}_{ont2_prefix}", f"ic:{ic_output}",
+            f"similarity:{comparison_key}", f"topk:{comparison_key}",
+            f"label:{comparison_key}", f"parquet:{comparison_key}",
+            f"binary:{comparison_key}"
+        ]
+        graph.add(Stage(
+            f"log:{comparison_key}",
+            lambda: self.create_log_file(
+                output_name, versions, log_file,
+                metrics=self.metrics.snapshot(comparison_stages),
+                symmetric=symmetric),
+            inputs=[name for name in files if name != log_file],
+            outputs=[log_file]
+        ))
+
+        # Create tarball
+        tarball_name = self.config.tarball_name(output_prefix)
+        graph.add(Stage(
+            f"tarball:{comparison_key}",
+            lambda: self.create_tarball(tarball_name, files),
+            inputs=files,
+            outputs=[tarball_name],
+            memory_gb=0.5
+        ))
+
+    def run_comparisons(self, comparison_keys: List[str]) -> None:
+        """
+        Run several comparisons as one stage graph.
+
+        Independent stages (e.g., the IC and similarity stages of different
+        comparisons) run in parallel up to ``config.jobs`` and the memory budget,
+        while shared stages such as HPO term extraction run only once.
+
+        Args:
+            comparison_keys: Keys into COMPARISONS (e.g., ['hp_vs_hp', 'hp_vs_mp'])
+        """
+        names = ', '.join(key.replace('_vs_', ' vs ').upper()
+                          for key in comparison_keys)
+        logger.info("=" * 80)
+        logger.info(f"STAGE: {names} Similarity Analysis")
+        logger.info("=" * 80)
+
+        graph = self.create_stage_graph()
+        for key in comparison_keys:
+            self.add_comparison_stages(graph, **COMPARISONS[key])
+
+        try:
+            graph.run(jobs=self.config.jobs,
+                      memory_budget_gb=self.config.memory_budget_gb)
+        finally:
+            self.write_metrics()
+
+        logger.info(f"{names} analysis complete!")
+
+    def run_similarity_comparison(self, ont1: str, ont2: str,
+                                  ont1_root: str, ont2_root: str,
+                                  ont1_prefix: str, ont2_prefix: str,
+                                  association_file: str, association_type: str):
+        """
+        Run semantic similarity comparison between two ontologies.
+
+        See add_comparison_stages for a description of the arguments.
+        """
+        graph = self.create_stage_graph()
+        self.add_comparison_stages(
+            graph, ont1=ont1, ont2=ont2,
+            ont1_root=ont1_root, ont2_root=ont2_root,
+            ont1_prefix=ont1_prefix, ont2_prefix=ont2_prefix,
+            association_file=association_file, association_type=association_type
+        )
+
+        logger.info("=" * 80)
+        logger.info(
+            f"STAGE: {ont1.upper()} vs {ont2.upper()} Similarity Analysis")
+        logger.info("=" * 80)
+
+        try:
+            graph.run(jobs=self.config.jobs,
+                      memory_budget_gb=self.config.memory_budget_gb)
+        finally:
+            self.write_metrics()
 
         logger.info(f"{ont1.upper()} vs {ont2.upper()} analysis complete!")
 
     def run_hp_vs_hp(self):
         """Run HP vs HP similarity comparison."""
-        self.run_similarity_comparison(
-            ont1='hp', ont2='hp',
-            ont1_root='HP:0000118', ont2_root='HP:0000118',
-            ont1_prefix='HPO', ont2_prefix='HPO',
-            association_file='hpoa.tsv', association_type='hpoa'
-        )
+        self.run_similarity_comparison(**COMPARISONS['hp_vs_hp'])
 
     def run_hp_vs_mp(self):
         """Run HP vs MP similarity comparison."""
-        self.run_similarity_comparison(
-            ont1='hp', ont2='mp',
-            ont1_root='HP:0000118', ont2_root='MP:0000001',
-            ont1_prefix='HPO', ont2_prefix='MP',
-            association_file='mpa.tsv', association_type='g2t'
-        )
+        self.run_similarity_comparison(**COMPARISONS['hp_vs_mp'])
 
     def run_hp_vs_zp(self):
         """Run HP vs ZP similarity comparison."""
-        self.run_similarity_comparison(
-            ont1='hp', ont2='zp',
-            ont1_root='HP:0000118', ont2_root='ZP:0000000',
-            ont1_prefix='HPO', ont2_prefix='ZP',
-            association_file='zpa.tsv', association_type='g2t'
-        )
+        self.run_similarity_comparison(**COMPARISONS['hp_vs_zp'])
 
     def setup(self):
         """Run all setup stages."""
@@ -733,9 +4856,13 @@ class PipelineRunner:
         logger.info("=" * 80)
 
         self.setup_working_directory()
-        self.install_tools()
-        self.get_ontology_versions()
-        self.download_association_tables()
+        try:
+            for step in (self.install_tools, self.install_ontology_databases,
+                         self.get_ontology_versions, self.download_association_tables):
+                with self.metrics.stage(f"setup:{step.__name__}"):
+                    step()
+        finally:
+            self.write_metrics()
 
         logger.info("Setup complete!")
 
@@ -747,9 +4874,7 @@ class PipelineRunner:
 
         try:
             self.setup()
-            self.run_hp_vs_hp()
-            self.run_hp_vs_mp()
-            self.run_hp_vs_zp()
+            self.run_comparisons(list(COMPARISONS))
 
             logger.info("=" * 80)
             logger.info("PIPELINE COMPLETE!")
@@ -797,6 +4922,181 @@ def main():
         help='Path to custom PHENIO Semantic SQL database file (e.g., phenio.db)'
     )
 
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='Maximum number of pipeline stages to run in parallel (default: 1)'
+    )
+
+    parser.add_argument(
+        '--memory-budget-gb',
+        type=float,
+        help='Maximum summed memory estimate (GB) of stages running in parallel'
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        help='Persistent stage cache directory; unchanged stages are restored from it'
+    )
+
+    parser.add_argument(
+        '--cache-max-gb',
+        type=float,
+        default=100.0,
+        help='Maximum stage cache size in GB before LRU eviction (default: 100)'
+    )
+
+    parser.add_argument(
+        '--artifact-dir',
+        type=str,
+        help='Machine-wide store of tools and ontology databases, linked into '
+             'working directories (default: none; tools are downloaded into the '
+             'working directory and oaklib fetches the ontology databases)'
+    )
+
+    parser.add_argument(
+        '--download-range-workers',
+        type=int,
+        default=1,
+        help='Byte ranges fetched in parallel for large downloads (default: 1)'
+    )
+
+    parser.add_argument(
+        '--oak-backend',
+        type=str,
+        choices=['python', 'runoak'],
+        default='runoak',
+        help='Run oaklib as runoak subprocesses, or in-process with reused '
+             'adapters (default: runoak)'
+    )
+
+    parser.add_argument(
+        '--ic-engine',
+        type=str,
+        choices=['native', 'oak'],
+        default='native',
+        help='Compute information content from a sparse is_a closure with '
+             'numpy/scipy, or through the oaklib backend (default: native)'
+    )
+
+    parser.add_argument(
+        '--similarity-shards',
+        type=int,
+        default=1,
+        help='Split the first term set into N shards computed in parallel (default: 1)'
+    )
+
+    parser.add_argument(
+        '--similarity-workers',
+        type=int,
+        default=0,
+        help='Maximum similarity shard processes at once (default: one per shard)'
+    )
+
+    parser.add_argument(
+        '--previous-release',
+        type=str,
+        help='Working directory of the previous build; only similarity rows of '
+             'terms that changed since then are recomputed'
+    )
+
+    parser.add_argument(
+        '--ic-tolerance',
+        type=float,
+        default=1e-9,
+        help='IC difference below which a term counts as unchanged in '
+             'incremental runs (default: 1e-9)'
+    )
+
+    parser.add_argument(
+        '--symmetric',
+        action='store_true',
+        help='Compute and store each unordered pair of same-ontology comparisons '
+             '(HP vs HP) once; expand_symmetric.py restores the full matrix'
+    )
+
+    parser.add_argument(
+        '--top-k',
+        type=int,
+        help='Keep only the K best objects per subject (default: keep all)'
+    )
+
+    parser.add_argument(
+        '--top-k-metric',
+        type=str,
+        choices=sorted(TOP_K_METRICS),
+        default='phenodigm',
+        help='Score ranking objects for --top-k (default: phenodigm)'
+    )
+
+    parser.add_argument(
+        '--labeler',
+        type=str,
+        choices=['streaming', 'duckdb'],
+        default=None,
+        help='Label results with the DuckDB CLI or a streaming hash join '
+             '(default: duckdb, or streaming with --stream)'
+    )
+
+    parser.add_argument(
+        '--max-memory',
+        type=float,
+        help='Memory budget in GB of the labeling stage; above it labeling '
+             'spills to disk (default: unbounded)'
+    )
+
+    parser.add_argument(
+        '--spill-dir',
+        type=str,
+        help='Directory for spill files (default: <working-dir>/spill)'
+    )
+
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Stream similarity rows through a FIFO into the labeler, writing '
+             'the labeled TSV (and its compressed copy) once'
+    )
+
+    parser.add_argument(
+        '--parquet',
+        action='store_true',
+        help='Also write each labeled result as Parquet and include it in '
+             'the tarball (requires pyarrow)'
+    )
+
+    parser.add_argument(
+        '--binary',
+        action='store_true',
+        help='Also write each labeled result in the memory-mappable binary format '
+             '(*.simbin) and include it in the tarball'
+    )
+
+    parser.add_argument(
+        '--compression',
+        type=str,
+        choices=['gzip', 'zstd'],
+        default='gzip',
+        help='Tarball compression: parallel gzip (.tar.gz) or zstd (.tar.zst, '
+             'requires zstandard) (default: gzip)'
+    )
+
+    parser.add_argument(
+        '--compression-threads',
+        type=int,
+        default=0,
+        help='Threads used to compress tarballs (default: one per CPU)'
+    )
+
+    parser.add_argument(
+        '--status-file',
+        type=str,
+        help='JSON file listing the running operations with their progress, '
+             'rate and ETA (default: <working-dir>/pipeline_status.json)'
+    )
+
     parser.add_argument(
         '--zenodo-record-id',
         type=str,
@@ -822,6 +5122,13 @@ def main():
         help='Zenodo API base URL (default: https://zenodo.org/api)'
     )
 
+    parser.add_argument(
+        '--zenodo-workers',
+        type=int,
+        default=4,
+        help='Concurrent Zenodo file deletions and uploads (default: 4)'
+    )
+
     parser.add_argument(
         '--skip-setup',
         action='store_true',
@@ -854,8 +5161,75 @@ def main():
         custom_phenio=custom_phenio_path
     )
     config.resnik_threshold = args.resnik_threshold
+    config.jobs = args.jobs
+    config.memory_budget_gb = args.memory_budget_gb
+    if args.cache_dir:
+        config.cache_dir = Path(args.cache_dir).absolute()
+    config.cache_max_gb = args.cache_max_gb
+    if args.artifact_dir:
+        config.artifact_dir = Path(args.artifact_dir).absolute()
+    config.download_range_workers = args.download_range_workers
+    config.oak_backend = args.oak_backend
+    config.ic_engine = args.ic_engine
+    config.similarity_shards = args.similarity_shards
+    config.similarity_workers = args.similarity_workers
+    config.symmetric = args.symmetric
+    config.top_k = args.top_k
+    config.top_k_metric = args.top_k_metric
+    config.labeler = args.labeler or ('streaming' if args.stream else 'duckdb')
+    config.max_memory_gb = args.max_memory
+    if args.spill_dir:
+        config.spill_dir = Path(args.spill_dir).absolute()
+    if args.previous_release:
+        config.previous_release = Path(args.previous_release).absolute()
+    config.ic_tolerance = args.ic_tolerance
+    config.stream = args.stream
+    config.parquet = args.parquet
+    config.binary = args.binary
+    config.compression = args.compression
+    config.compression_threads = args.compression_threads
+    config.zenodo_workers = args.zenodo_workers
+    if args.status_file:
+        config.status_file = Path(args.status_file).absolute()
     zenodo_version = args.zenodo_version or config.release_date
 
+    if config.parquet and importlib.util.find_spec('pyarrow') is None:
+        logger.error("--parquet requires pyarrow (pip install pyarrow)")
+        sys.exit(1)
+    if config.compression == 'zstd' and importlib.util.find_spec('zstandard') is None:
+        logger.error("--compression zstd requires zstandard (pip install zstandard)")
+        sys.exit(1)
+
+    if config.max_memory_gb is not None and config.max_memory_gb <= 0:
+        logger.error("--max-memory must be positive")
+        sys.exit(1)
+    if config.top_k is not None and config.top_k < 1:
+        logger.error("--top-k must be at least 1")
+        sys.exit(1)
+    if config.top_k and config.symmetric:
+        # A subject's matches are split between its rows as subject and as object
+        logger.error("--top-k cannot be combined with --symmetric")
+        sys.exit(1)
+    if config.stream:
+        # Streaming needs one runoak process feeding an in-process labeler
+        conflicts = [flag for flag, enabled in (
+            ('--labeler duckdb', config.labeler == 'duckdb'),
+            ('--top-k', bool(config.top_k)),
+            ('--symmetric', config.symmetric),
+            ('--similarity-shards', config.similarity_shards > 1),
+            ('--previous-release', bool(config.previous_release))) if enabled]
+        if conflicts:
+            logger.error(f"--stream cannot be combined with {', '.join(conflicts)}")
+            sys.exit(1)
+
+    if config.previous_release:
+        if not config.previous_release.is_dir():
+            logger.error(f"Previous release not found: {config.previous_release}")
+            sys.exit(1)
+        if config.previous_release.resolve() == config.working_dir.resolve():
+            logger.error("--previous-release must differ from the working directory")
+            sys.exit(1)
+
     # Log configuration
     if config.custom_phenio:
         logger.info(f"Using custom PHENIO database: {config.custom_phenio}")
@@ -876,6 +5250,7 @@ def main():
         else:
             logger.info("Skipping setup stage")
             runner.setup_working_directory()
+            runner.attach_ontology_databases()
             # Try to load versions from files if they exist
             for ont in ['hp', 'mp', 'zp', 'phenio']:
                 version_file = config.working_dir / f"{ont}_version"
@@ -892,20 +5267,12 @@ def main():
             logger.info("Downloaded files are ready in the working directory.")
             logger.info(
                 "To run comparisons, execute without --test-mode flag.")
-        elif args.comparison == 'all':
-            runner.run_hp_vs_hp()
-            runner.run_hp_vs_mp()
-            runner.run_hp_vs_zp()
-            comparisons_run = ['hp_vs_hp', 'hp_vs_mp', 'hp_vs_zp']
-        elif args.comparison == 'hp-hp':
-            runner.run_hp_vs_hp()
-            comparisons_run = ['hp_vs_hp']
-        elif args.comparison == 'hp-mp':
-            runner.run_hp_vs_mp()
-            comparisons_run = ['hp_vs_mp']
-        elif args.comparison == 'hp-zp':
-            runner.run_hp_vs_zp()
-            comparisons_run = ['hp_vs_zp']
+        else:
+            if args.comparison == 'all':
+                comparisons_run = list(COMPARISONS)
+            else:
+                comparisons_run = [args.comparison.replace('-', '_vs_')]
+            runner.run_comparisons(comparisons_run)
 
         if args.test_mode:
             logger.info("Test mode enabled; skipping Zenodo upload.")
@@ -915,12 +5282,13 @@ def main():
                     "Both --zenodo-token and --zenodo-record-id are required "
                     "to upload results to Zenodo."
                 )
+                PROGRESS_STATUS.set_state("failed")
                 sys.exit(1)
 
             tarballs = []
             for comparison in comparisons_run:
                 prefix = getattr(config, f"{comparison}_prefix")
-                tarballs.append(config.working_dir / f"{prefix}.tar.gz")
+                tarballs.append(config.working_dir / config.tarball_name(prefix))
 
             runner.upload_results_to_zenodo(
                 record_id=args.zenodo_record_id,
@@ -936,12 +5304,15 @@ def main():
         logger.info("SUCCESS! Pipeline completed successfully.")
         logger.info("=" * 80)
         logger.info(f"Results are in: {config.working_dir}")
+        PROGRESS_STATUS.set_state("completed")
 
     except KeyboardInterrupt:
         logger.warning("Pipeline interrupted by user")
+        PROGRESS_STATUS.set_state("failed")
         sys.exit(1)
     except Exception as e:
         logger.error(f"Pipeline failed: {e}", exc_info=args.debug)
+        PROGRESS_STATUS.set_state("failed")
         sys.exit(1)
 
 
@@ -0,0 +1,132 @@
+"""
+Shared fixtures: the benchmark's local stand-in server for downloads and the
+Zenodo API, with request logging and injectable upload faults.
+"""
+
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark_pipeline import StandInHandler, StandInServer  # noqa: E402
+from run_pipeline import PipelineConfig, PipelineRunner  # noqa: E402
+
+
+class RecordingHandler(StandInHandler):
+    """
+    Stand-in handler that logs requests and can fail file uploads.
+
+    ``server.put_faults`` maps a file name to the faults its next uploads
+    get: 'error' answers 503 without storing the file, 'checksum' stores it
+    but reports a wrong MD5. File downloads, uploads and deletions are
+    counted in ``server.max_in_flight`` (per method in
+    ``server.peak_in_flight``), delayed by ``server.delay`` seconds and, if
+    ``server.barrier`` is set, held until the barrier's number of requests
+    have arrived. With ``server.drop_keep_alive`` set, the server closes each
+    connection after answering, without announcing it in the response.
+    """
+
+    @contextmanager
+    def _tracked(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            method = server.method_in_flight.get(self.command, 0) + 1
+            server.method_in_flight[self.command] = method
+            server.peak_in_flight[self.command] = max(
+                server.peak_in_flight.get(self.command, 0), method)
+        try:
+            if server.barrier is not None:
+                server.barrier.wait()
+            # Not time.sleep, which tests patch out to skip retry backoff
+            threading.Event().wait(server.delay)
+            yield
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+                server.method_in_flight[self.command] -= 1
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.server.drop_keep_alive:
+            self.close_connection = True
+
+    def _send_file(self, head: bool) -> None:
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        with self._tracked():
+            super()._send_file(head)
+
+    def do_PUT(self):
+        if not self.path.startswith('/api/files/bucket/'):
+            super().do_PUT()
+            return
+        name = self.path.rsplit('/', 1)[1]
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        faults = self.server.put_faults.get(name)
+        fault = faults.pop(0) if faults else None
+        with self._tracked():
+            if fault == 'error':
+                self._read_body()
+                self._send_json(503, {'message': 'service unavailable'})
+            elif fault == 'checksum':
+                size = len(self._read_body())
+                self.server.draft['files'][name] = (size, '0' * 32)
+                self._send_json(201, {'key': name, 'size': size,
+                                      'checksum': f"md5:{'0' * 32}"})
+            else:
+                super().do_PUT()
+
+    def do_DELETE(self):
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        with self._tracked():
+            super().do_DELETE()
+
+
+class RecordingServer(StandInServer):
+    """Stand-in server that counts the connections it accepts."""
+
+    def get_request(self):
+        request = super().get_request()
+        with self.lock:
+            self.connections += 1
+        return request
+
+
+@pytest.fixture
+def stand_in(tmp_path):
+    """Start a stand-in server over tmp_path/fixtures; yields (server, base URL)."""
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    server = RecordingServer(fixtures, handler=RecordingHandler)
+    server.requests = []
+    server.put_faults = {}
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.method_in_flight = {}
+    server.peak_in_flight = {}
+    server.drop_keep_alive = False
+    server.barrier = None
+    server.delay = 0.0
+    base_url = server.start()
+    try:
+        yield server, base_url
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def runner(tmp_path):
+    """Pipeline runner on an empty working directory."""
+    working_dir = tmp_path / 'run'
+    working_dir.mkdir()
+    config = PipelineConfig(working_dir)
+    config.status_file = None
+    return PipelineRunner(config)
@@ -0,0 +1,83 @@
+"""Concurrent, conditional association table downloads."""
+
+import gzip
+import re
+import threading
+
+import pytest
+
+import run_pipeline
+
+HPOA = '#description: stand-in\ndatabase_id\tdisease_name\tqualifier\thpo_id\nOMIM:1\tD\t\tHP:0000001\n'
+GENE_PHENOTYPES = {
+    'gene_phenotype.10090.tsv.gz': 'MGI:1\tG1\tx\ty\tMP:0000001\nMGI:2\tG2\tx\ty\tHP:0000001\n',
+    'gene_phenotype.7955.tsv.gz': 'ZFIN:1\tG1\tx\ty\tZP:0000001\nZFIN:2\tG2\tx\ty\tMP:0000001\n',
+}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Retry immediately instead of sleeping between attempts."""
+    monkeypatch.setattr(run_pipeline.time, 'sleep', lambda seconds: None)
+
+
+@pytest.fixture
+def tables(stand_in, runner):
+    """Serve the three association tables and point the runner at them."""
+    server, base_url = stand_in
+    (server.fixtures / 'phenotype.hpoa').write_text(HPOA)
+    for name, rows in GENE_PHENOTYPES.items():
+        (server.fixtures / name).write_bytes(gzip.compress(rows.encode()))
+    runner.config.association_urls = {
+        'HPOA': f"{base_url}/files/phenotype.hpoa",
+        'MPA': f"{base_url}/files/gene_phenotype.10090.tsv.gz",
+        'ZPA': f"{base_url}/files/gene_phenotype.7955.tsv.gz",
+    }
+    return server
+
+
+def test_tables_are_fetched_concurrently(tables, runner):
+    # Every request is held until all three have arrived
+    tables.barrier = threading.Barrier(3, timeout=10)
+    runner.download_association_tables()
+
+    working_dir = runner.config.working_dir
+    assert (working_dir / 'hpoa.tsv').read_text() == HPOA
+    assert (working_dir / 'mpa.tsv').read_text() == 'MGI:1\tMP:0000001\n'
+    assert (working_dir / 'zpa.tsv').read_text() == 'ZFIN:1\tZP:0000001\n'
+    assert tables.max_in_flight == 3
+
+
+def test_pool_is_bounded_by_download_workers(tables, runner):
+    tables.delay = 0.2
+    runner.config.download_workers = 2
+    runner.download_association_tables()
+    assert tables.max_in_flight == 2
+
+
+def test_unchanged_tables_skip_preprocessing(tables, runner, monkeypatch):
+    runner.download_association_tables()
+    working_dir = runner.config.working_dir
+    outputs = [working_dir / name for name in ('hpoa.tsv', 'mpa.tsv', 'zpa.tsv')]
+    mtimes = [path.stat().st_mtime_ns for path in outputs]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unchanged table was preprocessed again")
+
+    monkeypatch.setattr(run_pipeline.StreamingTsvFilter, 'feed', fail)
+    monkeypatch.setattr(run_pipeline.StreamingTsvFilter, 'close', fail)
+    tables.requests.clear()
+    runner.download_association_tables()
+
+    assert [path.stat().st_mtime_ns for path in outputs] == mtimes
+    assert len(tables.requests) == 3
+    assert all('If-None-Match' in headers for _, _, headers in tables.requests)
+
+
+def test_throughput_is_reported_per_file(tables, runner, caplog):
+    with caplog.at_level('INFO', logger='run_pipeline'):
+        runner.download_association_tables()
+    for name in ('hpoa.tsv', 'mpa.tsv.gz', 'zpa.tsv.gz'):
+        assert any(re.match(rf"Downloaded {re.escape(name)}: .* in .*s \(.*/s\)$",
+                            record.getMessage())
+                   for record in caplog.records), name
@@ -0,0 +1,113 @@
+"""Resumable and conditional downloads against the local stand-in server."""
+
+import gzip
+import json
+import os
+
+CONTENT = bytes(range(256)) * 1024
+
+
+def file_requests(server, name):
+    """Headers of the GET requests the server received for a fixture file."""
+    return [headers for command, path, headers in server.requests
+            if command == 'GET' and path == f"/files/{name}"]
+
+
+def test_resumes_truncated_part_file(stand_in, runner):
+    server, base_url = stand_in
+    (server.fixtures / 'data.bin').write_bytes(CONTENT)
+    output = runner.config.working_dir / 'data.bin'
+    part = output.with_name('data.bin.part')
+
+    # A first attempt that stopped partway, with the validators it received
+    assert runner.download_file(f"{base_url}/files/data.bin", output,
+                                conditional=True, range_workers=1)
+    etag = json.loads(runner._validators_path(output).read_text())['etag']
+    os.replace(output, part)
+    with part.open('r+b') as handle:
+        handle.truncate(100000)
+    runner._validators_path(part).write_text(json.dumps({'etag': etag}))
+    server.requests.clear()
+
+    assert runner.download_file(f"{base_url}/files/data.bin", output,
+                                range_workers=1)
+    assert output.read_bytes() == CONTENT
+    assert not part.exists()
+    (request,) = file_requests(server, 'data.bin')
+    assert request['Range'] == 'bytes=100000-'
+    assert request['If-Range'] == etag
+
+
+def test_if_range_mismatch_restarts_from_zero(stand_in, runner):
+    server, base_url = stand_in
+    (server.fixtures / 'data.bin').write_bytes(CONTENT)
+    output = runner.config.working_dir / 'data.bin'
+    part = output.with_name('data.bin.part')
+
+    # Part of an older upstream version of the file
+    part.write_bytes(b'\xff' * 100000)
+    runner._validators_path(part).write_text(json.dumps({'etag': '"stale"'}))
+
+    assert runner.download_file(f"{base_url}/files/data.bin", output,
+                                range_workers=1)
+    assert output.read_bytes() == CONTENT
+    (request,) = file_requests(server, 'data.bin')
+    assert request['Range'] == 'bytes=100000-'
+    assert request['If-Range'] == '"stale"'
+
+
+def test_unchanged_file_is_revalidated(stand_in, runner):
+    server, base_url = stand_in
+    (server.fixtures / 'data.bin').write_bytes(CONTENT)
+    output = runner.config.working_dir / 'data.bin'
+    url = f"{base_url}/files/data.bin"
+
+    assert runner.download_file(url, output, conditional=True)
+    mtime = output.stat().st_mtime_ns
+    server.requests.clear()
+
+    assert not runner.download_file(url, output, conditional=True)
+    assert output.stat().st_mtime_ns == mtime
+    (request,) = file_requests(server, 'data.bin')
+    assert 'If-None-Match' in request
+
+    # A changed upstream file is downloaded again
+    (server.fixtures / 'data.bin').write_bytes(CONTENT[::-1])
+    assert runner.download_file(url, output, conditional=True)
+    assert output.read_bytes() == CONTENT[::-1]
+
+
+def test_gzip_download_is_revalidated_without_compressed_copy(stand_in, runner):
+    server, base_url = stand_in
+    rows = ''.join(f"GENE:{i}\tMP:{i:07d}\n" for i in range(1000))
+    (server.fixtures / 'table.tsv.gz').write_bytes(gzip.compress(rows.encode()))
+    output = runner.config.working_dir / 'table.tsv'
+    url = f"{base_url}/files/table.tsv.gz"
+
+    assert runner.download_and_decompress_gzip(url, output, conditional=True)
+    assert output.read_text() == rows
+    assert not output.with_name('table.tsv.gz').exists()
+
+    assert not runner.download_and_decompress_gzip(url, output, conditional=True)
+    assert output.read_text() == rows
+
+
+def test_artifact_store_records_the_database_version(stand_in, runner, tmp_path):
+    server, base_url = stand_in
+    with gzip.open(server.fixtures / 'phenio.db.gz', 'wb') as handle:
+        handle.write(CONTENT)
+    config = runner.config
+    config.artifact_dir = tmp_path / 'artifacts'
+    config.semsql_url_base = f"{base_url}/files"
+    config.ontology_dbs = {key: tmp_path / f"{key}.db" for key in ('hp', 'mp', 'zp')}
+    url = f"{base_url}/files/phenio.db.gz"
+    # Validators of another file in the same entry must not be taken
+    entry = runner.artifact_store().entry(url)
+    (entry / 'other.http.json').write_text(json.dumps({'etag': '"other"'}))
+
+    runner.install_ontology_databases()
+    assert (config.working_dir / 'phenio.db').read_bytes() == CONTENT
+    etag = json.loads((entry / 'phenio.db.http.json').read_text())['etag']
+    meta = json.loads((entry / 'phenio.db.meta.json').read_text())
+    assert meta['version'] == etag != '"other"'
+    assert meta['url'] == url
@@ -0,0 +1,45 @@
+"""Splicing unaffected rows of the previous release into an incremental update."""
+
+import csv
+import io
+
+from run_pipeline import LABELED_COLUMNS, PipelineRunner, tsv_field
+
+
+def labeled_row(subject, object_id, subject_label, ancestor_label):
+    fields = {name: '0.5' for name in LABELED_COLUMNS}
+    fields.update({
+        'subject_id': subject, 'subject_label': subject_label,
+        'subject_source': 'HP', 'object_id': object_id, 'object_label': 'object',
+        'object_source': 'MP', 'ancestor_id': 'UPHENO:0000001',
+        'ancestor_label': ancestor_label, 'ancestor_source': 'UPHENO',
+    })
+    return fields
+
+
+def test_quoted_labels_survive_the_splice(tmp_path):
+    rows = [
+        labeled_row('HP:1', 'MP:1', 'tab\tin "label"', 'plain'),
+        labeled_row('HP:1', 'MP:2', 'affected', 'plain'),
+        labeled_row('HP:2', 'MP:1', 'quote " only', 'line\nbreak'),
+        labeled_row('HP:3', 'MP:1', 'removed term', 'plain'),
+    ]
+    previous = tmp_path / 'HP_vs_MP_semsimian_phenio_20250101.tsv'
+    with previous.open('w', encoding='utf-8') as out_file:
+        out_file.write('\t'.join(LABELED_COLUMNS) + '\n')
+        for row in rows:
+            out_file.write('\t'.join(tsv_field(row[name]) for name in LABELED_COLUMNS)
+                           + '\n')
+
+    header = ['subject_id', 'object_id', 'ancestor_id', 'ancestor_label',
+              'phenodigm_score']
+    out_file = io.StringIO()
+    kept = PipelineRunner.copy_unaffected_rows(
+        previous, header, out_file, affected1=set(), affected2={'MP:2'},
+        set1_terms={'HP:1': '', 'HP:2': ''},
+        set2_terms={'MP:1': '', 'MP:2': ''})
+
+    assert kept == 2
+    spliced = list(csv.reader(io.StringIO(out_file.getvalue(), newline=''),
+                              delimiter='\t'))
+    assert spliced == [[row[name] for name in header] for row in (rows[0], rows[2])]
@@ -0,0 +1,51 @@
+"""Information content written by the native engine and the oaklib session."""
+
+import gzip
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+pytest.importorskip('oaklib')
+
+from benchmark_pipeline import generate_fixtures  # noqa: E402
+from run_pipeline import InformationContentEngine, OakSession  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def fixtures(tmp_path_factory):
+    """PHENIO of more than one 100-term chunk, with HPOA and g2t associations."""
+    fixtures = tmp_path_factory.mktemp('fixtures')
+    generate_fixtures(fixtures, terms=150, genes=20, diseases=20, per_subject=2, seed=7)
+    with gzip.open(fixtures / 'gene_phenotype.10090.tsv.gz', 'rt') as in_file, \
+            (fixtures / 'mpa.tsv').open('w') as out_file:
+        in_file.readline()
+        for line in in_file:
+            fields = line.split('\t')
+            if fields[4].startswith('MP:'):
+                out_file.write(f"{fields[0]}\t{fields[4]}\n")
+    return fixtures
+
+
+@pytest.mark.parametrize('association_file, association_type',
+                         [('phenotype.hpoa', 'hpoa'), ('mpa.tsv', 'g2t')])
+def test_native_matches_oaklib(fixtures, tmp_path, association_file, association_type):
+    db_path = fixtures / 'phenio.db'
+    native = tmp_path / 'native_ic.tsv'
+    oak = tmp_path / 'oak_ic.tsv'
+    engine = InformationContentEngine(db_path)
+    engine.write_information_content(fixtures / association_file, association_type, native)
+    OakSession().write_information_content(
+        f"sqlite:{db_path}", fixtures / association_file, association_type, oak)
+
+    assert native.read_text() == oak.read_text()
+    # Every annotated term is written, in entity order, and nothing else
+    # (runoak also writes unannotated terms of its first 100-term chunk)
+    _scores, counts = engine.information_content(fixtures / association_file,
+                                                 association_type)
+    annotated = [curie for curie in engine.entities
+                 if counts[engine.term_index[curie]]]
+    curies = [line.split('\t')[0] for line in native.read_text().splitlines()]
+    assert curies == annotated
+    assert any(not counts[engine.term_index[curie]] for curie in engine.entities[:100])
+    assert 'UPHENO:0000001' in curies
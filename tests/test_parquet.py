@@ -0,0 +1,55 @@
+"""Parquet output of labeled similarity results."""
+
+import pytest
+
+import run_pipeline
+from run_pipeline import LABELED_COLUMNS
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def labeled_row(subject, object_id, phenodigm):
+    fields = {name: 'x' for name in LABELED_COLUMNS}
+    fields.update({
+        'subject_id': subject, 'object_id': object_id,
+        'object_information_content': '1.5', 'subject_information_content': '2.5',
+        'ancestor_information_content': '0.5', 'jaccard_similarity': '0.25',
+        'cosine_similarity': 'None', 'dice_similarity': '0.4',
+        'phenodigm_score': phenodigm,
+    })
+    return '\t'.join(fields[name] for name in LABELED_COLUMNS) + '\n'
+
+
+def test_row_groups_sorted_by_subject(runner, monkeypatch):
+    # Small runs and row groups, so the sort spills and merges several runs
+    monkeypatch.setattr(run_pipeline, 'PARQUET_SORT_RUN_BYTES', 2000)
+    monkeypatch.setattr(run_pipeline, 'PARQUET_ROW_GROUP_ROWS', 7)
+    subjects = [f"HP:{(index * 37) % 50:07d}" for index in range(200)]
+    rows = [(subject, f"MP:{index:07d}") for index, subject in enumerate(subjects)]
+    tsv = runner.config.working_dir / 'result.tsv'
+    with tsv.open('w') as out_file:
+        out_file.write('\t'.join(LABELED_COLUMNS) + '\n')
+        for index, (subject, object_id) in enumerate(rows):
+            out_file.write(labeled_row(subject, object_id,
+                                       'None' if index % 3 == 0 else '0.75'))
+
+    runner.write_parquet('result.tsv', 'result.parquet')
+
+    parquet = pq.ParquetFile(runner.config.working_dir / 'result.parquet')
+    assert parquet.metadata.num_row_groups > 1
+    previous = ''
+    for group in range(parquet.metadata.num_row_groups):
+        subject_ids = parquet.read_row_group(group, columns=['subject_id'])
+        subject_ids = subject_ids.column('subject_id').to_pylist()
+        assert subject_ids == sorted(subject_ids)
+        assert previous <= subject_ids[0]
+        previous = subject_ids[-1]
+
+    table = parquet.read()
+    # Stable: rows with the same subject keep their TSV order
+    assert list(zip(table.column('subject_id').to_pylist(),
+                    table.column('object_id').to_pylist())) == sorted(
+        rows, key=lambda row: row[0])
+    assert table.column('cosine_similarity').null_count == len(rows)
+    assert table.column('phenodigm_score').null_count == len(range(0, 200, 3))
+    assert not (runner.config.working_dir / 'spill' / 'result.parquet').exists()
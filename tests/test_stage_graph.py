@@ -0,0 +1,39 @@
+"""Scheduling, caching and temporary files of the stage graph."""
+
+from run_pipeline import Stage, StageCache, StageGraph
+
+
+def build_graph(working_dir, cache):
+    """A producer of a temporary file and the stage that consumes it."""
+    def produce():
+        (working_dir / 'result_unlabeled.tsv').write_text('a\tb\n')
+
+    def label():
+        text = (working_dir / 'result_unlabeled.tsv').read_text()
+        (working_dir / 'result.tsv').write_text(text.upper())
+
+    graph = StageGraph(working_dir, cache=cache)
+    graph.add(Stage('similarity', produce, outputs=['result_unlabeled.tsv'],
+                    temporary=['result_unlabeled.tsv'],
+                    cache_params={'command': 'similarity'}))
+    graph.add(Stage('label', label, inputs=['result_unlabeled.tsv'],
+                    outputs=['result.tsv'], cache_params={'command': 'label'}))
+    return graph
+
+
+def test_temporary_file_removed_on_cache_miss_and_hit(tmp_path):
+    working_dir = tmp_path / 'run'
+    working_dir.mkdir()
+    cache = StageCache(tmp_path / 'cache', 1024 ** 3)
+
+    graph = build_graph(working_dir, cache)
+    graph.run()
+    assert sorted(path.name for path in working_dir.iterdir()) == ['result.tsv']
+
+    # Both stages are restored from the cache on the second run
+    (working_dir / 'result.tsv').unlink()
+    graph = build_graph(working_dir, cache)
+    graph.run()
+    assert sorted(path.name for path in working_dir.iterdir()) == ['result.tsv']
+    assert (working_dir / 'result.tsv').read_text() == 'A\tB\n'
+    assert {record['status'] for record in graph.metrics.snapshot().values()} == {'restored'}
@@ -0,0 +1,142 @@
+"""Zenodo uploads against the stand-in deposition API."""
+
+import hashlib
+import json
+
+import pytest
+
+import run_pipeline
+from run_pipeline import ZENODO_UPLOAD_STATE, ZenodoClient, ZenodoUploadError
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Retry immediately instead of sleeping between attempts."""
+    monkeypatch.setattr(run_pipeline.time, 'sleep', lambda seconds: None)
+
+
+def write_results(runner, names):
+    paths = []
+    for name in names:
+        path = runner.config.working_dir / name
+        path.write_bytes(name.encode() * 50000)
+        paths.append(path)
+    return paths
+
+
+def uploads(server):
+    """Names of the files the server received PUT requests for, in order."""
+    return [path.rsplit('/', 1)[1] for command, path, _ in server.requests
+            if command == 'PUT']
+
+
+def test_upload_retries_server_errors(stand_in, runner):
+    server, base_url = stand_in
+    (path,) = write_results(runner, ['HP_vs_HP.tar.gz'])
+    server.put_faults = {path.name: ['error', 'error']}
+
+    client = ZenodoClient('token', base_url=f"{base_url}/api")
+    try:
+        md5 = client.upload_file_with_retry(f"{base_url}/api/files/bucket", path,
+                                            retries=3)
+    finally:
+        client.close()
+    assert md5 == hashlib.md5(path.read_bytes()).hexdigest()
+    assert server.draft['files'][path.name] == (path.stat().st_size, md5)
+    assert uploads(server) == [path.name] * 3
+
+
+def test_checksum_mismatch_aborts_before_publishing(stand_in, runner):
+    server, base_url = stand_in
+    paths = write_results(runner, ['HP_vs_HP.tar.gz'])
+    server.put_faults = {paths[0].name: ['checksum'] * 10}
+
+    with pytest.raises(ZenodoUploadError, match='Checksum mismatch'):
+        runner.upload_results_to_zenodo('1', 'token', 'v1', paths,
+                                        base_url=f"{base_url}/api")
+    assert not server.draft['submitted']
+    state_path = runner.config.working_dir / ZENODO_UPLOAD_STATE
+    assert json.loads(state_path.read_text())['files'] == {}
+
+
+def test_rerun_resumes_from_upload_state(stand_in, runner):
+    server, base_url = stand_in
+    paths = write_results(runner, ['HP_vs_HP.tar.gz', 'HP_vs_MP.tar.gz'])
+    server.put_faults = {'HP_vs_MP.tar.gz': ['error'] * 10}
+
+    with pytest.raises(ZenodoUploadError):
+        runner.upload_results_to_zenodo('1', 'token', 'v1', paths,
+                                        base_url=f"{base_url}/api")
+    assert not server.draft['submitted']
+    state_path = runner.config.working_dir / ZENODO_UPLOAD_STATE
+    state = json.loads(state_path.read_text())
+    assert list(state['files']) == ['HP_vs_HP.tar.gz']
+    assert 'previous_release.tar.gz' not in server.draft['files']
+
+    server.put_faults = {}
+    server.requests.clear()
+    runner.upload_results_to_zenodo('1', 'token', 'v1', paths,
+                                    base_url=f"{base_url}/api")
+    assert uploads(server) == ['HP_vs_MP.tar.gz']
+    assert server.draft['submitted']
+    assert set(server.draft['files']) == {path.name for path in paths}
+    assert not state_path.exists()
+
+
+def test_requests_reuse_pooled_connections(stand_in, runner):
+    server, base_url = stand_in
+    runner.config.zenodo_workers = 2
+    paths = write_results(runner, [f"result{index}.tar.gz" for index in range(6)])
+
+    runner.upload_results_to_zenodo('1', 'token', 'v1', paths,
+                                    base_url=f"{base_url}/api")
+    assert server.draft['submitted']
+    assert len(uploads(server)) == len(paths)
+    # Newversion, draft GET, delete, metadata, six uploads and publish share
+    # at most one connection per worker
+    assert 1 <= server.connections <= runner.config.zenodo_workers
+
+
+def test_stale_keep_alive_connection_is_replaced(stand_in, runner):
+    server, base_url = stand_in
+    server.drop_keep_alive = True
+    client = ZenodoClient('token', base_url=f"{base_url}/api", max_workers=1)
+    try:
+        first = client.get_deposition(2)
+        # The pooled connection was closed by the server after the first
+        # answer; the request is sent again on a fresh connection
+        second = client.get_deposition(2)
+    finally:
+        client.close()
+    assert first == second
+    assert server.connections == 2
+
+
+def test_deletions_and_uploads_bounded_by_workers(stand_in, runner):
+    server, base_url = stand_in
+    runner.config.zenodo_workers = 3
+    server.delay = 0.1
+    server.draft['files'] = {f"old{index}.tar.gz": (0, '') for index in range(6)}
+    paths = write_results(runner, [f"result{index}.tar.gz" for index in range(6)])
+
+    runner.upload_results_to_zenodo('1', 'token', 'v1', paths,
+                                    base_url=f"{base_url}/api")
+    assert set(server.draft['files']) == {path.name for path in paths}
+    assert server.peak_in_flight == {'DELETE': 3, 'PUT': 3}
+
+
+def test_aggregate_throughput_is_logged(stand_in, runner, caplog):
+    server, base_url = stand_in
+    paths = write_results(runner, ['HP_vs_HP.tar.gz', 'HP_vs_MP.tar.gz'])
+
+    with caplog.at_level('INFO', logger='run_pipeline'):
+        runner.upload_results_to_zenodo('1', 'token', 'v1', paths,
+                                        base_url=f"{base_url}/api")
+    total = sum(path.stat().st_size for path in paths)
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(message.startswith(
+        f"Uploaded 2 files to Zenodo: {run_pipeline.format_bytes(total)} in ")
+        and message.endswith('/s aggregate)') for message in messages)
+    for path in paths:
+        assert any(message.startswith(f"Uploaded {path.name} (") and
+                   'md5 verified' in message for message in messages)